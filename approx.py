@@ -0,0 +1,73 @@
+#approx.py
+# approximate answers from a uniform sample, shared by the MySQL, SQLite and MongoDB backends
+
+import math
+from statistics import NormalDist
+
+SAMPLE_SUFFIX = "__sample"  # sample of dataset 'sales' is stored as 'sales__sample'
+SAMPLE_U = "_sample_u"  # per-row uniform value in [0, sample rate); rows with u < q are a sample of rate q
+
+# templates that can be estimated: totals are scaled up, averages are taken as they are
+SUM_TEMPLATES = ["aggregate_with_where", "aggregate_by_category", "top_n"]
+AVERAGE_TEMPLATES = ["average_by_category", "average_with_where"]
+
+
+def sample_name(dataset):
+    return f"{dataset}{SAMPLE_SUFFIX}"
+
+
+def is_sample(name):
+    return name.endswith(SAMPLE_SUFFIX)
+
+
+def can_estimate(query_type) -> bool:
+    return query_type in SUM_TEMPLATES + AVERAGE_TEMPLATES
+
+
+def sample_steps(rate, fractions) -> list:
+    """Sampling rates of the refinement steps: the given fractions of the stored sample, smallest first."""
+    # rounded so the rates read as written in the rendered statements (0.02, not 0.020000000000000004)
+    return sorted({round(min(rate * fraction, rate), 12) for fraction in fractions if fraction > 0})
+
+
+def estimate(query_type, groups, rows, rate, confidence=0.95) -> list:
+    '''
+    Estimates and confidence intervals per group from the aggregates of a sample.
+
+    args:
+        query_type, groups: the parsed query
+        rows: (group, values, sum, sum of squares) per group, over the sampled rows
+        rate: probability with which every row was sampled
+        confidence: two-sided level of the intervals
+
+    Returns (group, estimate, low, high) tuples, largest estimate first (the
+    first n for top_n). Totals are Horvitz-Thompson estimates, the sample sum
+    divided by the rate, with the Bernoulli sampling variance
+    (1 - rate) / rate^2 * sum of squares. Averages are the sample mean with
+    its standard error; a group with fewer than two values has no interval.
+    Groups the sample missed altogether are missing from the result, so
+    small groups are the first to be refined.
+    '''
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    estimates = []
+    for group, values, total, squares in rows:
+        values, total, squares = int(values or 0), float(total or 0), float(squares or 0)
+        if query_type in AVERAGE_TEMPLATES:
+            if not values:
+                continue
+            value = total / values
+            variance = (squares - values * value * value) / (values - 1) if values > 1 else None
+            margin = z * math.sqrt(max(variance, 0) * (1 - rate) / values) if variance is not None else None
+        else:
+            value = total / rate
+            margin = z * math.sqrt((1 - rate) * squares) / rate
+        low, high = (None, None) if margin is None else (round(value - margin, 2), round(value + margin, 2))
+        estimates.append((group, round(value, 2), low, high))
+    estimates.sort(key=lambda row: row[1], reverse=True)
+    if query_type == "top_n":
+        estimates = estimates[:int(groups[0])]
+    return estimates
+
+
+def describe_estimates(rate, confidence=0.95) -> str:
+    return f"estimated from {rate:.2%} of the rows, with {confidence:.0%} confidence intervals (low, high)"
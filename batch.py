@@ -0,0 +1,117 @@
+#batch.py
+# non-interactive batch mode: runs a file of natural language queries against one backend
+
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+WORKERS = 4  # queries executed concurrently
+BACKENDS = ["mysql", "mongo", "sqlite"]
+FIELDS = ["line", "query", "query_type", "statement", "row_count", "parse_ms", "execute_ms", "error", "rows"]
+
+
+def open_backend(name, sqlite_path=None):
+    """Create a backend by name; each is imported only when selected."""
+    if name == "sqlite":
+        from sqlitemain import ChatDBSQLite
+        return ChatDBSQLite(sqlite_path)
+    if name == "mysql":
+        from sqlmain import ChatDB
+        return ChatDB()
+    from mongo_main import ChatDBMongo
+    return ChatDBMongo()
+
+
+def read_queries(path):
+    """(line number, query) for every non-blank, non-comment line of a query file."""
+    with open(path) as f:
+        return [(number, line.strip()) for number, line in enumerate(f, 1)
+                if line.strip() and not line.lstrip().startswith("#")]
+
+
+class BatchRunner:
+    '''
+    Runs many natural language queries against one table/collection.
+
+    args:
+        chatdb: backend instance (ChatDB, ChatDBMongo or ChatDBSQLite)
+        target: table/collection every query runs against
+        workers: size of the thread pool the queries are executed on
+
+    Every query is parsed up front, once per distinct text, so unrecognized
+    queries are reported without touching the database. Recognized queries
+    then run concurrently on a bounded pool over the backend's shared
+    connection pool (MySQL, MongoDB) or serialized connection (SQLite).
+    Records come back in input order.
+    '''
+    def __init__(self, chatdb, target, workers=None):
+        self.chatdb = chatdb
+        self.target = target
+        self.workers = workers or WORKERS
+
+    def parse(self, queries) -> list:
+        parsed = {}  # query text -> (query_type, params, parse ms)
+        records = []
+        for line, query in queries:
+            if query not in parsed:
+                started = time.perf_counter()
+                query_type, params = self.chatdb.query_generator.parse_query(query)
+                parsed[query] = query_type, params, (time.perf_counter() - started) * 1000
+            query_type, params, parse_ms = parsed[query]
+            records.append({"line": line, "query": query, "query_type": query_type,
+                            "params": params, "parse_ms": round(parse_ms, 3)})
+        return records
+
+    def execute(self, record) -> dict:
+        result = {field: record.get(field) for field in FIELDS}
+        if not record["query_type"]:
+            result["error"] = "Query not recognized."
+            return result
+        started = time.perf_counter()
+        try:
+            statement, rows = self.chatdb.execute_parsed(record["query_type"], record["params"], self.target)
+            result.update(statement=statement, rows=rows, row_count=len(rows))
+        except Exception as e:
+            result["error"] = str(e)
+        result["execute_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    def run(self, queries):
+        """Yield one result record per query, in input order."""
+        records = self.parse(queries)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            yield from pool.map(self.execute, records)
+
+
+def write_results(results, path, output_format=None):
+    """Write result records as JSONL or CSV (chosen by output_format or the file extension)."""
+    output_format = output_format or ("csv" if path.endswith(".csv") else "jsonl")
+    count = errors = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS) if output_format == "csv" else None
+        if writer:
+            writer.writeheader()
+        for result in results:
+            if output_format == "csv":
+                writer.writerow(dict(result, rows=json.dumps(result["rows"], default=str)))
+            else:
+                f.write(json.dumps(result, default=str) + "\n")
+            count += 1
+            errors += result["error"] is not None
+    return count, errors
+
+
+def run_batch(query_file, backend, target, output, output_format=None, workers=None):
+    """Batch entry point used by main.py --batch."""
+    queries = read_queries(query_file)
+    chatdb = open_backend(backend)
+    try:
+        started = time.perf_counter()
+        count, errors = write_results(BatchRunner(chatdb, target, workers).run(queries), output, output_format)
+        elapsed = time.perf_counter() - started
+        print(f"Ran {count} queries against '{target}' ({backend}) in {elapsed:.2f} s; "
+              f"{errors} failed. Results written to {output}.")
+    finally:
+        chatdb.close()
+    return errors
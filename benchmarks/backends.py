@@ -0,0 +1,103 @@
+#benchmarks/backends.py
+# compares upload throughput and query latency of the embedded SQLite backend with the MySQL and
+# MongoDB servers, running the same dataset and natural language queries through each backend
+#
+# usage: python -m benchmarks.backends --dataset data1.csv --backends sqlite mysql mongo
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+import batch
+from rollup import rollup_name
+
+BACKENDS = ["sqlite", "mongomock", "mysql", "mongo"]
+
+QUERIES = [
+    "total total_revenue by category",
+    "average price by location",
+    "top 5 total_revenue by payment_method",
+    "total quantity by category where price > 100",
+]
+
+
+# backends are imported when selected, so the SQLite run needs neither server nor driver
+def open_backend(name, sqlite_path):
+    if name == "mongomock":
+        # in-process MongoDB substitute; needs the mongomock package
+        import mongomock
+        from mongo_config import MongoDBConfig
+        MongoDBConfig.use_client(mongomock.MongoClient())
+        name = "mongo"
+    return batch.open_backend(name, sqlite_path)
+
+
+# upload quietly; returns seconds taken, or None if the upload failed
+def time_upload(chatdb, backend, dataset, target):
+    if backend in ("mongo", "mongomock"):
+        # mongo uploads append, so start from an empty collection
+        chatdb.db[target].drop()
+        chatdb.db[rollup_name(target)].drop()
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        chatdb.upload_dataset(dataset, target)
+    elapsed = time.perf_counter() - started
+    if "successfully uploaded" not in output.getvalue():
+        print(output.getvalue().strip().splitlines()[-1])
+        return None
+    return elapsed
+
+
+# run a query `repeat` times; returns latencies in ms and the result size
+def time_query(chatdb, query, target, repeat):
+    latencies = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _, results = chatdb.execute(query, target)
+        latencies.append((time.perf_counter() - started) * 1000)
+        rows = len(results)
+    return latencies, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite, MySQL and MongoDB backends.")
+    parser.add_argument("--dataset", default="data1.csv")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["sqlite"])
+    parser.add_argument("--target", default="benchmark", help="table/collection the dataset is loaded into")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sqlite-path", help="database file (default: a temporary file)")
+    args = parser.parse_args()
+
+    rows = sum(1 for _ in open(args.dataset)) - 1
+    print(f"Dataset '{args.dataset}': {rows} rows, {os.path.getsize(args.dataset) / 1e6:.1f} MB")
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = args.sqlite_path or os.path.join(tmp, "benchmark.sqlite")
+        for backend in args.backends:
+            print(f"\n== {backend} ==")
+            try:
+                chatdb = open_backend(backend, sqlite_path)
+            except Exception as e:
+                print(f"skipped: {e}")
+                continue
+            try:
+                elapsed = time_upload(chatdb, backend, args.dataset, args.target)
+                if elapsed is None:
+                    continue
+                print(f"upload: {elapsed:.2f} s ({rows / elapsed:,.0f} rows/sec)")
+                for query in QUERIES:
+                    latencies, results = time_query(chatdb, query, args.target, args.repeat)
+                    print(f"{query}: median {statistics.median(latencies):.1f} ms, "
+                          f"min {min(latencies):.1f} ms over {args.repeat} runs, {results} rows")
+            except Exception as e:
+                print(f"failed: {e}")
+            finally:
+                chatdb.close()
+
+
+if __name__ == "__main__":
+    main()
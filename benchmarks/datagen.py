@@ -0,0 +1,123 @@
+#benchmarks/datagen.py
+# synthetic sales data with the data1.csv schema or one of the Config.COLUMN_MAPPINGS layouts.
+# rows are generated and written a chunk at a time, so 100M-row files need no more memory than 10K-row ones
+#
+# usage: python -m benchmarks.datagen --rows 1000000 --out sales_1m.csv [--layout retail_sales] [--seed 7]
+
+import argparse
+import datetime
+import time
+import numpy as np
+import pandas as pd
+from sqlconfig import Config
+
+CHUNK_SIZE = 250000  # rows generated and written at once
+START_DATE = datetime.date(2023, 1, 1)
+DAYS = 730
+
+# category -> (typical unit price, products); categories, products, regions and payment
+# methods are drawn with Zipf-like weights so a few values dominate, as in real sales data
+CATEGORIES = {
+    "Electronics": (450.0, ["iPhone 14 Pro", "MacBook Air", "Sony WH-1000XM5", "Samsung Galaxy S23", "iPad Air",
+                            "Kindle Paperwhite", "Apple Watch", "GoPro HERO11"]),
+    "Home Appliances": (250.0, ["Dyson V11 Vacuum", "Instant Pot", "Nespresso Vertuo", "Philips Air Fryer",
+                                "Roomba i7", "Keurig K-Elite"]),
+    "Clothing": (60.0, ["Levi's 501 Jeans", "Nike Air Force 1", "Adidas Hoodie", "North Face Jacket",
+                        "Uniqlo T-Shirt", "Ray-Ban Sunglasses"]),
+    "Books": (18.0, ["The Da Vinci Code", "Atomic Habits", "Dune", "Sapiens", "The Hobbit", "1984"]),
+    "Beauty Products": (35.0, ["Neutrogena Sunscreen", "Olay Moisturizer", "Dior Perfume", "CeraVe Cleanser"]),
+    "Sports": (80.0, ["Yoga Mat", "Wilson Tennis Racket", "Fitbit Charge", "Spalding Basketball"]),
+}
+LOCATIONS = ["North America", "Europe", "Asia", "South America", "Africa", "Oceania"]
+PAYMENT_METHODS = ["Credit Card", "PayPal", "Debit Card", "Cash", "Gift Card"]
+GENDERS = ["Female", "Male"]
+PRODUCT_IDS = {name: f"P{idx:05d}" for idx, name in
+               enumerate(name for _, names in CATEGORIES.values() for name in names)}
+
+# the data1.csv columns, in file order
+DATA1_COLUMNS = ["transaction_id", "date", "category", "product_name", "quantity", "price",
+                 "total_revenue", "location", "payment_method"]
+LAYOUTS = ["data1"] + list(Config.COLUMN_MAPPINGS)
+
+
+def zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate_chunk(rng, first_id, rows):
+    """One chunk of rows in the canonical (data1 plus customer/discount) column names."""
+    categories = list(CATEGORIES)
+    category_idx = rng.choice(len(categories), rows, p=zipf_weights(len(categories)))
+    base_price = np.array([CATEGORIES[c][0] for c in categories])[category_idx]
+    products = np.empty(rows, dtype=object)
+    for idx, category in enumerate(categories):
+        rows_in_category = category_idx == idx
+        names = CATEGORIES[category][1]
+        products[rows_in_category] = np.array(names, dtype=object)[
+            rng.choice(len(names), rows_in_category.sum(), p=zipf_weights(len(names)))]
+
+    quantity = rng.geometric(0.45, rows)
+    price = np.round(base_price * rng.lognormal(0.0, 0.35, rows), 2)
+    discount = np.round(rng.choice([0.0, 0.05, 0.1, 0.2], rows, p=[0.7, 0.15, 0.1, 0.05]), 2)
+    # sales grow over the period and peak on weekends
+    day_offset = (rng.power(1.6, rows) * DAYS).astype(int)
+    dates = pd.to_datetime(START_DATE) + pd.to_timedelta(day_offset, unit="D")
+    weekend = dates.dayofweek >= 5
+    quantity[weekend] += rng.binomial(1, 0.3, weekend.sum())
+
+    return pd.DataFrame({
+        "transaction_id": np.arange(first_id, first_id + rows),
+        "date": dates.strftime("%Y-%m-%d"),
+        "category": np.array(categories, dtype=object)[category_idx],
+        "product_name": products,
+        "product_id": pd.Series(products).map(PRODUCT_IDS).to_numpy(),
+        "quantity": quantity,
+        "price": price,
+        "discount": discount,
+        "total_revenue": np.round(quantity * price * (1 - discount), 2),
+        "location": np.array(LOCATIONS, dtype=object)[rng.choice(len(LOCATIONS), rows, p=zipf_weights(len(LOCATIONS)))],
+        "payment_method": np.array(PAYMENT_METHODS, dtype=object)[
+            rng.choice(len(PAYMENT_METHODS), rows, p=zipf_weights(len(PAYMENT_METHODS), 0.8))],
+        "customer_id": rng.zipf(1.3, rows) % 1000000,
+        "customer_gender": np.array(GENDERS, dtype=object)[rng.integers(0, 2, rows)],
+        "customer_age": np.clip(rng.normal(38, 12, rows).astype(int), 18, 80),
+    })
+
+
+def to_layout(df, layout):
+    """Rename and select canonical columns into a file layout."""
+    if layout == "data1":
+        return df[DATA1_COLUMNS]
+    mapping = Config.COLUMN_MAPPINGS[layout]  # file column -> canonical column
+    return pd.DataFrame({source: df[canonical] for source, canonical in mapping.items()})
+
+
+def generate(path, rows, layout="data1", seed=0, chunk_size=None):
+    """Write rows synthetic sales rows to a CSV file, chunk_size rows at a time."""
+    chunk_size = chunk_size or CHUNK_SIZE
+    rng = np.random.default_rng(seed)
+    written = 0
+    with open(path, "w", newline="") as f:
+        while written < rows:
+            n = min(chunk_size, rows - written)
+            to_layout(generate_chunk(rng, 10001 + written, n), layout).to_csv(f, index=False, header=written == 0)
+            written += n
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic sales data.")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--layout", choices=LAYOUTS, default="data1")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate(args.out, args.rows, args.layout, args.seed)
+    print(f"Wrote {args.rows} rows ({args.layout} layout) to {args.out} in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
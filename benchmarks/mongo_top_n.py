@@ -0,0 +1,78 @@
+#benchmarks/mongo_top_n.py
+# compares the top_n pipeline of mongo_query_generator with the old $$ROOT-pushing pipeline
+#
+# usage: python -m benchmarks.mongo_top_n --collection sales --group-by category --metric total_revenue
+
+import argparse
+import statistics
+import time
+from mongo_config import MongoDBConfig, Config
+from mongo_query_generator import QueryGenerator
+
+
+# the pipeline top_n used to generate: every document is copied into a per-group array
+def legacy_top_n_pipeline(group_by, metric, n):
+    return [
+        {"$group": {
+            "_id": f"${group_by}",
+            "transactions": {"$push": {"transaction": "$$ROOT", "metric": f"${metric}"}}
+        }},
+        {"$sort": {"metric": -1}},
+        {"$project": {"transactions": {"$slice": ["$transactions", n]}}}
+    ]
+
+
+def current_top_n_pipeline(group_by, metric, n):
+    generator = QueryGenerator(
+        Config.VALID_TOTAL_METRICS["default"],
+        Config.VALID_AVERAGE_METRICS["default"],
+        Config.VALID_GROUPS["default"],
+        Config.NUMERIC_FILTERS,
+        Config.STRING_FILTERS
+    )
+    return generator.generate_mongo_query("top_n", {"groups": (str(n), metric, group_by)})
+
+
+# run a pipeline `repeat` times; returns latencies in ms and the result size, or the error
+def time_pipeline(collection, pipeline, repeat, allow_disk_use):
+    latencies = []
+    results = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            results = len(list(collection.aggregate(pipeline, allowDiskUse=allow_disk_use,
+                                                    collation=Config.STRING_COLLATION)))
+        except Exception as e:
+            return None, str(e)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MongoDB top_n pipelines.")
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--group-by", default="category")
+    parser.add_argument("--metric", default="total_revenue")
+    parser.add_argument("--n", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-disk-use", action="store_true", help="run without allowDiskUse")
+    args = parser.parse_args()
+
+    collection = MongoDBConfig.get_client()[MongoDBConfig.DATABASE][args.collection]
+    print(f"Collection '{args.collection}': ~{collection.estimated_document_count()} documents")
+    pipelines = {
+        "legacy ($push $$ROOT)": legacy_top_n_pipeline(args.group_by, args.metric, args.n),
+        f"current ({Config.TOP_N_MODE})": current_top_n_pipeline(args.group_by, args.metric, args.n),
+    }
+    for name, pipeline in pipelines.items():
+        latencies, outcome = time_pipeline(collection, pipeline, args.repeat, not args.no_disk_use)
+        if latencies is None:
+            print(f"{name}: failed - {outcome}")
+        else:
+            print(f"{name}: median {statistics.median(latencies):.1f} ms, "
+                  f"min {min(latencies):.1f} ms over {args.repeat} runs, {outcome} result documents")
+    MongoDBConfig.close_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#benchmarks/suite.py
+# benchmark suite: loads a synthetic (or given) dataset into each backend, then records upload
+# throughput, p50/p95/p99 latency per query template and peak memory in a JSON report.
+# comparing the report with one from an earlier commit flags regressions
+#
+# usage: python -m benchmarks.suite --rows 100000 --backends sqlite mongomock --report bench.json
+#        python -m benchmarks.suite --rows 100000 --report new.json --compare old.json
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.backends import BACKENDS, open_backend, time_upload
+from benchmarks.datagen import LAYOUTS, generate
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# queries per template; runs cycle through them so results aren't one group-by column's
+TEMPLATE_QUERIES = {
+    "aggregate_by_category": ["total total_revenue by category", "total quantity by location",
+                              "total price by payment_method"],
+    "average_by_category": ["average price by category", "average quantity by location",
+                            "average total_revenue by payment_method"],
+    "top_n": ["top 3 total_revenue by category", "top 5 quantity by location", "top 2 price by payment_method"],
+    "aggregate_with_where": ["total total_revenue by category where price > 100",
+                             "total quantity by location where quantity > 2",
+                             "total price by payment_method where total_revenue < 50"],
+}
+# report fields where a larger value is worse
+LOWER_IS_BETTER = ("seconds", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb", "python_peak_mb")
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KB elsewhere
+
+
+def commit_id():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure_upload(chatdb, backend, dataset, target, rows, trace):
+    if trace:
+        tracemalloc.start()
+    try:
+        elapsed = time_upload(chatdb, backend, dataset, target)
+        python_peak = tracemalloc.get_traced_memory()[1] / 1e6 if trace else None
+    finally:
+        if trace:
+            tracemalloc.stop()
+    if elapsed is None:
+        return None
+    return {
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed),
+        "peak_rss_mb": peak_rss_mb(),
+        "python_peak_mb": round(python_peak, 1) if python_peak is not None else None,
+    }
+
+
+def measure_template(chatdb, queries, target, runs):
+    latencies = []
+    errors = []
+    for i in range(runs):
+        started = time.perf_counter()
+        try:
+            chatdb.execute(queries[i % len(queries)], target)
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+    if not latencies:
+        return {"runs": 0, "errors": len(errors), "error": errors[0]}
+    latencies.sort()
+    return {
+        "runs": len(latencies),
+        "errors": len(errors),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(latencies[-1], 3),
+    }
+
+
+def run_backend(backend, dataset, rows, args, sqlite_path):
+    try:
+        chatdb = open_backend(backend, sqlite_path)
+    except Exception as e:
+        return {"skipped": str(e)}
+    try:
+        upload = measure_upload(chatdb, backend, dataset, args.target, rows, args.tracemalloc)
+        if upload is None:
+            return {"skipped": "upload failed"}
+        print(f"{backend}: upload {upload['seconds']} s ({upload['rows_per_sec']:,} rows/sec)")
+        templates = {}
+        for template, queries in TEMPLATE_QUERIES.items():
+            templates[template] = stats = measure_template(chatdb, queries, args.target, args.runs)
+            if stats["runs"]:
+                print(f"{backend}: {template} p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, "
+                      f"p99 {stats['p99_ms']} ms")
+            else:
+                print(f"{backend}: {template} failed ({stats['error']})")
+        return {"upload": upload, "templates": templates, "peak_rss_mb": peak_rss_mb()}
+    except Exception as e:
+        return {"skipped": str(e)}
+    finally:
+        chatdb.close()
+
+
+def compare(report, baseline, threshold):
+    """Print metrics that changed by more than threshold percent against a baseline report."""
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} (threshold {threshold}%):")
+    regressions = 0
+    for backend, result in report["backends"].items():
+        old = baseline.get("backends", {}).get(backend, {})
+        pairs = [("upload", result.get("upload", {}), old.get("upload", {}))]
+        pairs += [(t, stats, old.get("templates", {}).get(t, {})) for t, stats in result.get("templates", {}).items()]
+        for name, new_stats, old_stats in pairs:
+            for field in LOWER_IS_BETTER:
+                before, after = old_stats.get(field), new_stats.get(field)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before * 100
+                if abs(change) >= threshold:
+                    regressions += change > 0
+                    label = "REGRESSION" if change > 0 else "improvement"
+                    print(f"- {backend} {name} {field}: {before} -> {after} ({change:+.1f}%) {label}")
+    if not regressions:
+        print("No regressions.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ChatDB benchmark suite.")
+    parser.add_argument("--dataset", help="CSV file to load (default: generate --rows synthetic rows)")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--layout", choices=LAYOUTS, default="data1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["sqlite"])
+    parser.add_argument("--target", default="benchmark", help="table/collection the dataset is loaded into")
+    parser.add_argument("--runs", type=int, default=30, help="query runs per template")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also record the Python heap peak during upload (slows the upload down)")
+    parser.add_argument("--report", default="benchmark_report.json")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change reported by --compare")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = args.dataset
+        if dataset is None:
+            dataset = os.path.join(tmp, f"sales_{args.rows}.csv")
+            started = time.perf_counter()
+            generate(dataset, args.rows, args.layout, args.seed)
+            print(f"Generated {args.rows} rows ({args.layout} layout) in {time.perf_counter() - started:.1f} s")
+            rows = args.rows
+        else:
+            with open(dataset) as f:
+                rows = sum(1 for _ in f) - 1
+
+        report = {
+            "commit": commit_id(),
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": {"path": args.dataset, "rows": rows, "layout": args.layout, "seed": args.seed,
+                        "bytes": os.path.getsize(dataset)},
+            "runs_per_template": args.runs,
+            "backends": {},
+        }
+        for backend in args.backends:
+            report["backends"][backend] = run_backend(
+                backend, dataset, rows, args, os.path.join(tmp, "benchmark.sqlite"))
+            if "skipped" in report["backends"][backend]:
+                print(f"{backend}: skipped ({report['backends'][backend]['skipped']})")
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.report}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#cache.py
+# bounded caches shared by the MySQL and MongoDB backends
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    '''
+    Thread-safe least-recently-used cache with hit/miss counters.
+
+    args:
+        maxsize: number of entries kept before the least recently used is evicted
+    '''
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ResultCache:
+    '''
+    Cache of executed query results keyed on (backend, dataset, query).
+
+    args:
+        maxsize: entries kept in memory (and on disk) before LRU eviction
+        ttl: seconds a result stays valid; None keeps it until evicted or invalidated
+        path: optional SQLite file so warm results survive restarts
+
+    Backends call invalidate() whenever a table or collection is reloaded
+    or dropped, which removes every cached result for that dataset.
+    '''
+    def __init__(self, maxsize=256, ttl=None, path=None):
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize)
+        self.store = _ResultStore(path, maxsize) if path else None
+
+    def get(self, backend, dataset, query):
+        key = (backend, dataset, query)
+        entry = self.memory.get(key)
+        if entry is None and self.store:
+            entry = self.store.get(key)
+            if entry is not None:
+                self.memory.put(key, entry)
+        if entry is None:
+            return None
+        expires, rows = entry
+        if expires is not None and expires < time.time():
+            self.memory.pop(key)
+            if self.store:
+                self.store.delete(key)
+            return None
+        return rows
+
+    def put(self, backend, dataset, query, rows):
+        key = (backend, dataset, query)
+        entry = (time.time() + self.ttl if self.ttl else None, rows)
+        self.memory.put(key, entry)
+        if self.store:
+            self.store.put(key, entry)
+
+    def invalidate(self, backend, dataset):
+        for key in self.memory.keys():
+            if key[:2] == (backend, dataset):
+                self.memory.pop(key)
+        if self.store:
+            self.store.delete_dataset(backend, dataset)
+
+    def stats(self) -> dict:
+        return self.memory.stats()
+
+
+class _ResultStore:
+    # SQLite-backed persistence for ResultCache entries
+    def __init__(self, path, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (backend TEXT, dataset TEXT, query TEXT, "
+            "expires REAL, used REAL, rows BLOB, PRIMARY KEY (backend, dataset, query))")
+        self.conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT expires, rows FROM results WHERE backend = ? AND dataset = ? AND query = ?",
+                key).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE results SET used = ? WHERE backend = ? AND dataset = ? AND query = ?",
+                              (time.time(), *key))
+            self.conn.commit()
+        return row[0], pickle.loads(row[1])
+
+    def put(self, key, entry):
+        expires, rows = entry
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                              (*key, expires, time.time(), pickle.dumps(rows)))
+            self.conn.execute("DELETE FROM results WHERE rowid NOT IN "
+                              "(SELECT rowid FROM results ORDER BY used DESC LIMIT ?)", (self.maxsize,))
+            self.conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self.conn.execute("DELETE FROM results WHERE backend = ? AND dataset = ? AND query = ?", key)
+            self.conn.commit()
+
+    def delete_dataset(self, backend, dataset):
+        with self._lock:
+            self.conn.execute("DELETE FROM results WHERE backend = ? AND dataset = ?", (backend, dataset))
+            self.conn.commit()
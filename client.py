@@ -0,0 +1,205 @@
+#client.py
+# thin client for server.py: offers the commands of the SQL interface while the server
+# holds the backends, so starting a session costs no model loading or connection setup
+
+import json
+from urllib import error, parse, request
+from results import ResultPager
+from metrics import export_snapshot, print_snapshot
+from explain import print_plan
+
+SERVER_URL = "http://127.0.0.1:8551"
+PAGE_SIZE = 20  # rows printed per page
+
+
+class ChatDBClient:
+    '''
+    Backend stand-in that forwards every command to a running ChatDB server.
+
+    args:
+        url: base URL of the server, e.g. http://127.0.0.1:8551
+        backend: backend the server runs the commands on (mysql, mongo or sqlite)
+
+    Uploaded files are read and exported files written by the server, so paths must be valid
+    on the server's machine.
+    '''
+    def __init__(self, url=None, backend="mysql"):
+        self.url = (url or SERVER_URL).rstrip("/")
+        self.backend = backend
+        self.selected_table = None
+        self.pager = None  # rows of the last query, shown a page at a time
+        self.refinement = None  # (query, step) of the last approximate query, continued by refine
+        self._call("GET", "/health")  # fail now rather than on the first command
+
+    def _call(self, method, path, params=None):
+        params = dict(params or {}, backend=self.backend)
+        if method == "GET":
+            req = request.Request(f"{self.url}{path}?{parse.urlencode(params)}")
+        else:
+            req = request.Request(self.url + path, data=json.dumps(params).encode(), method="POST",
+                                  headers={"Content-Type": "application/json"})
+        try:
+            with request.urlopen(req) as response:
+                return json.load(response)
+        except error.HTTPError as e:
+            # the server reports failures as {"error": ...}
+            raise RuntimeError(json.load(e).get("error", str(e))) from None
+
+    def has_checkpoint(self, dataset_path, target):
+        """Whether the server holds a checkpoint for an interrupted upload of this file."""
+        name = target.split(":", 1)[-1]
+        return self._call("GET", "/checkpoint", {"path": dataset_path, "target": name})["exists"]
+
+    def upload_dataset(self, dataset_path, table_name, resume=False, columns=None, append=False):
+        print(f"Uploading {dataset_path} on the server...")
+        try:
+            self._call("POST", "/upload", {"path": dataset_path, "target": table_name, "resume": resume,
+                                           "columns": columns, "append": append})
+            print(f"Dataset successfully uploaded as '{table_name}'.")
+            return table_name
+        except Exception as e:
+            print(f"Error uploading dataset: {e}")
+            return None
+
+    def export_dataset(self, table, path):
+        """Have the server export a table/collection to a Parquet file on its filesystem."""
+        print(f"Exporting '{table}' on the server...")
+        try:
+            result = self._call("POST", "/export", {"target": table, "path": path})
+            print(f"Exported '{table}' to {result['path']} on the server.")
+            return path
+        except Exception as e:
+            print(f"Error exporting '{table}': {e}")
+            return None
+
+    def explore_tables(self):
+        """Display available tables and allow user to select a table."""
+        try:
+            tables = self._call("GET", "/explore")["datasets"]
+            if not tables:
+                print("No tables found.")
+                return
+            print("\nAvailable Tables:")
+            for idx, table in enumerate(tables, 1):
+                print(f"{idx}. {table}")
+            while True:
+                try:
+                    selection = int(input("Enter the number of the table you want to explore: "))
+                    if selection < 1 or selection > len(tables):
+                        print(f"Please enter a number between 1 and {len(tables)}.")
+                    else:
+                        self.selected_table = tables[selection - 1]
+                        self.describe_table(self.selected_table)
+                        break
+                except ValueError:
+                    print("Invalid input. Please enter a valid number.")
+        except Exception as e:
+            print(f"Error fetching tables: {e}")
+
+    def describe_table(self, table):
+        """Display table schema and sample data."""
+        described = self._call("GET", "/explore", {"target": table})
+        print(f"\n### {table.upper()} ###")
+        print("Schema:")
+        for name, column_type in described["schema"]:
+            print(f"- {name} ({column_type})")
+        if described["sample"]:
+            print("\nSample Data:")
+            for row in described["sample"]:
+                print(row)
+
+    def show_sample_queries(self):
+        try:
+            queries = self._call("GET", "/sample_queries", {"n": 5})["queries"]
+        except Exception as e:
+            print(f"Error generating sample queries: {e}")
+            return
+        print("\nSample Queries:")
+        for idx, query in enumerate(queries, start=1):
+            print(f"{idx}. {query}")
+
+    def process_query(self, query, explain=False, approx=False):
+        if not self.selected_table:
+            print("Please explore and select a table first.")
+            return
+        if approx:
+            self._process_approx(query, 0)
+            return
+        try:
+            result = self._call("POST", "/query", {"query": query, "target": self.selected_table})
+            plan = explain and self._call("POST", "/explain", {"query": query, "target": self.selected_table})
+        except Exception as e:
+            print(f"Error executing query: {e}")
+            return
+        print("\nExecuting:")
+        print(result["statement"])
+        if plan:
+            print_plan(plan)
+        if result["truncated"]:
+            print(f"(the server returned the first {len(result['rows'])} rows)")
+        self.pager = ResultPager(result["rows"], PAGE_SIZE)
+        print("\nResults:")
+        self.pager.print_page()
+
+    def refine(self):
+        """Refine the last approximate answer from a larger sample, or run it exactly after the last step."""
+        if self.refinement is None:
+            print("No approximate query to refine; run one with approx first.")
+            return
+        query, step = self.refinement
+        self._process_approx(query, step + 1)
+
+    def _process_approx(self, query, step):
+        self.refinement = None
+        try:
+            result = self._call("POST", "/approx", {"query": query, "target": self.selected_table, "step": step})
+        except Exception as e:
+            print(f"Error executing query: {e}")
+            return
+        if result["exact"]:  # every step was shown
+            print("\nExact result:")
+            print(result["statement"])
+            self.pager = ResultPager(result["rows"], PAGE_SIZE)
+            print("\nResults:")
+            self.pager.print_page()
+            return
+        print("\nExecuting (on the sample):")
+        print(result["statement"])
+        self.pager = ResultPager(result["rows"], PAGE_SIZE)
+        print(f"\nResults (estimated from {result['rate']:.2%} of the rows, with confidence intervals (low, high)):")
+        self.pager.print_page()
+        self.refinement = (query, step)
+        print("Type 'refine' for a more precise answer.")
+
+    def show_more(self):
+        """Print the next page of the last query's results."""
+        if self.pager is None or not self.pager.has_more():
+            print("No more results.")
+            return
+        self.pager.print_page()
+
+    def show_stats(self):
+        """Print the server's timings, counters and cache statistics for this backend."""
+        try:
+            result = self._call("GET", "/stats")
+        except Exception as e:
+            print(f"Error fetching stats: {e}")
+            return
+        print_snapshot(result["metrics"], result["caches"])
+
+    def export_stats(self, path=None):
+        """Write the server's metrics for this backend to a local file."""
+        try:
+            snapshot = self._call("GET", "/stats")["metrics"]
+            print(f"Metrics written to {export_snapshot(snapshot, path, {'backend': self.backend, 'server': self.url})}.")
+        except Exception as e:
+            print(f"Error writing metrics: {e}")
+
+    def show_index_status(self):
+        print("Index commands aren't available through the server; run them in a local session.")
+
+    def build_indexes(self):
+        self.show_index_status()
+
+    def close(self):
+        self.pager = None
@@ -0,0 +1,183 @@
+#columnar.py
+# Parquet and Arrow IPC files for uploads and exports; pyarrow is only needed for these formats
+
+import itertools
+import os
+import re
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # CSV uploads work without it
+    pa = pq = None
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")  # Arrow IPC file (Feather v2) or stream format
+DATASET_EXTENSIONS = (".csv",) + PARQUET_EXTENSIONS + ARROW_EXTENSIONS  # every format uploads accept
+COMPRESSION = "zstd"  # codec of exported Parquet files
+
+
+def is_columnar(path) -> bool:
+    return path.lower().endswith(PARQUET_EXTENSIONS + ARROW_EXTENSIONS)
+
+
+def is_dataset(path) -> bool:
+    return path.lower().endswith(DATASET_EXTENSIONS)
+
+
+def _require():
+    if pa is None:
+        raise RuntimeError("Parquet and Arrow files need pyarrow (pip install pyarrow)")
+
+
+def read_batches(path, chunk_size, start_row=0, columns=None):
+    """Yield a Parquet or Arrow IPC file as record batches of at most chunk_size rows.
+
+    Files are memory-mapped and only the columns listed in columns (all
+    if None) are decoded. Uncompressed Arrow data is used in place, without
+    a copy. The first start_row rows are skipped: whole Parquet row groups
+    are never read, and Arrow tables are sliced.
+    """
+    _require()
+    if path.lower().endswith(PARQUET_EXTENSIONS):
+        parquet = pq.ParquetFile(path, memory_map=True)
+        groups, skip = [], start_row
+        for i in range(parquet.num_row_groups):
+            rows = parquet.metadata.row_group(i).num_rows
+            if not groups and skip >= rows:
+                skip -= rows
+            else:
+                groups.append(i)
+        if not groups:
+            return
+        batches = parquet.iter_batches(batch_size=chunk_size, row_groups=groups, columns=columns)
+    else:
+        table = _read_ipc(path)
+        if columns:
+            table = table.select(columns)
+        batches, skip = table.slice(start_row).to_batches(max_chunksize=chunk_size), 0
+    for batch in batches:
+        if skip:  # rest of the first row group
+            dropped = min(skip, batch.num_rows)
+            batch, skip = batch.slice(dropped), skip - dropped
+        if batch.num_rows:
+            yield batch
+
+
+def column_names(path):
+    """Column names of a Parquet or Arrow IPC file, read from its schema alone."""
+    _require()
+    if path.lower().endswith(PARQUET_EXTENSIONS):
+        return pq.ParquetFile(path, memory_map=True).schema_arrow.names
+    return _open_ipc(path).schema.names
+
+
+def _read_ipc(path):
+    return _open_ipc(path).read_all()
+
+
+def _open_ipc(path):
+    source = pa.memory_map(path)
+    try:
+        return pa.ipc.open_file(source)
+    except pa.ArrowInvalid:  # not the file format: read it as a stream
+        source.seek(0)
+        return pa.ipc.open_stream(source)
+
+
+def to_frame(batch):
+    """DataFrame of a record batch; dates come out as datetime64 so the schema inferrer types them."""
+    return batch.to_pandas(date_as_object=False)
+
+
+def sql_schema(columns):
+    """Arrow schema for (name, SQL type) pairs as reported by DESCRIBE or PRAGMA table_info."""
+    _require()
+    return pa.schema([(name, _arrow_type(str(sql_type).lower())) for name, sql_type in columns])
+
+
+def _arrow_type(sql_type):
+    decimal = re.match(r"decimal\((\d+),\s*(\d+)\)", sql_type)
+    if decimal:
+        return pa.decimal128(int(decimal.group(1)), int(decimal.group(2)))
+    if sql_type.startswith(("tinyint(1)", "bool")):
+        return pa.bool_()
+    if "int" in sql_type:
+        return pa.int64()
+    if sql_type.startswith(("real", "double", "float")):
+        return pa.float64()
+    if sql_type.startswith(("datetime", "timestamp")):
+        return pa.timestamp("us")
+    if sql_type.startswith("date"):
+        return pa.date32()
+    return pa.string()
+
+
+def rows_to_batches(rows, schema, size):
+    """Record batches of at most size result tuples, each converted one column at a time."""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            break
+        arrays = []
+        for field, column in zip(schema, zip(*chunk)):
+            if field.type == pa.bool_():
+                arrays.append(pa.array(column, type=pa.int8()).cast(pa.bool_()))  # TINYINT(1) comes back as 0/1
+            else:
+                arrays.append(pa.array(column, type=field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def frame_schema(frames):
+    """Arrow schema covering every DataFrame in frames.
+
+    Columns missing from some frames are still included, types that differ
+    between frames are widened (int64 and float64 give float64), and columns
+    that are empty throughout are typed as strings.
+    """
+    _require()
+    schemas = []
+    for df in frames:
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        empty = set(df.columns[df.isna().all()])
+        schemas.append(pa.schema([(field.name, pa.null() if field.name in empty else field.type)
+                                  for field in schema]))
+    if not schemas:
+        return None
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+    # newer pandas infer large_string, which RecordBatch.from_pandas can't convert to
+    return pa.schema([(field.name, pa.string() if field.type in (pa.null(), pa.large_string()) else field.type)
+                      for field in schema])
+
+
+def frame_to_batch(df, schema):
+    """Record batch of a DataFrame in the given schema; NaN becomes null and missing columns are null."""
+    df = df.reindex(columns=schema.names)
+    empty = df.columns[df.isna().all()]
+    df[empty] = df[empty].astype(object)  # an all-NaN float column converts to nulls of any type as object
+    return pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def write_parquet(path, schema, batches):
+    """Write record batches to a Parquet file, one row group per batch; returns the rows written.
+
+    The file is written under a temporary name and renamed when complete,
+    so a failed export never leaves a truncated file behind.
+    """
+    _require()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    rows = 0
+    try:
+        with pq.ParquetWriter(path + ".tmp", schema, compression=COMPRESSION) as writer:
+            for batch in batches:
+                writer.write_table(pa.Table.from_batches([batch], schema=schema))
+                rows += batch.num_rows
+        os.replace(path + ".tmp", path)
+    finally:
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+    return rows
@@ -0,0 +1,202 @@
+#compare.py
+# runs one question on the MySQL and MongoDB backends at once, diffs the answers, and learns
+# per query template which backend answers faster so questions can be routed automatically
+
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROUTING_PATH = os.path.join(".chatdb_cache", "routing.json")
+MIN_RUNS = 3  # runs per backend before a template is routed
+ALPHA = 0.3  # weight of the newest latency in the moving average
+TOLERANCE = 1e-6  # relative difference at which two aggregate values disagree
+
+
+class LatencyRouter:
+    '''
+    Per-template latency record of each backend, persisted as JSON.
+
+    args:
+        path: JSON file the record is loaded from and saved to
+        min_runs: runs every backend needs on a template before it is routed
+        alpha: weight of the newest run in the exponential moving average
+
+    Latencies are kept as a moving average, so a backend that gets faster
+    (new index, rollup, warmer cache) wins its templates back over time.
+    '''
+    def __init__(self, path=ROUTING_PATH, min_runs=MIN_RUNS, alpha=ALPHA):
+        self.path = path
+        self.min_runs = min_runs
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self.templates = {}  # template -> backend -> {"runs", "avg_ms"}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.templates = json.load(f)
+
+    def record(self, template, backend, ms):
+        with self._lock:
+            stats = self.templates.setdefault(template, {}).setdefault(backend, {"runs": 0, "avg_ms": ms})
+            stats["avg_ms"] += self.alpha * (ms - stats["avg_ms"])
+            stats["runs"] += 1
+
+    def fastest(self, template, backends):
+        """Backend with the lowest average latency for a template, or None until each has min_runs runs."""
+        stats = self.templates.get(template, {})
+        if any(stats.get(name, {}).get("runs", 0) < self.min_runs for name in backends):
+            return None
+        return min(backends, key=lambda name: stats[name]["avg_ms"])
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, "w") as f:
+            json.dump(self.templates, f, indent=2)
+
+    def print_routes(self):
+        if not self.templates:
+            print("No latencies recorded yet; run some comparisons first.")
+            return
+        print("\nRecorded latencies per template:")
+        for template, stats in self.templates.items():
+            timings = ", ".join(f"{name} {s['avg_ms']:.1f} ms ({s['runs']} runs)" for name, s in stats.items())
+            winner = self.fastest(template, list(stats))
+            print(f"- {template}: {timings} -> " + (f"routed to {winner}" if winner else "not routed yet"))
+
+
+class CompareRunner:
+    '''
+    Parses a question once per backend and runs it on all of them concurrently.
+
+    args:
+        backends: backend name -> backend instance (ChatDB, ChatDBMongo, ...)
+        targets: backend name -> table/collection the question runs against
+        router: LatencyRouter that every run is recorded in
+    '''
+    def __init__(self, backends, targets, router=None):
+        self.backends = backends
+        self.targets = targets
+        self.router = router or LatencyRouter()
+
+    def parse(self, question):
+        """backend name -> (query_type, params) for the backends that recognize the question."""
+        parsed = {}
+        for name, chatdb in self.backends.items():
+            query_type, params = chatdb.query_generator.parse_query(question)
+            if query_type:
+                parsed[name] = query_type, params
+        return parsed
+
+    def _run(self, name, query_type, params):
+        started = time.perf_counter()
+        try:
+            statement, rows = self.backends[name].execute_parsed(query_type, params, self.targets[name])
+            outcome = {"statement": statement, "rows": rows, "error": None}
+        except Exception as e:
+            outcome = {"statement": None, "rows": None, "error": str(e)}
+        outcome["ms"] = (time.perf_counter() - started) * 1000
+        if outcome["error"] is None:
+            self.router.record(query_type, name, outcome["ms"])
+        return outcome
+
+    def compare(self, question):
+        """Run a question on every backend at once; returns the per-backend outcomes and their diff."""
+        parsed = self.parse(question)
+        with ThreadPoolExecutor(max_workers=len(self.backends)) as pool:
+            futures = {name: pool.submit(self._run, name, *parsed[name]) for name in parsed}
+            outcomes = {name: future.result() for name, future in futures.items()}
+        self.router.save()
+        templates = {query_type for query_type, _ in parsed.values()}
+        return {"template": "/".join(sorted(templates)) or None, "backends": outcomes, "diff": diff_results(outcomes)}
+
+    def route(self, question):
+        """Run a question only on the backend recorded as fastest for its template (else on all of them)."""
+        parsed = self.parse(question)
+        if not parsed:
+            return None, None
+        templates = {query_type for query_type, _ in parsed.values()}
+        winner = self.router.fastest(templates.pop(), list(self.backends)) if len(templates) == 1 else None
+        if winner is None or winner not in parsed:
+            return None, self.compare(question)
+        outcome = self._run(winner, *parsed[winner])
+        self.router.save()
+        return winner, outcome
+
+
+def diff_results(outcomes):
+    """Compare the (group -> value) answers of the backends that succeeded."""
+    answers = {}
+    for name, outcome in outcomes.items():
+        if outcome["error"] is None:
+            answers[name] = normalize_rows(outcome["rows"])
+    if len(answers) < 2:
+        return None
+    if any(answer is None for answer in answers.values()):
+        return {"comparable": False}
+    (first, a), (second, b) = list(answers.items())[:2]
+    mismatched = [(key, a[key], b[key]) for key in a.keys() & b.keys() if not _same(a[key], b[key])]
+    return {
+        "comparable": True,
+        "only_in": {first: sorted(map(str, a.keys() - b.keys())), second: sorted(map(str, b.keys() - a.keys()))},
+        "mismatched": sorted(mismatched, key=lambda m: str(m[0])),
+        "agree": a.keys() == b.keys() and not mismatched,
+    }
+
+
+def normalize_rows(rows):
+    """Map a result to {group: value}; SQL rows are (group, value), MongoDB documents {_id, *_metric}.
+
+    Returns None for results that aren't one value per group (MongoDB per-group top_n).
+    """
+    answer = {}
+    for row in rows:
+        if isinstance(row, dict):
+            if "total_metric" not in row and "avg_metric" not in row:
+                return None
+            key, value = row.get("_id"), row.get("avg_metric", row.get("total_metric"))
+        else:
+            key, value = row[0], row[-1]
+        answer[_group(key)] = None if value is None else float(value)
+    return answer
+
+
+def _group(key):
+    # both engines group strings case-insensitively; missing groups come back as NULL, NaN or ''
+    if key is None or key == "" or (isinstance(key, float) and math.isnan(key)):
+        return None
+    return str(key).casefold()
+
+
+def _same(a, b):
+    if a is None or b is None:
+        return a is b
+    return math.isclose(a, b, rel_tol=TOLERANCE, abs_tol=TOLERANCE)
+
+
+def print_comparison(report):
+    if not report["backends"]:
+        print("Query not recognized by any backend.")
+        return
+    print(f"\nTemplate: {report['template']}")
+    for name, outcome in report["backends"].items():
+        status = f"error: {outcome['error']}" if outcome["error"] else f"{len(outcome['rows'])} rows"
+        print(f"- {name}: {outcome['ms']:.1f} ms, {status}")
+    diff = report["diff"]
+    if diff is None:
+        return
+    if not diff["comparable"]:
+        print("Results are not comparable (not one value per group).")
+    elif diff["agree"]:
+        print("Results agree.")
+    else:
+        for name, keys in diff["only_in"].items():
+            if keys:
+                print(f"Only in {name}: {', '.join(keys)}")
+        for key, a, b in diff["mismatched"]:
+            print(f"Different value for {key}: {a} vs {b}")
@@ -0,0 +1,148 @@
+#explain.py
+# query plan summaries shared by the backends: rows examined vs returned, the indexes used,
+# and whether the plan scans a whole table/collection
+
+import re
+
+# MySQL EXPLAIN ANALYZE tree: "-> Table scan on sales  (cost=...) (actual time=0.04..2.1 rows=1000 loops=1)"
+_ACCESS = re.compile(r"-> (Table scan|Index scan|Covering index scan|Index range scan|Index lookup|"
+                     r"Covering index lookup|Single-row index lookup|Index skip scan|Covering index skip scan|"
+                     r"Full-text index search|Constant row from) on (\S+)(?: using (\S+))?")
+_ACTUAL = re.compile(r"actual time=[\d.e+-]+\.\.[\d.e+-]+ rows=([\d.e+]+) loops=(\d+)")
+# SQLite EXPLAIN QUERY PLAN details: "SCAN sales", "SEARCH sales USING INDEX idx (price>?)"
+_SQLITE_ACCESS = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+))?")
+
+
+def _summary(backend, statement, plan, examined=None, returned=None, indexes=(), full_scans=(),
+             estimated=False):
+    return {
+        "backend": backend,
+        "statement": statement,
+        "examined": examined,  # rows/documents the engine read (None if the engine doesn't report it)
+        "returned": returned,
+        "estimated": estimated,  # examined is the optimizer's estimate, not a measurement
+        "indexes": sorted(set(indexes)),
+        "full_scans": sorted(set(full_scans)),  # tables/collections read in full
+        "plan": plan,
+    }
+
+
+def _actual_rows(line):
+    match = _ACTUAL.search(line)
+    return round(float(match.group(1)) * int(match.group(2))) if match else 0
+
+
+def summarize_mysql_analyze(statement, tree):
+    """Summarize the plan tree printed by MySQL's EXPLAIN ANALYZE (8.0.18+)."""
+    lines = tree.splitlines()
+    examined, indexes, full_scans = 0, [], []
+    for line in lines:
+        match = _ACCESS.search(line)
+        # <temporary> and derived tables are intermediate results, not stored data
+        if not match or match.group(2).startswith("<"):
+            continue
+        access, table, index = match.groups()
+        examined += _actual_rows(line)
+        if index:
+            indexes.append(index)
+        if access == "Table scan":
+            full_scans.append(table)
+    return _summary("mysql", statement, tree, examined, _actual_rows(lines[0]) if lines else 0,
+                    indexes, full_scans)
+
+
+def summarize_mysql_explain(statement, rows, returned=None):
+    """Summarize a traditional EXPLAIN (servers without EXPLAIN ANALYZE); examined is an estimate.
+
+    rows are dicts keyed on the EXPLAIN column names.
+    """
+    examined, indexes, full_scans = 0, [], []
+    for row in rows:
+        if not row.get("table") or str(row["table"]).startswith("<"):
+            continue
+        examined += int(row.get("rows") or 0)
+        if row.get("key"):
+            indexes.append(row["key"])
+        if row.get("type") == "ALL":
+            full_scans.append(row["table"])
+    plan = "\n".join(" ".join(f"{k}={v}" for k, v in row.items() if v is not None) for row in rows)
+    return _summary("mysql", statement, plan, examined, returned, indexes, full_scans, estimated=True)
+
+
+def summarize_sqlite_plan(statement, rows, returned=None):
+    """Summarize SQLite's EXPLAIN QUERY PLAN rows (id, parent, notused, detail).
+
+    SQLite doesn't report rows examined, so only the access paths are summarized.
+    """
+    indexes, full_scans = [], []
+    for row in rows:
+        match = _SQLITE_ACCESS.match(row[3])
+        if not match:
+            continue
+        access, table, index = match.groups()
+        if index:
+            indexes.append(index)
+        elif access == "SCAN":
+            full_scans.append(table)
+    plan = "\n".join(row[3] for row in rows)
+    return _summary("sqlite", statement, plan, None, returned, indexes, full_scans)
+
+
+def summarize_mongo_explain(statement, explained, collection):
+    """Summarize the output of the explain command with executionStats verbosity.
+
+    The winning plans are searched wherever the server nests them (the
+    whole pipeline, or the $cursor stage feeding the rest of it);
+    rejected plans are ignored.
+    """
+    stages, stats = [], []
+    _walk(explained, stages, stats)
+    examined = sum(s.get("totalDocsExamined", 0) for s in stats)
+    keys = sum(s.get("totalKeysExamined", 0) for s in stats)
+    returned = None
+    pipeline_stages = explained.get("stages")
+    if pipeline_stages and "nReturned" in pipeline_stages[-1]:
+        returned = pipeline_stages[-1]["nReturned"]  # out of the last pipeline stage
+    elif stats:
+        returned = stats[-1].get("nReturned")
+    indexes = [stage["indexName"] for stage in stages if stage.get("indexName")]
+    full_scans = [collection] if any(stage.get("stage") == "COLLSCAN" for stage in stages) else []
+    summary = _summary("mongo", statement, " -> ".join(stage["stage"] for stage in stages),
+                       examined, returned, indexes, full_scans)
+    summary["keys_examined"] = keys
+    return summary
+
+
+def _walk(node, stages, stats):
+    if isinstance(node, list):
+        for item in node:
+            _walk(item, stages, stats)
+    elif isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            stages.append(node)
+        for key, value in node.items():
+            if key == "rejectedPlans" or key == "allPlansExecution":
+                continue
+            if key == "executionStats" and isinstance(value, dict):
+                stats.append(value)
+                continue  # its executionStages repeat the winning plan with counters
+            _walk(value, stages, stats)
+
+
+def print_plan(summary):
+    """Print a plan summary, warning when the plan reads a whole table/collection."""
+    print("\nQuery plan:")
+    for line in summary["plan"].splitlines() if summary["plan"] else []:
+        print(f"  {line}")
+    examined = "n/a" if summary["examined"] is None else f"{summary['examined']:,}"
+    if summary["estimated"] and summary["examined"] is not None:
+        examined += " (estimated)"
+    returned = "n/a" if summary["returned"] is None else f"{summary['returned']:,}"
+    print(f"Rows examined: {examined}, returned: {returned}")
+    if "keys_examined" in summary:
+        print(f"Index keys examined: {summary['keys_examined']:,}")
+    print(f"Indexes used: {', '.join(summary['indexes']) or 'none'}")
+    if summary["full_scans"]:
+        kind = "COLLSCAN" if summary["backend"] == "mongo" else "full table scan"
+        print(f"WARNING: {kind} on {', '.join(summary['full_scans'])}; "
+              "see 'index status' for indexes that would serve this query.")
@@ -0,0 +1,123 @@
+#index_advisor.py
+# index proposals and coverage reports shared by the MySQL and MongoDB backends
+
+import hashlib
+import threading
+from collections import Counter
+
+# query templates reported by status()
+GROUPED_TEMPLATES = ["aggregate_by_category", "average_by_category", "top_n"]
+FILTERED_TEMPLATES = ["aggregate_with_where"]
+
+
+def query_shape(query_type, groups):
+    """Return (group_by, metric, filter_column) for a parsed query's regex groups, or None."""
+    if query_type == "top_n":
+        return groups[2], groups[1], None
+    if query_type in ("aggregate_with_where", "average_with_where"):
+        return groups[1], groups[0], groups[2]
+    if query_type in ("aggregate_by_category", "average_by_category"):
+        return groups[1], groups[0], None
+    return None
+
+
+def shape_columns(shape, columns):
+    """Index columns that serve a query shape: filter first, then group-by, then metric."""
+    group_by, metric, filter_column = shape
+    ordered = dict.fromkeys(c for c in (filter_column, group_by, metric) if c in columns)
+    return tuple(ordered)
+
+
+def index_name(dataset, columns, prefix="idx"):
+    name = f"{prefix}_{dataset}_{'_'.join(columns)}"
+    if len(name) > 64:  # MySQL identifier limit
+        name = f"{prefix}_{dataset[:40]}_{hashlib.md5(name.encode()).hexdigest()[:12]}"
+    return name
+
+
+class IndexAdvisor:
+    '''
+    Proposes indexes from the template catalog and the queries actually run.
+
+    args:
+        group_columns: columns the templates group by (VALID_GROUPS)
+        filter_columns: columns the templates filter on (NUMERIC_FILTERS, STRING_FILTERS)
+        group_uses_index: whether the engine can serve an unfiltered GROUP BY
+            from an index (MySQL can; a MongoDB $group without $match can't)
+
+    Every catalog column gets a single-field index. Every executed query is
+    passed to record(); shapes seen in practice get a compound (filter,
+    group-by, metric) index so the query can be answered from the index alone.
+    Safe to share between threads.
+    '''
+    def __init__(self, group_columns, filter_columns, group_uses_index=True):
+        self.group_columns = list(group_columns)
+        self.filter_columns = list(filter_columns)
+        self.catalog_columns = list(dict.fromkeys(self.group_columns + self.filter_columns))
+        self.group_uses_index = group_uses_index
+        self.observed = {}  # dataset -> Counter of (query_type, shape)
+        self._lock = threading.Lock()  # record() runs on every query, from any server thread
+
+    def record(self, dataset, query_type, groups):
+        shape = query_shape(query_type, groups)
+        if shape:
+            with self._lock:
+                self.observed.setdefault(dataset, Counter())[(query_type, shape)] += 1
+
+    def _observed(self, dataset) -> list:
+        """Observed (query_type, shape) keys of a dataset, most frequent first."""
+        with self._lock:
+            return [key for key, _ in self.observed.get(dataset, Counter()).most_common()]
+
+    def propose(self, dataset, columns) -> list:
+        """Index column tuples worth having on a dataset with the given columns."""
+        proposals = [(col,) for col in self.catalog_columns if col in columns]
+        for query_type, shape in self._observed(dataset):
+            if shape[2] is None and not self.group_uses_index:
+                continue
+            cols = shape_columns(shape, columns)
+            if len(cols) > 1:
+                proposals.append(cols)
+        return list(dict.fromkeys(proposals))
+
+    def missing(self, dataset, columns, existing) -> list:
+        """Proposals not already served by an existing index (any index prefix counts)."""
+        return [cols for cols in self.propose(dataset, columns)
+                if not any(tuple(idx[:len(cols)]) == cols for idx in existing.values())]
+
+    def status(self, dataset, columns, existing) -> list:
+        """Rows of (template, group_by, metric, filter_column, state, index) for the catalog and observed queries."""
+        groups = [c for c in self.group_columns if c in columns]
+        filters = [c for c in self.filter_columns if c in columns]
+        shapes = [(t, (g, None, None)) for t in GROUPED_TEMPLATES for g in groups]
+        shapes += [(t, (g, None, f)) for t in FILTERED_TEMPLATES for f in filters for g in groups if f != g]
+        shapes += self._observed(dataset)
+        rows = []
+        for query_type, shape in dict.fromkeys(shapes):
+            state, name = self._coverage(shape, columns, existing)
+            rows.append((query_type, *shape, state, name))
+        return rows
+
+    def _coverage(self, shape, columns, existing):
+        if shape[2] is None and not self.group_uses_index:
+            return "full scan", None
+        needed = shape_columns(shape, columns)
+        if not needed:
+            return "full scan", None
+        best = ("full scan", None)
+        for name, cols in existing.items():
+            if tuple(cols[:1]) != needed[:1]:
+                continue
+            # covered: every referenced column is in the index, so no table rows are read
+            if shape[1] in columns and set(needed) <= set(cols):
+                return "covered", name
+            best = ("indexed", name)
+        return best
+
+
+def print_index_status(rows):
+    print("\nIndex coverage:")
+    for query_type, group_by, metric, filter_column, state, name in rows:
+        template = f"{query_type}({metric or '*'} by {group_by}"
+        template += f" where {filter_column})" if filter_column else ")"
+        print(f"- {template}: {state}" + (f" [{name}]" if name else ""))
@@ -0,0 +1,190 @@
+#ingest.py
+# streaming dataset ingestion shared by the MySQL and MongoDB backends
+
+import json
+import os
+import time
+import pandas as pd
+from columnar import column_names, is_columnar, read_batches, to_frame
+from normalize import Normalizer
+
+CHUNK_SIZE = 50000  # rows held in memory at once while uploading
+CHECKPOINT_DIR = ".ingest_checkpoints"
+
+
+def rate(rows, started):
+    """Format a rows/sec throughput figure since a perf_counter start time."""
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    return f"{rows / elapsed:,.0f}"
+
+
+def read_chunks(path, chunk_size=None, start_row=0, metrics=None, columns=None):
+    """Yield the rows of a dataset file as DataFrames of at most chunk_size rows.
+
+    CSV files are parsed with pandas; Parquet and Arrow IPC files are read
+    as record batches (see columnar.py), which skips text parsing entirely.
+    Only the listed columns are loaded when columns is given.
+    start_row data rows are skipped without being parsed, which is what
+    makes resuming an upload cheap. CSV rows are counted as lines, so files
+    with quoted multi-line values should not be resumed mid-file.
+    With metrics, the time spent reading and parsing each chunk and the
+    bytes read from the file are recorded.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    if is_columnar(path):
+        yield from _read_columnar_chunks(path, chunk_size, start_row, metrics, columns)
+        return
+    names = pd.read_csv(path, nrows=0).columns
+    with open(path, "rb") as f:
+        reader = iter(pd.read_csv(f, chunksize=chunk_size, skiprows=start_row + 1,
+                                  header=None, names=names, usecols=columns))
+        position = 0
+        while True:
+            started = time.perf_counter()
+            chunk = next(reader, None)
+            if chunk is None:
+                break
+            if metrics:
+                metrics.record("upload.read", (time.perf_counter() - started) * 1000)
+                # the parser reads ahead in blocks, so per chunk this is approximate; the total is exact
+                metrics.count("upload.bytes_read", f.tell() - position)
+                position = f.tell()
+            yield chunk
+
+
+def read_header(path):
+    """Column names of a dataset file, without reading any rows."""
+    if is_columnar(path):
+        return column_names(path)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _read_columnar_chunks(path, chunk_size, start_row, metrics, columns):
+    batches = read_batches(path, chunk_size, start_row, columns)
+    while True:
+        started = time.perf_counter()
+        batch = next(batches, None)
+        if batch is None:
+            break
+        chunk = to_frame(batch)
+        if metrics:
+            metrics.record("upload.read", (time.perf_counter() - started) * 1000)
+            # the file is memory-mapped, so this counts the decoded column data instead of file reads
+            metrics.count("upload.bytes_read", batch.nbytes)
+        yield chunk
+
+
+def _checkpoint_path(path, target):
+    name = f"{os.path.basename(path)}.{target}.json".replace(os.sep, "_").replace(":", "_")
+    return os.path.join(CHECKPOINT_DIR, name)
+
+
+def has_checkpoint(path, target):
+    """Check whether an interrupted upload of path into target can be resumed."""
+    return StreamingIngest(path, target, resume=True).resumed
+
+
+class StreamingIngest:
+    '''
+    Drives a chunked upload of one dataset file into one table/collection.
+
+    args:
+        path: dataset file to read
+        target: backend-qualified destination, e.g. "mysql:sales"
+        chunk_size: rows per chunk, bounding peak memory
+        resume: continue from the last committed batch of a failed upload
+        metrics: Metrics that read times, bytes read and rows written are recorded in
+        columns: columns to load from the file, None for all of them
+        normalize: detect the file's feed layout from its header and yield chunks
+            in the unified schema (see normalize.Normalizer)
+
+    Backends iterate chunks(), write each chunk, then call commit() with the
+    number of rows written and any state (such as the inferred schema) they
+    need to pick the upload back up. The checkpoint is removed by finish().
+    '''
+    def __init__(self, path, target, chunk_size=None, resume=False, metrics=None, columns=None, normalize=False):
+        self.path = path
+        self.target = target
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self.metrics = metrics
+        self.columns = columns
+        self.normalize = normalize
+        self._normalizer = None
+        self.checkpoint_path = _checkpoint_path(path, target)
+        self.start_row, self.state = self._load_checkpoint() if resume else (0, None)
+        self.rows = self.start_row
+        self.started = time.perf_counter()
+
+    @property
+    def resumed(self):
+        return self.start_row > 0
+
+    @property
+    def normalizer(self):
+        """Normalizer of the file's layout, detected from its header on first use; None without normalize."""
+        if self.normalize and self._normalizer is None:
+            self._normalizer = Normalizer.detect(read_header(self.path))
+        return self._normalizer
+
+    def chunks(self):
+        if self.resumed:
+            print(f"Resuming upload of '{self.path}' from row {self.start_row}...")
+        chunks = read_chunks(self.path, self.chunk_size, self.start_row, self.metrics, self.columns)
+        if not self.normalizer:
+            return chunks
+        print(f"Reading '{self.path}' as the {self.normalizer.describe()}...")
+        return self._normalized(chunks)
+
+    def _normalized(self, chunks):
+        for chunk in chunks:
+            started = time.perf_counter()
+            chunk = self.normalizer.apply(chunk)
+            if self.metrics:
+                self.metrics.record("upload.normalize", (time.perf_counter() - started) * 1000)
+            yield chunk
+
+    def commit(self, rows, state=None):
+        """Record that a batch of rows is durably written."""
+        self.rows += rows
+        self.state = state
+        if self.metrics:
+            self.metrics.count("upload.rows", rows)
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        with open(self.checkpoint_path, "w") as f:
+            json.dump({"file": self._fingerprint(), "rows": self.rows, "state": state}, f)
+        written = self.rows - self.start_row
+        print(f"Uploaded {self.rows} rows ({rate(written, self.started)} rows/sec)", end="\r")
+
+    def finish(self):
+        print()
+        coerced = self._normalizer.coerced if self._normalizer else {}
+        if coerced:
+            # values that didn't parse are loaded as missing, which changes totals and averages
+            print(f"{sum(coerced.values())} values didn't parse and were loaded as missing: "
+                  + ", ".join(f"{col} ({count})" for col, count in coerced.items()))
+            if self.metrics:
+                self.metrics.count("upload.coerced", sum(coerced.values()))
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return self.rows
+
+    def failed(self, error):
+        print()
+        print(f"Upload stopped after {self.rows} rows: {error}")
+        if self.rows > self.start_row or self.resumed:
+            print("Upload the same file into the same target again and choose to resume to continue.")
+
+    def _fingerprint(self):
+        stat = os.stat(self.path)
+        return [os.path.abspath(self.path), stat.st_size, stat.st_mtime]
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            # a checkpoint is only valid for the exact file it was written for
+            if checkpoint.get("file") != self._fingerprint():
+                return 0, None
+        except (OSError, ValueError):
+            return 0, None
+        return checkpoint["rows"], checkpoint.get("state")
@@ -1,6 +1,9 @@
+import argparse
 import os
-from sqlmain import ChatDB
-from mongo_main import ChatDBMongo
+import sys
+import batch
+from columnar import PARQUET_EXTENSIONS, is_columnar, is_dataset
+from compare import CompareRunner, print_comparison
 
 
 def main():
@@ -8,9 +11,11 @@ def main():
     print("Choose your database system:")
     print("1. MongoDB")
     print("2. MySQL")
+    print("3. SQLite (embedded, no server needed)")
+    print("4. Compare MySQL and MongoDB")
 
     while True:
-        db_choice = input("Enter your choice (1 for MongoDB, 2 for MySQL): ").strip()
+        db_choice = input("Enter your choice (1 for MongoDB, 2 for MySQL, 3 for SQLite, 4 to compare): ").strip()
 
         if db_choice == "1":
             print("\nYou have selected the MongoDB Database System.")
@@ -20,17 +25,41 @@ def main():
             print("\nYou have selected the MySQL Database System.")
             sql_main()
             break
+        elif db_choice == "3":
+            print("\nYou have selected the embedded SQLite Database System.")
+            sqlite_main()
+            break
+        elif db_choice == "4":
+            print("\nYou have selected to compare MySQL and MongoDB.")
+            table = input("Enter the MySQL table to query: ").strip()
+            collection = input("Enter the MongoDB collection to query: ").strip()
+            compare_main(table, collection)
+            break
         else:
-            print("Invalid choice. Please enter 1 or 2.")
+            print("Invalid choice. Please enter 1, 2, 3 or 4.")
 
 
 # mysql interface
 def sql_main():
+    # backends are imported on selection, so SQLite runs without the MySQL/MongoDB drivers installed
+    from sqlmain import ChatDB
     chatdb = ChatDB()
     print("Welcome to the Sales MySQL System! Type 'exit' to quit.")
+    sql_commands(chatdb, "mysql")
+
+
+# embedded sqlite interface, same commands as mysql
+def sqlite_main():
+    from sqlitemain import ChatDBSQLite
+    chatdb = ChatDBSQLite()
+    print(f"Welcome to the Sales SQLite System ({chatdb.path})! Type 'exit' to quit.")
+    sql_commands(chatdb, "sqlite")
 
+
+# command loop shared by the mysql and sqlite interfaces
+def sql_commands(chatdb, backend):
     while True:
-        print("\nCommands: upload dataset, explore, sample queries, query, exit")
+        print("\nCommands: upload dataset, export dataset, explore, sample queries, query, explain, approx, refine, more, index status, build indexes, stats, export stats, exit")
         cmd = input("Enter a command: ").strip().lower()
 
         if cmd == "exit":
@@ -40,7 +69,14 @@ def sql_main():
             dataset_path = upload_dataset()
             if dataset_path:
                 table_name = input("Enter a name for the new table: ").strip()
-                chatdb.upload_dataset(dataset_path, table_name)
+                columns = ask_columns(dataset_path)
+                append = ask_append()
+                resume = ask_resume(dataset_path, f"{backend}:{table_name}", getattr(chatdb, "has_checkpoint", None))
+                chatdb.upload_dataset(dataset_path, table_name, resume=resume, columns=columns, append=append)
+        elif cmd == "export dataset":
+            export = ask_export(chatdb.selected_table, "table")
+            if export:
+                chatdb.export_dataset(*export)
         elif cmd == "explore":
             chatdb.explore_tables()
         elif cmd == "sample queries":
@@ -48,19 +84,46 @@ def sql_main():
         elif cmd == "query":
             query = input("Enter your query: ")
             chatdb.process_query(query)
+        elif cmd == "explain":
+            query = input("Enter the query to explain: ")
+            chatdb.process_query(query, explain=True)
+        elif cmd == "approx":
+            query = input("Enter the query to estimate: ")
+            chatdb.process_query(query, approx=True)
+        elif cmd == "refine":
+            chatdb.refine()
+        elif cmd == "more":
+            chatdb.show_more()
+        elif cmd == "index status":
+            chatdb.show_index_status()
+        elif cmd == "build indexes":
+            chatdb.build_indexes()
+        elif cmd == "stats":
+            chatdb.show_stats()
+        elif cmd == "export stats":
+            chatdb.export_stats(ask_metrics_path())
         else:
             print("Invalid command. Please try again.")
 
     chatdb.close()
 
 
+# thin client: the same commands, run by a ChatDB server that keeps the backends loaded
+def client_main(url, backend):
+    from client import ChatDBClient
+    chatdb = ChatDBClient(url, backend)
+    print(f"Connected to the ChatDB server at {chatdb.url} ({backend}). Type 'exit' to quit.")
+    sql_commands(chatdb, backend)
+
+
 # mongo interface
 def mongo_main():
+    from mongo_main import ChatDBMongo
     chatdb = ChatDBMongo()
     print("Welcome to the Sales MongoDB System ^-^! Type 'exit' to quit.")
 
     while True:
-        print("\nCommands: upload dataset, explore data, delete dataset, switch dataset, sample queries, query, exit") # prompt user to select a command
+        print("\nCommands: upload dataset, export dataset, explore data, delete dataset, switch dataset, sample queries, query, explain, approx, refine, more, index status, build indexes, stats, export stats, exit") # prompt user to select a command
         cmd = input("Enter a command: ").strip().lower()
 
         if cmd == "exit":
@@ -71,7 +134,15 @@ def mongo_main():
             dataset_path = upload_dataset()
             if dataset_path:
                 collection_name = input("Enter a name for the new collection: ").strip()
-                chatdb.upload_dataset(dataset_path, collection_name)
+                columns = ask_columns(dataset_path)
+                append = ask_append()
+                resume = ask_resume(dataset_path, f"mongo:{collection_name}")
+                chatdb.upload_dataset(dataset_path, collection_name, resume=resume, columns=columns, append=append)
+
+        elif cmd == "export dataset":
+            export = ask_export(chatdb.selected_collection, "collection")
+            if export:
+                chatdb.export_dataset(*export)
 
         elif cmd == "explore data":
             chatdb.list_collections()
@@ -91,20 +162,160 @@ def mongo_main():
             query = input("Enter your query: ").strip()
             chatdb.process_query(query)
 
+        elif cmd == "explain":
+            query = input("Enter the query to explain: ").strip()
+            chatdb.process_query(query, explain=True)
+
+        elif cmd == "approx":
+            query = input("Enter the query to estimate: ").strip()
+            chatdb.process_query(query, approx=True)
+
+        elif cmd == "refine":
+            chatdb.refine()
+
+        elif cmd == "more":
+            chatdb.show_more()
+
+        elif cmd == "index status":
+            chatdb.show_index_status()
+
+        elif cmd == "build indexes":
+            chatdb.build_indexes()
+
+        elif cmd == "stats":
+            chatdb.show_stats()
+
+        elif cmd == "export stats":
+            chatdb.export_stats(ask_metrics_path())
+
         else:
             print("Invalid command. Please try again.")
 
     chatdb.close()
 
 
+# compare interface: every question runs on both backends at once
+def compare_main(table, collection, question=None):
+    from sqlmain import ChatDB
+    from mongo_main import ChatDBMongo
+    backends = {"mysql": ChatDB(), "mongo": ChatDBMongo()}
+    runner = CompareRunner(backends, {"mysql": table, "mongo": collection})
+    try:
+        if question:
+            print_comparison(runner.compare(question))
+            return
+        print("Type a question to run it on both backends, 'auto <question>' to run it on the backend "
+              "recorded as faster for its template, 'routes' to show the recorded latencies, or 'exit'.")
+        while True:
+            question = input("\nEnter a question: ").strip()
+            if question.lower() == "exit":
+                break
+            elif question.lower() == "routes":
+                runner.router.print_routes()
+            elif question.lower().startswith("auto "):
+                winner, outcome = runner.route(question[5:])
+                if winner is None:
+                    # no route yet (or not recognized): the question ran on both backends
+                    if outcome is None:
+                        print("Query not recognized by any backend.")
+                    else:
+                        print_comparison(outcome)
+                elif outcome["error"]:
+                    print(f"{winner}: error: {outcome['error']}")
+                else:
+                    print(f"Routed to {winner} ({outcome['ms']:.1f} ms):")
+                    for row in outcome["rows"][:20]:
+                        print(row)
+            elif question:
+                print_comparison(runner.compare(question))
+    finally:
+        for chatdb in backends.values():
+            chatdb.close()
+
+
 # function to allow user to upload a dataset into the system
 def upload_dataset():
-    file_path = input("Enter the full path of the dataset file (CSV format): ").strip()
-    if not os.path.exists(file_path) or not file_path.endswith('.csv'):
-        print("Invalid file path or format. Please upload a valid CSV file.")
+    file_path = input("Enter the full path of the dataset file (CSV, Parquet or Arrow): ").strip()
+    if not os.path.exists(file_path) or not is_dataset(file_path):
+        print("Invalid file path or format. Please upload a CSV, Parquet or Arrow file.")
         return None
     return file_path
 
 
+# columns to load from a Parquet/Arrow file; None loads all of them
+def ask_columns(file_path):
+    if not is_columnar(file_path):
+        return None
+    answer = input("Enter the columns to load (comma separated, blank for all): ").strip()
+    return [col.strip() for col in answer.split(",") if col.strip()] or None
+
+
+# append mode: rows are upserted on their key (transaction_id), so a delta file updates the rows
+# it shares with the existing data instead of reloading the table or duplicating documents
+def ask_append():
+    answer = input("Append to the existing data, updating rows with the same key? (yes/no): ").strip().lower()
+    return answer == "yes"
+
+
+# (table/collection, Parquet file) for the export dataset command, or None if either is missing
+def ask_export(selected, kind):
+    prompt = f"Enter the {kind} to export (blank for '{selected}'): " if selected else f"Enter the {kind} to export: "
+    name = input(prompt).strip() or selected
+    path = input("Enter the Parquet file to write: ").strip()
+    if not name or not path:
+        print(f"A {kind} and a file are needed to export.")
+        return None
+    if not path.lower().endswith(PARQUET_EXTENSIONS):
+        path += ".parquet"
+    return name, path
+
+
+# where to export metrics; .jsonl appends a snapshot, .prom writes Prometheus text format
+def ask_metrics_path():
+    return input("Enter the metrics file (.jsonl or .prom, blank for chatdb_metrics.jsonl): ").strip() or None
+
+
+# offer to continue an upload of the same file that failed part way
+def ask_resume(dataset_path, target, has_checkpoint=None):
+    if has_checkpoint is None:
+        from ingest import has_checkpoint  # needs pandas, which the thin client doesn't
+    if not has_checkpoint(dataset_path, target):
+        return False
+    answer = input("A previous upload of this file was interrupted. Resume it? (yes/no): ").strip().lower()
+    return answer == "yes"
+
+
+# command line: no arguments starts the interactive interface, --batch runs a query file
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sales ChatDB System")
+    parser.add_argument("--batch", metavar="QUERY_FILE", help="run every query in a file (one per line) and exit")
+    parser.add_argument("--backend", choices=batch.BACKENDS, default="mysql")
+    parser.add_argument("--target", help="table/collection the batch queries run against")
+    parser.add_argument("--output", help="results file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="output format (default: from the --output extension)")
+    parser.add_argument("--workers", type=int, default=batch.WORKERS, help="queries executed concurrently")
+    parser.add_argument("--compare", metavar="QUESTION",
+                        help="run one question on MySQL and MongoDB at once and diff the results")
+    parser.add_argument("--collection", help="MongoDB collection for --compare (default: --target)")
+    parser.add_argument("--server", metavar="URL", nargs="?", const="http://127.0.0.1:8551",
+                        help="run the --backend commands on a ChatDB server (see server.py)")
+    args = parser.parse_args()
+    if args.batch and not (args.target and args.output):
+        parser.error("--batch requires --target and --output")
+    if args.compare and not args.target:
+        parser.error("--compare requires --target")
+    return args
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.batch:
+        errors = batch.run_batch(args.batch, args.backend, args.target, args.output, args.format, args.workers)
+        sys.exit(1 if errors else 0)
+    if args.compare:
+        compare_main(args.target, args.collection or args.target, args.compare)
+        sys.exit(0)
+    if args.server:
+        client_main(args.server, args.backend)
+        sys.exit(0)
     main()
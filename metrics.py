@@ -0,0 +1,217 @@
+#metrics.py
+# per-stage timing, rolling latency histograms and row/byte counters shared by the backends
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+WINDOW = 1000  # latest samples per stage the percentiles and histogram are computed over
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)  # histogram upper bounds
+PLANS_KEPT = 100  # latest query plan summaries kept (one per statement)
+METRICS_PATH = "chatdb_metrics.jsonl"  # default export file; a .prom path writes Prometheus text format
+
+# stages in the order they run, so printed stats read like the life of a query or upload
+QUERY_STAGES = ["query.tokenize", "query.match", "query.generate", "query.execute",
+                "query.fetch", "query.print", "query.explain", "query.total"]
+UPLOAD_STAGES = ["upload.read", "upload.normalize", "upload.prepare", "upload.write", "upload.rollup",
+                 "upload.index", "upload.sample", "upload.total"]
+EXPORT_STAGES = ["export.schema", "export.total"]
+
+
+def row_bytes(rows) -> int:
+    """Approximate size of result rows as the length of their text form."""
+    return sum(len(str(row)) for row in rows)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Metrics:
+    '''
+    Thread-safe stage timers and counters for one backend instance.
+
+    args:
+        window: latest samples per stage kept for percentiles and the histogram
+
+    Totals (count, total_ms, counters) cover the whole session; percentiles
+    and histogram buckets are computed over the rolling window, so they
+    follow the current workload instead of the session average.
+    '''
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._stages = {}  # name -> {"samples": deque, "count", "total_ms"}
+        self._counters = {}
+        self._plans = OrderedDict()  # statement -> latest plan summary (see explain.py)
+        self._lock = threading.Lock()
+        self._local = threading.local()  # per-thread stage totals, for stage(exclude=...)
+        self.started = time.time()
+
+    @contextmanager
+    def stage(self, name, exclude=()):
+        """Time a block as one sample of a stage.
+
+        Time recorded under the exclude stages by the same thread while the
+        block runs is subtracted, e.g. so printing a page doesn't count the
+        fetches it triggers; other threads' samples of those stages don't count.
+        """
+        totals = self._thread_totals()
+        excluded = sum(totals.get(other, 0.0) for other in exclude)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            if exclude:
+                ms -= sum(totals.get(other, 0.0) for other in exclude) - excluded
+            self.record(name, max(ms, 0.0))
+
+    def record(self, name, ms):
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = {"samples": deque(maxlen=self.window), "count": 0, "total_ms": 0.0}
+            stats["samples"].append(ms)
+            stats["count"] += 1
+            stats["total_ms"] += ms
+        totals = self._thread_totals()
+        totals[name] = totals.get(name, 0.0) + ms
+
+    def _thread_totals(self) -> dict:
+        """Milliseconds recorded per stage by the calling thread (only differences are used)."""
+        totals = getattr(self._local, "totals", None)
+        if totals is None:
+            totals = self._local.totals = {}
+        return totals
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def record_plan(self, summary):
+        """Keep a plan summary next to the timings, so exports show how each statement was run."""
+        entry = {key: value for key, value in summary.items() if key != "plan"}
+        with self._lock:
+            self._plans[summary["statement"]] = entry
+            self._plans.move_to_end(summary["statement"])
+            while len(self._plans) > PLANS_KEPT:
+                self._plans.popitem(last=False)
+        if summary["full_scans"]:
+            self.count("query.full_scans")
+
+    def total_ms(self, name) -> float:
+        with self._lock:
+            stats = self._stages.get(name)
+            return stats["total_ms"] if stats else 0.0
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._plans.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> dict:
+        """Stage statistics and counters as plain data."""
+        with self._lock:
+            stages = {name: (list(s["samples"]), s["count"], s["total_ms"]) for name, s in self._stages.items()}
+            counters = dict(self._counters)
+            plans = list(self._plans.values())
+        summary = {}
+        for name, (samples, count, total_ms) in stages.items():
+            samples.sort()
+            histogram = {str(bound): sum(1 for ms in samples if ms <= bound) for bound in BUCKETS_MS}
+            histogram["+Inf"] = len(samples)
+            summary[name] = {
+                "count": count,
+                "total_ms": round(total_ms, 3),
+                "mean_ms": round(total_ms / count, 3),
+                "p50_ms": round(percentile(samples, 50), 3),
+                "p95_ms": round(percentile(samples, 95), 3),
+                "p99_ms": round(percentile(samples, 99), 3),
+                "max_ms": round(samples[-1], 3),
+                "histogram": histogram,  # cumulative: samples at or under each bound (ms)
+            }
+        return {"since": self.started, "stages": summary, "counters": counters, "plans": plans}
+
+    def export(self, path=None, labels=None):
+        """Write the metrics to a file for monitoring; returns the path written."""
+        return export_snapshot(self.snapshot(), path, labels)
+
+
+def print_snapshot(snapshot, caches=None):
+    """Print a Metrics snapshot (possibly received from the server) and cache statistics."""
+    if not snapshot["stages"] and not snapshot["counters"]:
+        print("No queries or uploads recorded yet.")
+    known = QUERY_STAGES + UPLOAD_STAGES + EXPORT_STAGES
+    names = [n for n in known if n in snapshot["stages"]]
+    names += sorted(n for n in snapshot["stages"] if n not in known)
+    if names:
+        print(f"\n{'stage':<16}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name in names:
+            s = snapshot["stages"][name]
+            print(f"{name:<16}{s['count']:>8}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}"
+                  f"{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+    if snapshot["counters"]:
+        print("\nCounters:")
+        for name, value in sorted(snapshot["counters"].items()):
+            print(f"- {name}: {value:,}")
+    if snapshot.get("plans"):
+        print("\nExplained statements (latest last):")
+        for plan in snapshot["plans"][-10:]:
+            statement = plan["statement"] if len(plan["statement"]) <= 80 else plan["statement"][:77] + "..."
+            scans = f", FULL SCAN of {', '.join(plan['full_scans'])}" if plan["full_scans"] else ""
+            print(f"- {statement}: examined {plan['examined']}, returned {plan['returned']}, "
+                  f"indexes {', '.join(plan['indexes']) or 'none'}{scans}")
+    if caches:
+        print("\nCaches:")
+        for name, stats in caches.items():
+            print(f"- {name}: {stats['size']}/{stats['maxsize']} entries, {stats['hits']} hits, "
+                  f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+
+
+def export_snapshot(snapshot, path=None, labels=None):
+    """Write a Metrics snapshot to a file; returns the path written.
+
+    A .prom path is overwritten with Prometheus text format (for a
+    node_exporter textfile collector); any other path gets one JSON
+    snapshot, histogram included, appended per call.
+    """
+    path = path or METRICS_PATH
+    labels = labels or {}
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.endswith(".prom"):
+        # write then rename, so the collector never reads a half-written file
+        with open(path + ".tmp", "w") as f:
+            f.write(_prometheus(snapshot, labels))
+        os.replace(path + ".tmp", path)
+    else:
+        with open(path, "a") as f:
+            f.write(json.dumps(dict(snapshot, time=time.time(), labels=labels)) + "\n")
+    return path
+
+
+def _prometheus(snapshot, labels):
+    def label_text(extra):
+        pairs = dict(labels, **extra)
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs.items()) + "}"
+
+    # a summary: quantiles over the rolling window, sum and count over the session
+    lines = ["# TYPE chatdb_stage_seconds summary"]
+    for name, s in snapshot["stages"].items():
+        for quantile, field in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+            lines.append(f"chatdb_stage_seconds{label_text({'stage': name, 'quantile': quantile})} "
+                         f"{s[field] / 1000:.6f}")
+        lines.append(f"chatdb_stage_seconds_sum{label_text({'stage': name})} {s['total_ms'] / 1000:.6f}")
+        lines.append(f"chatdb_stage_seconds_count{label_text({'stage': name})} {s['count']}")
+    lines.append("# TYPE chatdb_total counter")
+    for name, value in snapshot["counters"].items():
+        lines.append(f"chatdb_total{label_text({'counter': name})} {value}")
+    return "\n".join(lines) + "\n"
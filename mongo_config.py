@@ -1,14 +1,70 @@
+import threading
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 
 class MongoDBConfig:
     HOST = 'localhost'
     PORT = 27017
     DATABASE = 'salesDB'
 
+    # connection pool of the shared client
+    POOL_SIZE = 20  # maxPoolSize, i.e. concurrent operations per server
+    SERVER_SELECTION_TIMEOUT_MS = 5000  # how long an operation waits for a reachable server
+
+    # query results are streamed from the cursor and shown a page at a time
+    FETCH_BATCH_SIZE = 500  # documents per cursor round trip
+    PAGE_SIZE = 20  # documents printed per page; 'more' shows the next page
+    MAX_RESULT_ROWS = 1000  # row cap per query, None for no cap
+
+    # let $group/$sort stages spill to disk instead of failing at the 100MB stage limit
+    ALLOW_DISK_USE = True
+
+    _client = None
+    _client_lock = threading.Lock()
+
+    # bulk upload settings
+    UPLOAD_BATCH_SIZE = 5000  # documents per unordered insert_many
+    UPLOAD_WORKERS = 4  # batches written concurrently over the shared client
+
+    @staticmethod
+    def get_client():  # process-wide client; pymongo pools & re-establishes connections itself
+        with MongoDBConfig._client_lock:
+            if MongoDBConfig._client is None:
+                MongoDBConfig._client = MongoClient(
+                    MongoDBConfig.HOST, MongoDBConfig.PORT,
+                    maxPoolSize=MongoDBConfig.POOL_SIZE,
+                    serverSelectionTimeoutMS=MongoDBConfig.SERVER_SELECTION_TIMEOUT_MS,
+                    retryReads=True,
+                    retryWrites=True
+                )
+            return MongoDBConfig._client
+
+    @staticmethod
+    def use_client(client):  # install a client built elsewhere, e.g. mongomock's in-process one for benchmarks
+        with MongoDBConfig._client_lock:
+            MongoDBConfig._client = client
+
+    @staticmethod
+    def check_connection():  # health check; a client that can't reach the server is rebuilt on next use
+        try:
+            MongoDBConfig.get_client().admin.command("ping")
+            return True
+        except PyMongoError as e:
+            print(f"MongoDB health check failed: {e}")
+            MongoDBConfig.close_client()
+            return False
+
+    @staticmethod
+    def close_client():
+        with MongoDBConfig._client_lock:
+            if MongoDBConfig._client is not None:
+                MongoDBConfig._client.close()
+                MongoDBConfig._client = None
+
     @staticmethod
     def get_connection():  # connect to mongodb db
         try:
-            client = MongoClient(MongoDBConfig.HOST, MongoDBConfig.PORT)
+            client = MongoDBConfig.get_client()
             db = client[MongoDBConfig.DATABASE]
             print(f"Successfully connected to the database: {MongoDBConfig.DATABASE}")
             return db
@@ -19,6 +75,39 @@ class MongoDBConfig:
 
 # define metrics for query generation
 class Config:
+    PARSE_CACHE_SIZE = 512  # entries kept in the query generator's parse & pipeline caches
+
+    # top_n execution: "groups" returns the n groups with the largest total (like the SQL template),
+    # "per_group" returns the n highest-metric documents in every group using $topN (MongoDB 5.2+)
+    TOP_N_MODE = "groups"
+
+    # executed query results; invalidated when a collection is uploaded to or deleted
+    RESULT_CACHE_SIZE = 256
+    RESULT_CACHE_TTL = 300  # seconds, None to keep results until evicted
+    RESULT_CACHE_PATH = None  # e.g. '.chatdb_cache/results.sqlite' to persist across restarts
+
+    # queries run with this collation and indexes are built with it, so string equality
+    # is case-insensitive (strength 2 ignores case, not accents) and can use an index
+    STRING_COLLATION = {"locale": "en", "strength": 2}
+
+    # rollup collection ({collection}__rollup) maintained at upload and used for eligible queries
+    BUILD_ROLLUPS = True
+
+    # uniform sample collection ({collection}__sample) rebuilt at upload with $rand (MongoDB 4.4.2+) and
+    # read by approximate queries; without one, they draw a $sample of the same size (see approx.py)
+    SAMPLE_RATE = 0.01  # fraction of documents in the sample; None builds none and turns approximate queries off
+    APPROX_STEPS = [0.1, 0.3, 1.0]  # fractions of the sample read by each 'refine' step; the next one is exact
+    APPROX_CONFIDENCE = 0.95  # confidence level of the estimates' intervals
+
+    # uploads are renamed & typed into the unified schema of sqlconfig.Config.COLUMN_MAPPINGS,
+    # with a 'source' field naming the feed each document came from (see normalize.py). off by
+    # default: values of numeric & date fields that don't parse are stored as null (the upload reports how many)
+    NORMALIZE_COLUMNS = False
+
+    # field appended documents are matched on: documents with a stored key are updated, the rest inserted.
+    # normalized documents are matched on (source, key), so feeds with overlapping ids don't collide
+    UPSERT_KEY = "transaction_id"
+
     NUMERIC_FILTERS = ["price", "quantity", "discount", "customer_age", "total_revenue"]
     STRING_FILTERS = ["location", "category", "payment_method", "customer_gender", "product_name"]
 
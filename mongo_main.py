@@ -1,22 +1,39 @@
-from pymongo import MongoClient
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+import itertools
+import random
 import os
+import time
+import json
+import pandas as pd
 from mongo_config import MongoDBConfig, Config
 from mongo_query_generator import QueryGenerator
 from mongo_sample_queries import SampleQueryGenerator, display_sample_queries
+from ingest import StreamingIngest, rate, CHUNK_SIZE
+from columnar import is_dataset, frame_schema, frame_to_batch, write_parquet
+from normalize import match_key
+from cache import ResultCache
+from index_advisor import IndexAdvisor, index_name, print_index_status
+from results import ResultPager
+from metrics import Metrics, print_snapshot, row_bytes
+from explain import print_plan, summarize_mongo_explain
+from rollup import Rollup, rollup_name, is_rollup, ROW_COUNT
+from approx import describe_estimates, estimate, is_sample, sample_name, sample_steps, AVERAGE_TEMPLATES, SAMPLE_U
 
 
 
 class ChatDBMongo:
     def __init__(self):
-        self.client = MongoClient(MongoDBConfig.HOST, MongoDBConfig.PORT)
-        self.db = self.client[MongoDBConfig.DATABASE]
+        MongoDBConfig.check_connection()
+        self.metrics = Metrics()  # stage timings and row/byte counters, shown by the stats command
         self.query_generator = QueryGenerator(
             Config.VALID_TOTAL_METRICS["default"],
             Config.VALID_AVERAGE_METRICS["default"],
             Config.VALID_GROUPS["default"],
             Config.NUMERIC_FILTERS,  # pass NUMERIC_FILTERS as a list
-            Config.STRING_FILTERS   # pass STRING_FILTERS as a list
+            Config.STRING_FILTERS,   # pass STRING_FILTERS as a list
+            metrics=self.metrics
         )
         self.sample_query_generator = SampleQueryGenerator(
             Config.VALID_TOTAL_METRICS["default"],
@@ -25,23 +42,368 @@ class ChatDBMongo:
             Config.NUMERIC_FILTERS,  # pass NUMERIC_FILTERS as a list
             Config.STRING_FILTERS   # pass STRING_FILTERS as a list
         )
+        self.result_cache = ResultCache(
+            Config.RESULT_CACHE_SIZE, Config.RESULT_CACHE_TTL, Config.RESULT_CACHE_PATH
+        )
+        # a $group without a preceding $match always scans, so only filters benefit from indexes
+        self.index_advisor = IndexAdvisor(
+            Config.VALID_GROUPS["default"],
+            Config.NUMERIC_FILTERS + Config.STRING_FILTERS,
+            group_uses_index=False
+        )
+        self.rollups = {}  # collection -> Rollup of its rollup collection, or None if it has none
         self.selected_collection = None
+        self.pager = None  # result of the last query, shown a page at a time
+        self.refinement = None  # (query, step) of the last approximate query, continued by refine
+
+
+    # database handle on the shared pooled client (also used by the upload worker threads);
+    # looked up on each use so a client rebuilt after a failed health check is picked up
+    @property
+    def db(self):
+        return MongoDBConfig.get_client()[MongoDBConfig.DATABASE]
+
+
+    # uploading dataset to db, streamed in chunks so memory is bounded by the chunk size.
+    # each chunk is split into batches that a small worker pool inserts concurrently
+    # with unordered writes, so one bad document doesn't abort the rest of its batch.
+    # the collection's rollup gets the cells of every inserted batch. CSV, Parquet and Arrow IPC
+    # files are read (see ingest.read_chunks); with columns, only those fields are loaded.
+    # with Config.NORMALIZE_COLUMNS, the feed's fields are renamed & typed into the unified schema,
+    # with a 'source' field naming the feed, so every feed can share one collection (see normalize.py).
+    # with append, documents are upserted on Config.UPSERT_KEY (within their source) instead of inserted, so a feed
+    # that is loaded again (or overlaps an earlier one) updates documents instead of duplicating them.
+    # the collection's sample ({collection}__sample) is drawn again once the documents are all in;
+    # an append keeps it current batch by batch instead (see _resample_batch)
+    def upload_dataset(self, file_path, collection_name, resume=False, batch_size=None, workers=None,
+                       columns=None, append=False):
+        if not os.path.exists(file_path) or not is_dataset(file_path):
+            print("Invalid file path or format. Please upload a CSV, Parquet or Arrow file.")
+            return None
+        batch_size = batch_size or MongoDBConfig.UPLOAD_BATCH_SIZE
+        workers = workers or MongoDBConfig.UPLOAD_WORKERS
+        collection = self.db[collection_name]
+        ingest = StreamingIngest(file_path, f"mongo:{collection_name}", resume=resume, metrics=self.metrics,
+                                 columns=columns, normalize=Config.NORMALIZE_COLUMNS)
+        key = Config.UPSERT_KEY
+        inserted = 0
+        counts = [0, 0, 0]  # inserted, updated & skipped documents of an append
+        columns = []
+        rollup = None
+        rebuild = False  # the rollup is rebuilt from the collection after the load instead of per batch
+        uploaded = None
+        failures = []  # (first row of batch, failed documents, first error message)
+        keys = None  # fields appended documents are matched on, known once the first chunk is read
+        sampled = append and self._start_sample(collection)  # the sample is maintained per batch
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for chunk in ingest.chunks():
+                    if append and not keys:
+                        if key not in chunk.columns:
+                            raise ValueError(f"Appending needs a '{key}' field to match documents on")
+                        keys = match_key(chunk.columns, key)
+                        self._add_unique_key(collection, keys)
+                    if not columns:  # first chunk
+                        with self.metrics.stage("upload.rollup"):
+                            rollup = self._start_rollup(collection, chunk)
+                    columns = list(chunk.columns)
+                    with self.metrics.stage("upload.prepare"):
+                        if append:
+                            # one write per key: documents without one, and all but the last of a key, are skipped
+                            keep = chunk[keys].notna().all(axis=1) & ~chunk.duplicated(subset=keys, keep="last")
+                        # batches cover fixed row ranges of the file, so the checkpoint stays a row position
+                        starts = range(0, len(chunk), batch_size)
+                        parts = [chunk.iloc[i:i + batch_size] for i in starts]
+                        if append:
+                            parts = [part[keep.loc[part.index]] for part in parts]
+                        batches = [_documents(part) for part in parts]
+                    if append and rollup and not set(_rollup_fields(rollup)) <= set(chunk.columns):
+                        # updated documents keep their stored values in the missing fields, which this batch can't see
+                        rollup, rebuild = None, True
+                    fields = _rollup_fields(rollup) if rollup else []
+                    sample = self.db[sample_name(collection_name)] if sampled else None
+                    write = ((lambda b: _upsert_batch(collection, keys, b, fields, sample)) if append
+                             else (lambda b: _insert_batch(collection, b)))
+                    # map yields results in batch order, so the checkpoint only ever covers finished batches
+                    with self.metrics.stage("upload.write", exclude=("upload.rollup",)):
+                        for start, part, result in zip(starts, parts, pool.map(write, batches)):
+                            size = min(batch_size, len(chunk) - start)
+                            if append:
+                                (upserted, modified), errors, stored = result
+                                counts[0] += upserted
+                                counts[1] += modified
+                                counts[2] += size - upserted - modified - len(errors)
+                                inserted += upserted
+                            else:
+                                (count, errors), stored = result, None
+                                inserted += count
+                            if errors:
+                                failures.append((ingest.rows, len(errors), errors[0].get("errmsg")))
+                            if rollup and len(part):
+                                # failed documents aren't in the collection, so they stay out of the rollup
+                                failed = part.index[[e["index"] for e in errors]]
+                                if stored is not None:
+                                    failed_keys = pd.MultiIndex.from_frame(part.loc[failed, keys])
+                                    stored = stored[~pd.MultiIndex.from_frame(stored[keys]).isin(failed_keys)]
+                                with self.metrics.stage("upload.rollup"):
+                                    self._merge_rollup(collection_name, rollup, part.drop(failed), removed=stored)
+                            ingest.commit(size)
+            ingest.finish()
+            if rebuild:
+                rollup = self._rollup(collection_name)
+                if rollup:
+                    self.db[rollup_name(collection_name)].delete_many({})
+                    self._rebuild_rollup(collection, Rollup(rollup.dimensions, rollup.measures, "date",
+                                                            rollup.count_metric))
+            # indexes are built after the load so the inserts don't maintain them
+            with self.metrics.stage("upload.index"):
+                self._create_indexes(collection, self.index_advisor.missing(
+                    collection_name, columns, self._existing_indexes(collection)))
+            if not sampled:
+                self._rebuild_sample(collection)
+            if append:
+                for name, count in zip(("upload.inserted", "upload.updated", "upload.skipped"), counts):
+                    self.metrics.count(name, count)
+                print(f"Dataset successfully appended to MongoDB collection '{collection_name}' "
+                      f"({counts[0]} inserted, {counts[1]} updated, {counts[2]} skipped, "
+                      f"{rate(sum(counts), ingest.started)} documents/sec).")
+            else:
+                print(f"Dataset successfully uploaded to MongoDB as collection '{collection_name}' "
+                      f"({inserted} documents inserted, {rate(inserted, ingest.started)} documents/sec).")
+            uploaded = collection_name
+        except Exception as e:
+            ingest.failed(f"Error uploading dataset to MongoDB: {e}")
+        finally:
+            # new documents change every cached result for this collection
+            self.result_cache.invalidate("mongo", collection_name)
+            self.rollups.pop(collection_name, None)
+            self.metrics.record("upload.total", (time.perf_counter() - ingest.started) * 1000)
+        if failures:
+            print(f"{sum(f[1] for f in failures)} documents failed in {len(failures)} batches:")
+            for first_row, count, message in failures:
+                print(f"- batch starting at row {first_row}: {count} failed ({message})")
+        return uploaded  # collection name, or None if the upload failed
+
+
+    # unique index the upserts of an append match documents on, unless the collection has one.
+    # it can't be built while the collection holds documents with the same key
+    def _add_unique_key(self, collection, keys):
+        for info in collection.index_information().values():
+            if info.get("unique") and [field for field, _ in info["key"]] == keys:
+                return
+        print(f"Creating unique index on {collection.name} ({', '.join(keys)})...")
+        try:
+            collection.create_index([(key, 1) for key in keys], unique=True,
+                                    name=index_name(collection.name, keys, "uq"))
+        except OperationFailure as e:
+            if e.code != 11000:  # duplicate key
+                raise
+            raise ValueError(f"'{collection.name}' already has documents with the same {', '.join(keys)}; "
+                             "delete it and upload it again before appending") from None
+
+
+    # draw the collection's uniform sample server-side: every document is kept with probability
+    # Config.SAMPLE_RATE and gets a uniform SAMPLE_U in [0, SAMPLE_RATE), so the documents below any
+    # smaller rate are a sample of that rate (see approx.py). $rand needs MongoDB 4.4.2+; without it
+    # there is no sample collection and approximate queries draw a $sample instead
+    def _rebuild_sample(self, collection):
+        sample = self.db[sample_name(collection.name)]
+        with self.metrics.stage("upload.sample"):
+            sample.drop()
+            if not Config.SAMPLE_RATE:
+                return
+            print(f"Drawing a {Config.SAMPLE_RATE:.2%} sample of '{collection.name}'...")
+            try:
+                # the draw and the stored value are independent uniforms: given the draw, u is uniform below the rate
+                collection.aggregate([
+                    {"$match": {"$expr": {"$lt": [{"$rand": {}}, Config.SAMPLE_RATE]}}},
+                    {"$set": {SAMPLE_U: {"$multiply": [{"$rand": {}}, Config.SAMPLE_RATE]}}},
+                    {"$out": sample.name}
+                ], allowDiskUse=MongoDBConfig.ALLOW_DISK_USE)
+                sample.create_index([(SAMPLE_U, 1)], name=index_name(sample.name, [SAMPLE_U]))
+            except OperationFailure as e:
+                sample.drop()
+                print(f"No sample drawn ({e}); approximate queries will use $sample instead.")
+
+
+    # whether an append can keep the collection's sample current batch by batch: it has one, or it's
+    # empty and gets an empty one. otherwise the sample is drawn from the whole collection afterwards
+    def _start_sample(self, collection):
+        if not Config.SAMPLE_RATE:
+            return False
+        sample = self.db[sample_name(collection.name)]
+        if sample.name in self.db.list_collection_names():
+            return True
+        if collection.estimated_document_count():
+            return False
+        sample.create_index([(SAMPLE_U, 1)], name=index_name(sample.name, [SAMPLE_U]))
+        return True
+
+
+    # export a collection to a Parquet file for downstream jobs. documents are read CHUNK_SIZE at a
+    # time and written as one row group each; the fields and their types come from the first chunk
+    def export_dataset(self, collection_name, path):
+        try:
+            if collection_name not in self.list_datasets():
+                raise ValueError(f"Collection '{collection_name}' doesn't exist")
+            started = time.perf_counter()
+            with self.metrics.stage("export.total"):
+                # documents needn't share fields or types, so a first pass over the
+                # collection finds the schema that covers all of them
+                with self.metrics.stage("export.schema"):
+                    cursor = self.db[collection_name].find({}, {"_id": 0}, batch_size=MongoDBConfig.FETCH_BATCH_SIZE)
+                    try:
+                        schema = frame_schema(_frames(cursor))
+                    finally:
+                        cursor.close()
+                if schema is None:
+                    raise ValueError(f"Collection '{collection_name}' is empty")
+                cursor = self.db[collection_name].find({}, {"_id": 0}, batch_size=MongoDBConfig.FETCH_BATCH_SIZE)
+                try:
+                    written = write_parquet(path, schema, (frame_to_batch(df, schema) for df in _frames(cursor)))
+                finally:
+                    cursor.close()
+            self.metrics.count("export.rows", written)
+            print(f"Exported {written} documents of '{collection_name}' to {path} "
+                  f"({rate(written, started)} documents/sec).")
+            return path
+        except Exception as e:
+            print(f"Error exporting '{collection_name}': {e}")
+            return None
+
+
+    # rollup the upload adds to: the collection's existing one, or a new one defined by the
+    # first chunk's columns and built from the documents already in the collection
+    def _start_rollup(self, collection, chunk):
+        if not Config.BUILD_ROLLUPS:
+            return None
+        date_column = "date" if "date" in chunk.columns else None
+        rollup = self._rollup(collection.name)
+        if rollup:
+            return Rollup(rollup.dimensions, rollup.measures, date_column, rollup.count_metric)
+        dimensions = [col for col in Config.VALID_GROUPS["default"] if col in chunk.columns]
+        measures = [col for col in Config.VALID_AVERAGE_METRICS["default"]
+                    if col in chunk.columns and pd.api.types.is_numeric_dtype(chunk[col])]
+        if not dimensions:
+            return None
+        rollup = Rollup(dimensions, measures, date_column, count_metric="sales")  # 'total sales' counts documents
+        rollup_collection = self.db[rollup_name(collection.name)]
+        rollup_collection.create_index([(key, 1) for key in rollup.key], unique=True,
+                                       name=index_name(rollup_collection.name, rollup.key))
+        if collection.estimated_document_count():
+            self._rebuild_rollup(collection, rollup)
+        return rollup
+
+
+    # add the documents already in a collection to its rollup, CHUNK_SIZE documents at a time
+    def _rebuild_rollup(self, collection, rollup):
+        print(f"Building the rollup of '{collection.name}' from its existing documents...")
+        fields = rollup.dimensions + rollup.measures + ([rollup.date_column] if rollup.date_column else [])
+        cursor = collection.find({}, {field: 1 for field in fields}, batch_size=MongoDBConfig.FETCH_BATCH_SIZE)
+        try:
+            while True:
+                documents = list(itertools.islice(cursor, CHUNK_SIZE))
+                if not documents:
+                    break
+                self._merge_rollup(collection.name, rollup, pd.DataFrame(documents).reindex(columns=fields))
+        finally:
+            cursor.close()
+
+
+    # fold the rollup cells of newly inserted documents into the rollup collection:
+    # counts & sums are incremented, min/max folded in, new cells upserted. with removed (the
+    # stored versions of upserted documents) their share is taken out and emptied cells deleted
+    def _merge_rollup(self, collection_name, rollup, df, removed=None):
+        cells = rollup.cells(df) if removed is None else rollup.delta(removed, df)
+        updates = [_rollup_update(rollup, cell) for cell in cells.to_dict(orient="records")]
+        if updates:
+            self.db[rollup_name(collection_name)].bulk_write(updates, ordered=False)
+        if removed is not None and not removed.empty:
+            self.db[rollup_name(collection_name)].delete_many({ROW_COUNT: {"$lte": 0}})
+
+
+    # definition of a collection's rollup, recovered from one of its documents; None if it has none
+    def _rollup(self, collection_name):
+        if collection_name not in self.rollups:
+            document = self.db[rollup_name(collection_name)].find_one()
+            self.rollups[collection_name] = document and Rollup.from_columns(
+                list(document), Config.VALID_GROUPS["default"], count_metric="sales")
+        return self.rollups[collection_name]
+
+
+    # indexes carry the query collation so case-insensitive string matches can use them
+    def _create_indexes(self, collection, proposals):
+        for cols in proposals:
+            print(f"Creating index on {collection.name} ({', '.join(cols)})...")
+            collection.create_index([(col, 1) for col in cols], name=index_name(collection.name, cols) + "_ci",
+                                    collation=Config.STRING_COLLATION)
+
+
+    # index name -> indexed fields, leaving out the default _id index. an index on a string field
+    # without the query collation can't serve the case-insensitive match, so it doesn't count
+    def _existing_indexes(self, collection):
+        indexes = {}
+        for name, info in collection.index_information().items():
+            fields = [field for field, _ in info["key"]]
+            collation = info.get("collation", {})
+            matches = all(collation.get(k) == v for k, v in Config.STRING_COLLATION.items())
+            if name != "_id_" and (matches or fields[0] not in Config.STRING_FILTERS):
+                indexes[name] = fields
+        return indexes
+
+
+    # fields of the selected collection, taken from a sample document
+    def _collection_fields(self, collection):
+        document = collection.find_one() or {}
+        return [key for key in document if key != "_id"]
+
+
+    # build the indexes the advisor proposes that don't exist yet
+    def build_indexes(self):
+        if not self.selected_collection:
+            print("Please explore data to select a collection first.")
+            return
+        try:
+            collection = self.db[self.selected_collection]
+            missing = self.index_advisor.missing(
+                self.selected_collection, self._collection_fields(collection), self._existing_indexes(collection))
+            if not missing:
+                print(f"All proposed indexes on '{self.selected_collection}' already exist.")
+                return
+            self._create_indexes(collection, missing)
+            print(f"Built {len(missing)} indexes on '{self.selected_collection}'.")
+        except Exception as e:
+            print(f"Error building indexes: {e}")
 
 
-    # uploading dataset to db
-    def upload_dataset(self, file_path, collection_name):
+    # show which query templates are served by an index
+    def show_index_status(self):
+        if not self.selected_collection:
+            print("Please explore data to select a collection first.")
+            return
         try:
-            df = pd.read_csv(file_path)
-            data = df.to_dict(orient="records")
-            self.db[collection_name].insert_many(data)
-            print(f"Dataset successfully uploaded to MongoDB as collection '{collection_name}'.")
+            collection = self.db[self.selected_collection]
+            print_index_status(self.index_advisor.status(
+                self.selected_collection, self._collection_fields(collection), self._existing_indexes(collection)))
         except Exception as e:
-            print(f"Error uploading dataset to MongoDB: {e}")
+            print(f"Error reading indexes: {e}")
+
+
+    # collection names, leaving out rollup & sample collections since they're internal to their collection
+    def list_datasets(self):
+        return [col for col in self.db.list_collection_names() if not is_rollup(col) and not is_sample(col)]
+
+
+    # (field, type) pairs of a collection, taken from its first document, and its first documents
+    def describe_dataset(self, collection_name):
+        samples = list(self.db[collection_name].find().limit(5))
+        schema = [(key, type(value).__name__) for key, value in (samples[0] if samples else {}).items()]
+        return schema, samples
 
 
     # func to list collections in db
     def list_collections(self):
-        collections = self.db.list_collection_names()
+        collections = self.list_datasets()
         if not collections:
             print("No collections available.")
             return []
@@ -99,8 +461,59 @@ class ChatDBMongo:
         display_sample_queries(queries)  # display function for formatted output
 
 
-    # process & execute user query
-    def process_query(self, query):
+    # process & execute user query; the whole run is timed as query.total.
+    # with explain, the executionStats plan summary is shown before the results.
+    # with approx, the answer is estimated from the smallest step of the collection's sample
+    # instead; refine() continues with the next step
+    def process_query(self, query, explain=False, approx=False):
+        with self.metrics.stage("query.total"):
+            if approx:
+                self._process_approx(query, 0)
+            else:
+                self._process_query(query, explain)
+
+
+    # refine the last approximate answer from a larger sample, or run it exactly after the last step
+    def refine(self):
+        if self.refinement is None:
+            print("No approximate query to refine; run one with approx first.")
+            return
+        query, step = self.refinement
+        with self.metrics.stage("query.total"):
+            self._process_approx(query, step + 1)
+
+
+    def _process_approx(self, query, step):
+        self.refinement = None
+        if not self.selected_collection:
+            print("Please explore data to select a collection first.")
+            return
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            print("Query not recognized. Please try again")
+            return
+        try:
+            result = self._estimate(query_type, params, self.selected_collection, step)
+            if result is None:  # every step was shown
+                print("\nExact result:")
+                self._process_query(query)
+                return
+            source, mongo_query, documents, rate = result
+            print(f"\nMongoDB Query (on {source}):")
+            for stage in mongo_query:
+                print(stage)
+            if self.pager:
+                self.pager.close()
+            self.pager = ResultPager(documents, MongoDBConfig.PAGE_SIZE, MongoDBConfig.MAX_RESULT_ROWS)
+            print(f"\nResults ({describe_estimates(rate, Config.APPROX_CONFIDENCE)}):")
+            self._print_page()
+            self.refinement = (query, step)
+            print("Type 'refine' for a more precise answer.")
+        except Exception as e:
+            print(f"Error executing query: {e}")
+
+
+    def _process_query(self, query, explain=False):
         if not self.selected_collection:
             print("Please explore data to select a collection first.")
             return
@@ -113,36 +526,211 @@ class ChatDBMongo:
 
         try:
             # generate the MongoDB query
-            mongo_query = self.query_generator.generate_mongo_query(query_type, params)
+            collection_name = self.selected_collection
+            source, mongo_query = self._pipeline(query_type, params, collection_name)
 
             # display mongo query
-            print("\nMongoDB Query:")
+            print(f"\nMongoDB Query (on {source}):")
             if isinstance(mongo_query, list):
                 for stage in mongo_query:
                     print(stage)
             else:
                 print(mongo_query)
-
-            # execute query
-            collection = self.db[self.selected_collection]
-            if isinstance(mongo_query, list):
-                results = collection.aggregate(mongo_query)
+            if explain:
+                print_plan(self._explain(source, mongo_query))
+
+            # execute query, unless the same pipeline already ran against this collection
+            cache_key = json.dumps(mongo_query, sort_keys=True, default=str)
+            results = self.result_cache.get("mongo", collection_name, cache_key)
+            if self.pager:
+                self.pager.close()
+            if results is None:
+                self.pager = ResultPager(
+                    self._stream(self.db[source], mongo_query), MongoDBConfig.PAGE_SIZE, MongoDBConfig.MAX_RESULT_ROWS,
+                    on_complete=lambda rows: self.result_cache.put("mongo", collection_name, cache_key, rows)
+                )
             else:
-                results = collection.find(mongo_query)
+                print("\n(cached result)")
+                self.pager = ResultPager(results, MongoDBConfig.PAGE_SIZE, MongoDBConfig.MAX_RESULT_ROWS)
 
-            # display results
+            # display the first page of results; 'more' shows the next one
             print("\nResults:")
-            results_found = False
-            for res in results:
-                results_found = True
-                print(res)
-            if not results_found:
-                print("No results found.")
+            self._print_page()
 
         except Exception as e:
             print(f"Error executing query: {e}")
 
 
+    # run a query and return (pipeline, all result documents) without printing, paging or caching;
+    # None if the query isn't recognized. used by batch mode and the benchmarks
+    def execute(self, query, collection_name=None):
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            return None
+        return self.execute_parsed(query_type, params, collection_name)
+
+
+    # run an already parsed query; returns (pipeline, all result documents)
+    def execute_parsed(self, query_type, params, collection_name=None):
+        collection_name = collection_name or self.selected_collection
+        source, mongo_query = self._pipeline(query_type, params, collection_name)
+        return mongo_query, list(self._stream(self.db[source], mongo_query))
+
+
+    # run a query and return (pipeline, iterator over its documents), fetched from the cursor as the
+    # iterator is read; close it to stop early. None if the query isn't recognized
+    def stream(self, query, collection_name=None):
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            return None
+        source, mongo_query = self._pipeline(query_type, params, collection_name or self.selected_collection)
+        return mongo_query, self._stream(self.db[source], mongo_query)
+
+
+    # run a query on step of the collection's sample; returns (pipeline, estimate documents, rate), each
+    # document holding the group's estimate (total_metric or avg_metric) and its interval (low, high).
+    # None once step is past the last of Config.APPROX_STEPS, when only the exact answer is left;
+    # raises ValueError if the query isn't recognized
+    def estimate(self, query, collection_name=None, step=0):
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            raise ValueError("Query not recognized.")
+        result = self._estimate(query_type, params, collection_name or self.selected_collection, step)
+        return result and result[1:]
+
+
+    # (collection run on, pipeline, estimate documents, rate) of step; see estimate
+    def _estimate(self, query_type, params, collection_name, step):
+        if not Config.SAMPLE_RATE:
+            raise ValueError("Approximate queries are off (Config.SAMPLE_RATE is None)")
+        rates = sample_steps(Config.SAMPLE_RATE, Config.APPROX_STEPS)
+        if step >= len(rates):
+            return None
+        rate, size = rates[step], None
+        source = sample_name(collection_name)
+        if source not in self.db.list_collection_names():
+            # no sample collection: draw the same share of the documents with $sample
+            source, count = collection_name, self.db[collection_name].estimated_document_count()
+            if not count:
+                raise ValueError(f"Collection '{collection_name}' is empty")
+            size = max(1, round(rate * count))
+            rate = size / count
+        self.index_advisor.record(collection_name, query_type, params["groups"])
+        with self.metrics.stage("query.generate"):
+            mongo_query = self.query_generator.generate_sample_query(query_type, params, rate, size)
+        rows = [(doc["_id"], doc["values"], doc["total"], doc["squares"])
+                for doc in self._stream(self.db[source], mongo_query)]
+        field = "avg_metric" if query_type in AVERAGE_TEMPLATES else "total_metric"
+        documents = [{"_id": group, field: value, "low": low, "high": high} for group, value, low, high
+                     in estimate(query_type, params["groups"], rows, rate, Config.APPROX_CONFIDENCE)]
+        return source, mongo_query, documents, rate
+
+
+    # plan summary (see explain.py) of a natural language query; None if it isn't recognized
+    def explain(self, query, collection_name=None):
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            return None
+        source, mongo_query = self._pipeline(query_type, params, collection_name or self.selected_collection)
+        return self._explain(source, mongo_query)
+
+
+    # run the explain command with executionStats (which executes the query) and summarize it
+    def _explain(self, source, mongo_query):
+        if isinstance(mongo_query, list):
+            command = {"aggregate": source, "pipeline": mongo_query, "cursor": {},
+                       "allowDiskUse": MongoDBConfig.ALLOW_DISK_USE, "collation": Config.STRING_COLLATION}
+        else:
+            command = {"find": source, "filter": mongo_query, "collation": Config.STRING_COLLATION}
+        with self.metrics.stage("query.explain"):
+            explained = self.db.command("explain", command, verbosity="executionStats")
+        summary = summarize_mongo_explain(json.dumps(mongo_query, default=str), explained, source)
+        # a rollup holds one row per cell and is meant to be read in full
+        summary["full_scans"] = [name for name in summary["full_scans"] if not is_rollup(name)]
+        self.metrics.record_plan(summary)
+        return summary
+
+
+    # (collection to run on, pipeline) for a parsed query. eligible aggregates read the
+    # pre-aggregated rollup instead of every document
+    def _pipeline(self, query_type, params, collection_name):
+        self.index_advisor.record(collection_name, query_type, params["groups"])
+        with self.metrics.stage("query.generate"):
+            rollup = self._rollup(collection_name)
+            mongo_query = rollup and self.query_generator.generate_rollup_query(query_type, params, rollup)
+            if mongo_query:
+                return rollup_name(collection_name), mongo_query
+            return collection_name, self.query_generator.generate_mongo_query(query_type, params)
+
+
+    # stream documents from a cursor fetching MongoDBConfig.FETCH_BATCH_SIZE documents per round trip.
+    # running the pipeline (which returns the first batch) is timed as query.execute, every
+    # further batch as query.fetch
+    def _stream(self, collection, mongo_query):
+        with self.metrics.stage("query.execute"):
+            if isinstance(mongo_query, list):
+                cursor = collection.aggregate(mongo_query, batchSize=MongoDBConfig.FETCH_BATCH_SIZE,
+                                              allowDiskUse=MongoDBConfig.ALLOW_DISK_USE,
+                                              collation=Config.STRING_COLLATION)
+            else:
+                cursor = collection.find(mongo_query, batch_size=MongoDBConfig.FETCH_BATCH_SIZE,
+                                         collation=Config.STRING_COLLATION)
+        try:
+            while True:
+                with self.metrics.stage("query.fetch"):
+                    documents = list(itertools.islice(cursor, MongoDBConfig.FETCH_BATCH_SIZE))
+                if not documents:
+                    break
+                self.metrics.count("query.rows", len(documents))
+                self.metrics.count("query.bytes", row_bytes(documents))
+                yield from documents
+        finally:
+            cursor.close()
+
+
+    # show the next page of the last query's results
+    def show_more(self):
+        try:
+            if self.pager is None or not self.pager.has_more():
+                print("No more results.")
+                return
+            self._print_page()
+        except Exception as e:
+            print(f"Error fetching results: {e}")
+
+
+    # print the next page; the cursor is read while it prints, so execute & fetch time are left out
+    def _print_page(self):
+        with self.metrics.stage("query.print", exclude=("query.execute", "query.fetch")):
+            try:
+                self.pager.print_page()
+            except Exception:
+                # a stream that failed partway can't be paged further, and isn't cached (see ResultPager)
+                self.pager.close()
+                self.pager = None
+                raise
+
+
+    # (metrics snapshot, cache statistics) of this session
+    def stats(self):
+        caches = {f"{name} cache": stats for name, stats in self.query_generator.cache_stats().items()}
+        caches["result cache"] = self.result_cache.stats()
+        return self.metrics.snapshot(), caches
+
+
+    # print stage timings, row & byte counters and cache hit rates of this session
+    def show_stats(self):
+        print_snapshot(*self.stats())
+
+
+    # write the session's metrics to a file (metrics.METRICS_PATH by default)
+    def export_stats(self, path=None):
+        try:
+            print(f"Metrics written to {self.metrics.export(path, {'backend': 'mongo'})}.")
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+
     # delete current collection
     def delete_collection(self):
         if not self.selected_collection:
@@ -151,6 +739,10 @@ class ChatDBMongo:
         confirmation = input(f"Are you sure you want to delete the collection '{self.selected_collection}'? (yes/no): ").strip().lower()
         if confirmation == "yes":
             self.db[self.selected_collection].drop()
+            self.db[rollup_name(self.selected_collection)].drop()
+            self.db[sample_name(self.selected_collection)].drop()
+            self.result_cache.invalidate("mongo", self.selected_collection)
+            self.rollups.pop(self.selected_collection, None)
             print(f"Collection '{self.selected_collection}' has been deleted.")
             self.selected_collection = None
         else:
@@ -162,14 +754,109 @@ class ChatDBMongo:
         self.select_collection()
 
     def close(self):
-        self.client.close()
+        if self.pager:
+            self.pager.close()
+        MongoDBConfig.close_client()
+
+
+# insert one batch unordered; returns (documents inserted, write errors)
+def _insert_batch(collection, batch):
+    try:
+        result = collection.insert_many(batch, ordered=False)
+        return len(result.inserted_ids), []
+    except BulkWriteError as e:
+        return e.details.get("nInserted", 0), e.details.get("writeErrors", [])
+
+
+# documents of a DataFrame's rows; missing dates become null since BSON can't store NaT
+def _documents(df):
+    dates = df.columns[[pd.api.types.is_datetime64_any_dtype(dtype) for dtype in df.dtypes]]
+    if len(dates):
+        df = df.astype({col: object for col in dates})
+        df[dates] = df[dates].where(df[dates].notna(), None)
+    return df.to_dict(orient="records")
+
+
+# upsert one batch unordered, matching documents on the key fields; returns ((inserted, updated), write errors,
+# stored versions of the batch's documents). the stored versions (their rollup fields) are read
+# before the write so the rollup can take them out; None when there are no fields to read
+# with sample, the batch's documents are drawn into the sample again once they're written (see _resample_batch)
+def _upsert_batch(collection, keys, batch, fields, sample=None):
+    if not batch:
+        return (0, 0), [], None
+    stored = None
+    if fields:
+        projection = dict.fromkeys(keys + fields, 1)
+        projection["_id"] = 0
+        documents = collection.find({key: {"$in": list({document[key] for document in batch})} for key in keys},
+                                    projection)
+        stored = pd.DataFrame(list(documents), columns=keys + fields)
+        if len(keys) > 1:  # $in per field also matches key combinations the batch doesn't have
+            stored = stored.merge(pd.DataFrame(batch, columns=keys).drop_duplicates(), on=keys)
+    try:
+        result = collection.bulk_write([UpdateOne({key: document[key] for key in keys}, {"$set": document},
+                                                  upsert=True)
+                                        for document in batch], ordered=False)
+        counts, errors = (result.upserted_count, result.modified_count), []
+    except BulkWriteError as e:
+        counts, errors = (e.details.get("nUpserted", 0), e.details.get("nModified", 0)), e.details.get("writeErrors", [])
+    if sample is not None:
+        _resample_batch(collection, sample, keys, batch)
+    return counts, errors, stored
+
+
+# replace the sample's copies of a batch's documents by a fresh draw of their stored versions, so an
+# append doesn't draw the sample again from the whole collection. every document of the batch is
+# drawn anew, unchanged ones too, so each document is still sampled independently with Config.SAMPLE_RATE
+def _resample_batch(collection, sample, keys, batch):
+    if len(keys) == 1:
+        match = {keys[0]: {"$in": [document[keys[0]] for document in batch]}}
+    else:
+        match = {"$or": [{key: document[key] for key in keys} for document in batch]}
+    sample.delete_many(match)
+    drawn = [dict(document, **{SAMPLE_U: random.random() * Config.SAMPLE_RATE})
+             for document in collection.find(match) if random.random() < Config.SAMPLE_RATE]
+    if drawn:
+        sample.insert_many(drawn, ordered=False)
+
+
+# fields of the documents a rollup is computed from
+def _rollup_fields(rollup):
+    return rollup.dimensions + rollup.measures + ([rollup.date_column] if rollup.date_column else [])
+
+
+# documents of a cursor as DataFrames of CHUNK_SIZE rows
+def _frames(cursor):
+    while True:
+        documents = list(itertools.islice(cursor, CHUNK_SIZE))
+        if not documents:
+            break
+        yield pd.DataFrame(documents)
+
+
+# rollup update for one cell: counts & sums are added (subtracted when negative), min/max
+# folded in, new cells upserted
+def _rollup_update(rollup, cell):
+    inc = {ROW_COUNT: cell[ROW_COUNT]}
+    low, high = {}, {}
+    for m in rollup.measures:
+        inc[f"{m}_count"] = cell[f"{m}_count"]
+        total = cell[f"{m}_sum"]
+        inc[f"{m}_sum"] = 0 if pd.isna(total) else total  # like $sum, no values add up to 0
+        if not pd.isna(cell[f"{m}_min"]):
+            low[f"{m}_min"] = cell[f"{m}_min"]
+            high[f"{m}_max"] = cell[f"{m}_max"]
+    update = {"$inc": inc}
+    if low:
+        update.update({"$min": low, "$max": high})
+    return UpdateOne({key: cell[key] for key in rollup.key}, update, upsert=True)
 
 
 # upload dataset to mongo
 def upload_dataset():
-    file_path = input("Enter the full path of the dataset file (CSV format): ").strip()
-    if not os.path.exists(file_path) or not file_path.endswith('.csv'):
-        print("Invalid file path or format. Please upload a valid CSV file.")
+    file_path = input("Enter the full path of the dataset file (CSV, Parquet or Arrow): ").strip()
+    if not os.path.exists(file_path) or not is_dataset(file_path):
+        print("Invalid file path or format. Please upload a CSV, Parquet or Arrow file.")
         return None
     return file_path
 
@@ -1,6 +1,13 @@
-import re
-import spacy
+import copy
 from typing import Tuple, Optional
+from nlp_service import tokenize
+from cache import LRUCache
+from metrics import Metrics
+from query_dispatch import PatternDispatcher, normalize_query
+from index_advisor import query_shape
+from rollup import ROW_COUNT
+from approx import can_estimate, AVERAGE_TEMPLATES, SAMPLE_U
+from mongo_config import Config
 
 
 class QueryGenerator:
@@ -11,11 +18,9 @@ class QueryGenerator:
         valid_group: list of valid group-by fields - category, location, payment_method etc
         numeric_filters: list of numeric filter fields - price, quantity
         string_filters: list of string filter fields - payment_method, category
+        metrics: Metrics the tokenize and match timings are recorded in
     '''
-    def __init__(self, total_metrics, average_metrics, valid_groups, numeric_filters, string_filters):
-        # load spaCy for parsing & tokenization
-        self.nlp = spacy.load("en_core_web_sm")
-
+    def __init__(self, total_metrics, average_metrics, valid_groups, numeric_filters, string_filters, metrics=None):
         # params for class attributes
         self.total_metrics = total_metrics
         self.average_metrics = average_metrics
@@ -84,22 +89,94 @@ class QueryGenerator:
             },
         ]
 
+        # compiled patterns dispatched on their leading keyword, plus caches for repeated phrasings
+        self.dispatcher = PatternDispatcher(self.query_patterns)
+        self.parse_cache = LRUCache(Config.PARSE_CACHE_SIZE)  # normalized text -> (type, params)
+        self.pipeline_cache = LRUCache(Config.PARSE_CACHE_SIZE)  # (type, groups) -> pipeline
+        self.metrics = metrics or Metrics()
+
     # function to parse natural language query
     def parse_query(self, query: str) -> Tuple[Optional[str], Optional[dict]]:
-        doc = self.nlp(query)
-        text = " ".join([token.text for token in doc])  # tokenize queries into tokens
-        # iterate through patterns to find a match
-        for pattern in self.query_patterns:
-            match = re.search(pattern["pattern"], text)
-            # if match is found, return the query type & MongoDB template
-            if match:
-                return pattern["type"], {"groups": match.groups(), "template": pattern["mongo_template"]}
+        key = normalize_query(query)
+        cached = self.parse_cache.get(key)
+        if cached is not None:
+            return cached
+        with self.metrics.stage("query.tokenize"):
+            text = " ".join(tokenize(key))  # tokenize queries into tokens (shared spaCy service)
+        with self.metrics.stage("query.match"):
+            pattern, match = self.dispatcher.match(text)
+        # if match is found, return the query type & MongoDB template
+        if match:
+            result = pattern["type"], {"groups": match.groups(), "template": pattern["mongo_template"]}
         # for cases with no pattern matches
-        return None, None
+        else:
+            result = None, None
+        self.parse_cache.put(key, result)
+        return result
 
+    def cache_stats(self) -> dict:
+        return {"parse": self.parse_cache.stats(), "pipeline": self.pipeline_cache.stats()}
 
-    #  function to generate mongodb query
+
+    #  function to generate mongodb query, served from the pipeline cache when possible
     def generate_mongo_query(self, query_type: str, params: dict) -> list:
+        key = (query_type, params["groups"])
+        pipeline = self.pipeline_cache.get(key)
+        if pipeline is None:
+            pipeline = self._build_mongo_query(query_type, params)
+            self.pipeline_cache.put(key, pipeline)
+        return copy.deepcopy(pipeline)  # callers get their own copy of the cached stages
+
+    # pipeline over the collection's rollup, or None if the rollup can't answer the query.
+    # output documents have the same shape as the pipeline over the raw documents
+    def generate_rollup_query(self, query_type: str, params: dict, rollup) -> Optional[list]:
+        groups = params["groups"]
+        if not rollup.covers(query_type, groups):
+            return None
+        group_by, metric, _ = query_shape(query_type, groups)
+        if query_type == "top_n" and Config.TOP_N_MODE == "per_group" and metric != "sales":
+            return None  # needs the documents themselves
+        total = {"$sum": f"${ROW_COUNT}"} if metric == rollup.count_metric else {"$sum": f"${metric}_sum"}
+
+        if query_type == "average_by_category":
+            return [
+                {"$group": {"_id": f"${group_by}", "total_metric": total, "count": {"$sum": f"${metric}_count"}}},
+                {"$project": {"total_metric": 1, "avg_metric": {
+                    "$cond": [{"$gt": ["$count", 0]}, {"$divide": ["$total_metric", "$count"]}, None]}}},
+                {"$sort": {"avg_metric": -1}}
+            ]
+        mongo_query = [
+            {"$group": {"_id": f"${group_by}", "total_metric": total}},
+            {"$sort": {"total_metric": -1}}
+        ]
+        if query_type == "top_n":
+            mongo_query.append({"$limit": int(groups[0])})
+        return mongo_query
+
+    # pipeline of the per-group (values, total, squares) of the metric over a sample, which approx.estimate
+    # scales into estimates. with size, it draws a $sample of that many documents from the collection
+    # itself; otherwise it reads the documents of the sample collection whose SAMPLE_U is below rate.
+    # the query's own $match stages follow the sample, and top_n reads every group
+    def generate_sample_query(self, query_type: str, params: dict, rate: float, size: int = None) -> list:
+        groups = params["groups"]
+        group_by, metric, _ = query_shape(query_type, groups)
+        if not can_estimate(query_type) or (query_type == "top_n" and Config.TOP_N_MODE == "per_group"
+                                            and metric != "sales"):
+            raise ValueError(f"'{query_type}' queries can't be estimated")
+        mongo_query = [{"$sample": {"size": size}} if size is not None else {"$match": {SAMPLE_U: {"$lt": rate}}}]
+        mongo_query += [stage for stage in self.generate_mongo_query(query_type, params) if "$match" in stage]
+        if query_type in AVERAGE_TEMPLATES:
+            mongo_query.append({"$match": {metric: {"$type": "number"}}})  # like $avg, skip missing values
+        value = 1 if metric == "sales" else f"${metric}"  # 'total sales' counts documents
+        mongo_query.append({"$group": {
+            "_id": f"${group_by}",
+            "values": {"$sum": 1},
+            "total": {"$sum": value},
+            "squares": {"$sum": 1 if metric == "sales" else {"$multiply": [value, value]}}
+        }})
+        return mongo_query
+
+    def _build_mongo_query(self, query_type: str, params: dict) -> list:
         groups = params["groups"]
 
         # intialize variables
@@ -142,7 +219,7 @@ class QueryGenerator:
         if query_type == "average_with_where":
             if filter_column in self.string_filters:
                 if operator in ["=", "is"]:
-                    mongo_query.append({"$match": {filter_column: {"$regex": f"^{filter_value}$", "$options": "i"}}})
+                    mongo_query.append({"$match": {filter_column: filter_value}})
             elif filter_column in self.numeric_filters and operator:
                 mongo_operator = operator_map.get(operator)
                 if mongo_operator:
@@ -151,9 +228,10 @@ class QueryGenerator:
         # filtering stage
         if query_type == "aggregate_with_where":
             if filter_column in self.string_filters:
-                # case insensitive strings
+                # case insensitive strings: plain equality, made case-insensitive by running the
+                # pipeline with Config.STRING_COLLATION so the collated index on the field is used
                 if operator in ["=", "is"]:
-                    mongo_query.append({"$match": {filter_column: {"$regex": f"^{filter_value}$", "$options": "i"}}})
+                    mongo_query.append({"$match": {filter_column: filter_value}})
             elif filter_column in self.numeric_filters and operator:
                 mongo_operator = operator_map.get(operator)
                 if mongo_operator:
@@ -169,20 +247,25 @@ class QueryGenerator:
                 group_stage["avg_metric"] = {"$avg": f"${metric}"}
             mongo_query.append({"$group": group_stage})
 
-        # top queries
+        # top queries: aggregate per group server-side, then keep the n largest groups.
+        # $sort directly followed by $limit is coalesced into a top-k sort that only
+        # holds n documents in memory, unlike pushing every document into group arrays
         if query_type == "top_n":
-            mongo_query.extend([
-                {"$group": {
+            if Config.TOP_N_MODE == "per_group" and metric != "sales":
+                # n highest-metric documents within each group ($topN, MongoDB 5.2+)
+                mongo_query.append({"$group": {
                     "_id": f"${group_by}",
-                    "transactions": {
-                        "$push": {"transaction": "$$ROOT", "metric": f"${metric}"}
-                    }
-                }},
-                {"$sort": {"metric": -1}},
-                {"$project": {
-                    "transactions": {"$slice": ["$transactions", limit]}
-                }}
-            ])
+                    "top_documents": {"$topN": {"n": limit, "sortBy": {metric: -1}, "output": "$$ROOT"}}
+                }})
+            else:
+                mongo_query.extend([
+                    {"$group": {
+                        "_id": f"${group_by}",
+                        "total_metric": {"$sum": 1} if metric == "sales" else {"$sum": f"${metric}"}
+                    }},
+                    {"$sort": {"total_metric": -1}},
+                    {"$limit": limit}
+                ])
 
         # sorting stage
         if query_type in ["aggregate_by_category", "aggregate_with_where", "average_by_category"]:
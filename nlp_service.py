@@ -0,0 +1,40 @@
+#nlp_service.py
+# process-wide spaCy service shared by the MySQL and MongoDB query generators
+
+import re
+import threading
+
+MODEL_NAME = "en_core_web_sm"
+# parse_query only reads token.text, so every trained component is left out
+EXCLUDED_PIPES = ["tok2vec", "tagger", "parser", "senter", "attribute_ruler", "lemmatizer", "ner"]
+FAST_TOKENIZE = True  # skip spaCy for queries that follow the template grammar
+
+# spaCy splits text on whitespace, then peels prefixes, suffixes and infixes off every piece.
+# A piece that is a plain word, a number or a lone comparison operator has nothing to peel, so
+# for queries made only of such pieces, splitting on whitespace gives the same tokens (barring
+# spaCy's contraction exceptions like 'cannot', which no template uses). Anything else, such
+# as 'price>100' or a trailing '?', goes to spaCy, so the fast path never changes what matches
+_PLAIN_PIECE = re.compile(r"[A-Za-z_]+|\d+(?:\.\d+)?|[<>=]")
+
+_nlp = None
+_lock = threading.Lock()
+
+
+def get_nlp():
+    """Return the shared tokenizer-only spaCy pipeline, loading it on first use."""
+    global _nlp
+    if _nlp is None:
+        with _lock:
+            if _nlp is None:
+                import spacy  # imported lazily so fast-mode sessions never pay for it
+                _nlp = spacy.load(MODEL_NAME, exclude=EXCLUDED_PIPES)
+    return _nlp
+
+
+def tokenize(text: str) -> list:
+    """Split a query into token strings."""
+    if FAST_TOKENIZE:
+        pieces = text.split()
+        if all(_PLAIN_PIECE.fullmatch(piece) for piece in pieces):
+            return pieces
+    return [token.text for token in get_nlp()(text)]
@@ -0,0 +1,97 @@
+#normalize.py
+# maps the sales feeds in Config.COLUMN_MAPPINGS onto one typed schema at ingest, so every feed
+# can be loaded into the same table/collection and queried together
+
+import pandas as pd
+from sqlconfig import Config
+
+SOURCE_COLUMN = "source"  # feed every row came from
+CANONICAL = "canonical"  # files that already use the unified column names (like data1.csv)
+SOURCES = [CANONICAL] + list(Config.COLUMN_MAPPINGS)
+DATE_COLUMN = "date"
+NUMERIC_COLUMNS = list(dict.fromkeys(Config.VALID_METRICS["online_sales"] + Config.NUMERIC_FILTERS))
+
+
+def match_key(columns, key):
+    """Columns upserts match rows on: key within its feed when rows carry a source."""
+    return [SOURCE_COLUMN, key] if SOURCE_COLUMN in columns else [key]
+
+
+class Normalizer:
+    '''
+    Renames and types the columns of one feed's chunks into the unified schema.
+
+    args:
+        layout: name of the feed (a Config.COLUMN_MAPPINGS key, or CANONICAL)
+        renames: file column -> unified column, for the file's columns that change name
+
+    Every step works on whole columns: columns are renamed in one go,
+    numeric columns are parsed with pd.to_numeric and dates with
+    pd.to_datetime (unparseable values become missing, and are counted
+    per column in coerced), total_revenue is derived from quantity and
+    price for feeds that lack it, and the source column is set to the layout.
+    '''
+    def __init__(self, layout=CANONICAL, renames=None):
+        self.layout = layout
+        self.renames = dict(renames or {})
+        self.coerced = {}  # unified column -> values that didn't parse and became missing
+
+    @classmethod
+    def detect(cls, columns):
+        """Normalizer for a file with the given header.
+
+        The layout is the one with the most headers that only it uses (a
+        header the mapping renames); ties go to the layout matching the most
+        headers overall. A header no layout renames is read as canonical.
+        """
+        columns = list(columns)
+        present = set(columns)
+        best, best_score = CANONICAL, (0, 0)
+        for layout, mapping in Config.COLUMN_MAPPINGS.items():
+            renamed = sum(1 for src, dst in mapping.items() if src != dst and src in present)
+            score = (renamed, sum(1 for src in mapping if src in present))
+            if renamed and score > best_score:
+                best, best_score = layout, score
+        mapping = Config.COLUMN_MAPPINGS.get(best, {})
+        # a column is only renamed onto a name the file doesn't use itself
+        renames = {col: mapping[col] for col in columns
+                   if mapping.get(col, col) != col and mapping[col] not in present}
+        return cls(best, renames)
+
+    @property
+    def derived(self) -> list:
+        """Unified columns computed from other columns rather than read from the file."""
+        if self.layout == CANONICAL or "total_revenue" in Config.COLUMN_MAPPINGS[self.layout].values():
+            return []
+        return ["total_revenue"]
+
+    def describe(self) -> str:
+        if not self.renames:
+            return f"'{self.layout}' layout"
+        return f"'{self.layout}' layout ({', '.join(f'{src} -> {dst}' for src, dst in self.renames.items())})"
+
+    def _coerce(self, df, col, parsed):
+        lost = int((df[col].notna() & parsed.isna()).sum())
+        if lost:
+            self.coerced[col] = self.coerced.get(col, 0) + lost
+        df[col] = parsed
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """A chunk in unified column names and types, with its source column set."""
+        df = df.rename(columns=self.renames)
+        for col in NUMERIC_COLUMNS:
+            if col in df.columns:
+                self._coerce(df, col, pd.to_numeric(df[col], errors="coerce"))
+        if DATE_COLUMN in df.columns and not pd.api.types.is_datetime64_any_dtype(df[DATE_COLUMN]):
+            self._coerce(df, DATE_COLUMN, pd.to_datetime(df[DATE_COLUMN], errors="coerce"))
+        if self.derived and "total_revenue" not in df.columns and {"quantity", "price"} <= set(df.columns):
+            revenue = df["quantity"] * df["price"]
+            if "discount" in df.columns:
+                revenue = revenue * (1 - df["discount"].fillna(0))
+            df["total_revenue"] = revenue.round(2)
+        if SOURCE_COLUMN in df.columns:
+            # rows of an exported unified table keep their feed; anything else is this file's
+            df[SOURCE_COLUMN] = df[SOURCE_COLUMN].where(df[SOURCE_COLUMN].isin(SOURCES), self.layout)
+        else:
+            df[SOURCE_COLUMN] = self.layout
+        return df
@@ -0,0 +1,44 @@
+#query_dispatch.py
+# compiled pattern matching shared by the MySQL and MongoDB query generators
+
+import re
+
+
+def normalize_query(text: str) -> str:
+    """Collapse whitespace so equivalent phrasings share one cache entry."""
+    return " ".join(text.split())
+
+
+class PatternDispatcher:
+    '''
+    Matches tokenized query text against a generator's query_patterns.
+
+    Patterns are compiled once and bucketed by their leading keyword
+    (total, average, top), so a query is only tried against the patterns
+    whose keyword it contains. Patterns keep their original priority: the
+    first pattern in query_patterns order that matches wins, exactly as in
+    a linear scan.
+    '''
+    def __init__(self, query_patterns: list):
+        self.patterns = [(re.compile(p["pattern"]), p) for p in query_patterns]
+        self.buckets = {}  # leading keyword -> indexes into self.patterns
+        for idx, p in enumerate(query_patterns):
+            keyword = re.match(r"\w+", p["pattern"]).group(0)
+            self.buckets.setdefault(keyword, []).append(idx)
+        self.keyword_re = re.compile(r"\b(" + "|".join(map(re.escape, self.buckets)) + r")\b")
+        self._candidates = {}  # frozenset of keywords -> ordered pattern indexes
+
+    def candidates(self, text: str) -> list:
+        keywords = frozenset(self.keyword_re.findall(text))
+        if keywords not in self._candidates:
+            self._candidates[keywords] = sorted(i for k in keywords for i in self.buckets[k])
+        return self._candidates[keywords]
+
+    def match(self, text: str):
+        """Return (pattern entry, match object) for the first matching pattern, or (None, None)."""
+        for idx in self.candidates(text):
+            compiled, pattern = self.patterns[idx]
+            match = compiled.search(text)
+            if match:
+                return pattern, match
+        return None, None
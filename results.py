@@ -0,0 +1,90 @@
+#results.py
+# paginated result delivery shared by the MySQL and MongoDB backends
+
+
+class ResultPager:
+    '''
+    Pulls rows from a result stream one page at a time.
+
+    args:
+        rows: iterator over result rows (usually a server-side cursor)
+        page_size: rows printed per page
+        max_rows: row cap; the stream is closed once this many rows were shown
+        on_complete: called with the full list of rows if the stream ends
+            within max_rows, e.g. to store the result in the result cache;
+            a stream that raised is never complete
+
+    Only the rows of a result that fits under the cap are kept in memory.
+    '''
+    def __init__(self, rows, page_size, max_rows=None, on_complete=None):
+        self.rows = iter(rows)
+        self.page_size = page_size
+        self.max_rows = max_rows
+        self.on_complete = on_complete
+        self.shown = 0
+        self.exhausted = False
+        self.capped = False
+        self.failed = False  # the stream raised, so the rows shown are only part of the result
+        self._kept = []
+        self._peeked = []  # at most one row read ahead of the current page
+
+    def next_page(self) -> list:
+        page = []
+        while len(page) < self.page_size and self.has_more():
+            if self.max_rows is not None and self.shown >= self.max_rows:
+                self.capped = True
+                self.close()
+                break
+            row = self._peeked.pop()
+            page.append(row)
+            self._kept.append(row)
+            self.shown += 1
+        # look one row ahead so exhausted is accurate as soon as the last page is shown
+        if not self.capped and self.has_more() and self.max_rows is not None and self.shown >= self.max_rows:
+            self.capped = True
+            self.close()
+        return page
+
+    def has_more(self) -> bool:
+        if self._peeked:
+            return True
+        if self.exhausted or self.failed:
+            return False
+        try:
+            self._peeked.append(next(self.rows))
+            return True
+        except StopIteration:
+            self.exhausted = True
+            if self.on_complete:
+                self.on_complete(self._kept)
+            return False
+        except Exception:
+            self.failed = True
+            self._kept = []
+            raise
+
+    def print_page(self):
+        """Print the next page and tell the user whether more rows are available."""
+        start = self.shown
+        page = self.next_page()
+        if not page and start == 0:
+            print("No results found.")
+            return
+        for row in page:
+            print(row)
+        if self.capped:
+            print(f"-- row cap of {self.max_rows} reached; remaining rows were not fetched --")
+        elif self.has_more():
+            print(f"-- rows {start + 1}-{self.shown} shown; type 'more' for the next page --")
+        else:
+            print(f"-- {self.shown} rows --")
+
+    def close(self):
+        """Stop the underlying stream, releasing its cursor and connection."""
+        self._peeked = []
+        if not self.exhausted:
+            self.exhausted = True
+            self._kept = []
+            close = getattr(self.rows, "close", None)
+            if close:
+                close()
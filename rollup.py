@@ -0,0 +1,114 @@
+#rollup.py
+# pre-aggregated rollups shared by the MySQL and MongoDB backends
+
+import pandas as pd
+from index_advisor import query_shape
+
+ROLLUP_SUFFIX = "__rollup"  # rollup of dataset 'sales' is stored as 'sales__rollup'
+DAY = "day"
+ROW_COUNT = "row_count"
+STATS = ["sum", "count", "min", "max"]
+
+# query templates a rollup can answer (no filter, one group-by column)
+ROLLUP_TEMPLATES = ["aggregate_by_category", "average_by_category", "top_n"]
+
+
+def rollup_name(dataset):
+    return f"{dataset}{ROLLUP_SUFFIX}"
+
+
+def is_rollup(name):
+    return name.endswith(ROLLUP_SUFFIX)
+
+
+class Rollup:
+    '''
+    Sum, count, min and max of every measure per (dimensions, day) cell.
+
+    args:
+        dimensions: group-by columns that make up the cell key
+        measures: numeric columns aggregated in every cell
+        date_column: column bucketed into days; None puts every row in one bucket
+        count_metric: metric answered by the cell row counts ("sales" in MongoDB)
+
+    A template grouping by one dimension is answered by re-aggregating the
+    cells: totals add up the sums, averages divide the summed sums by the
+    summed counts. Appending rows only ever adds to cells, so backends keep a
+    rollup current by merging in the cells() of each batch they insert; an
+    upsert merges the delta() between the stored and the new rows instead.
+    '''
+    def __init__(self, dimensions, measures, date_column=None, count_metric=None):
+        self.dimensions = list(dimensions)
+        self.measures = list(measures)
+        self.date_column = date_column
+        self.count_metric = count_metric
+
+    @classmethod
+    def from_columns(cls, columns, dimensions, date_column=None, count_metric=None):
+        """Definition of an existing rollup, recovered from its column names."""
+        measures = [col[:-len("_sum")] for col in columns if col.endswith("_sum")]
+        return cls([d for d in dimensions if d in columns], measures, date_column, count_metric)
+
+    @property
+    def key(self) -> list:
+        return self.dimensions + [DAY]
+
+    def value_columns(self) -> list:
+        return [ROW_COUNT] + [f"{m}_{stat}" for m in self.measures for stat in STATS]
+
+    def covers(self, query_type, groups) -> bool:
+        """Whether a parsed query can be answered from this rollup."""
+        if query_type not in ROLLUP_TEMPLATES:
+            return False
+        group_by, metric, _ = query_shape(query_type, groups)
+        if group_by not in self.dimensions:
+            return False
+        if metric in self.measures:
+            return True
+        return metric == self.count_metric and query_type != "average_by_category"
+
+    def cells(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Aggregate a DataFrame of raw rows into rollup cells (key + value columns).
+
+        Missing dimension values and unparseable dates become '' so every
+        cell has a complete key. A measure's sum, min and max are NaN in
+        cells where it has no values.
+        """
+        keys = pd.DataFrame({dim: df[dim].fillna("").astype(str) for dim in self.dimensions}, index=df.index)
+        if self.date_column in df.columns:
+            days = pd.to_datetime(df[self.date_column], errors="coerce").dt.strftime("%Y-%m-%d")
+            keys[DAY] = days.fillna("")
+        else:
+            keys[DAY] = ""
+        values = pd.DataFrame({m: pd.to_numeric(df[m], errors="coerce") for m in self.measures}, index=df.index)
+        grouped = pd.concat([keys, values], axis=1).groupby(self.key, sort=False)
+
+        cells = grouped.size().rename(ROW_COUNT).to_frame()
+        for m in self.measures:
+            stats = grouped[m].agg(STATS)
+            stats["sum"] = stats["sum"].where(stats["count"] > 0)  # SUM of no values is NULL, not 0
+            cells = cells.join(stats.add_prefix(f"{m}_"))
+        return cells.reset_index()
+
+    def delta(self, removed: pd.DataFrame, added: pd.DataFrame) -> pd.DataFrame:
+        """Signed cells that take removed rows out of a rollup and put added rows in.
+
+        Row counts, sums and value counts of the removed rows are subtracted.
+        Min and max can't be taken back, so only the added rows' are folded
+        in: in cells that lost values they bound the values rather than equal them.
+        """
+        new = self.cells(added)
+        if removed.empty:
+            return new
+        old = self.cells(removed)
+        signed = [ROW_COUNT] + [f"{m}_{stat}" for m in self.measures for stat in ("sum", "count")]
+        old[signed] = -old[signed]
+        for m in self.measures:
+            old[f"{m}_min"] = old[f"{m}_max"] = float("nan")
+        grouped = pd.concat([new, old], ignore_index=True).groupby(self.key, sort=False)
+        cells = grouped[[ROW_COUNT] + [f"{m}_count" for m in self.measures]].sum()
+        for m in self.measures:
+            cells[f"{m}_sum"] = grouped[f"{m}_sum"].sum(min_count=1)
+            cells[f"{m}_min"] = grouped[f"{m}_min"].min()
+            cells[f"{m}_max"] = grouped[f"{m}_max"].max()
+        return cells.reset_index()[self.key + self.value_columns()]
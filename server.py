@@ -0,0 +1,249 @@
+#server.py
+# long-running ChatDB server: backends, query generators, the tokenizer and connection pools are
+# loaded once and shared by every request, so a question costs only its own parsing and execution
+#
+# usage: python server.py [--host 127.0.0.1] [--port 8551] [--workers 8] [--preload mysql mongo]
+
+import argparse
+import itertools
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+import batch
+import ingest
+import nlp_service
+
+HOST = "127.0.0.1"  # local only; the API has no authentication
+PORT = 8551
+WORKERS = 8  # requests handled concurrently
+MAX_ROWS = 1000  # rows returned per query unless the request asks for another cap
+
+
+class Backends:
+    '''
+    Backend instances by name, created on first use and kept for the life of the server.
+
+    args:
+        sqlite_path: database file of the embedded SQLite backend (default: SQLiteConfig.PATH)
+    '''
+    def __init__(self, sqlite_path=None):
+        self.sqlite_path = sqlite_path
+        self._backends = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        if name not in batch.BACKENDS:
+            raise ValueError(f"Unknown backend '{name}'; expected one of {', '.join(batch.BACKENDS)}")
+        with self._lock:
+            if name not in self._backends:
+                self._backends[name] = batch.open_backend(name, self.sqlite_path)
+            return self._backends[name]
+
+    def loaded(self):
+        return list(self._backends)
+
+    def close(self):
+        for chatdb in self._backends.values():
+            chatdb.close()
+
+
+class PooledHTTPServer(HTTPServer):
+    '''
+    HTTP server that handles requests on a bounded worker pool.
+
+    args:
+        address: (host, port) to listen on
+        workers: requests handled at once; further connections wait in the pool's queue
+        backends: Backends shared by every request
+    '''
+    def __init__(self, address, workers, backends):
+        super().__init__(address, ChatDBHandler)
+        self.workers = ThreadPoolExecutor(max_workers=workers)
+        self.backends = backends
+
+    def process_request(self, request, client_address):
+        self.workers.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.workers.shutdown(wait=True)
+
+
+def _param(params, name):
+    if not params.get(name):
+        raise ValueError(f"Missing parameter '{name}'")
+    return params[name]
+
+
+def health(backends, params):
+    return 200, {"status": "ok", "backends": backends.loaded()}
+
+
+def explore(backends, params):
+    """Dataset names of a backend, or the schema and sample rows of one dataset (target)."""
+    chatdb = backends.get(_param(params, "backend"))
+    if params.get("target"):
+        schema, sample = chatdb.describe_dataset(params["target"])
+        return 200, {"schema": schema, "sample": sample}
+    return 200, {"datasets": chatdb.list_datasets()}
+
+
+def sample_queries(backends, params):
+    chatdb = backends.get(_param(params, "backend"))
+    queries = chatdb.sample_query_generator.generate_sample_queries(int(params.get("n", 5)))
+    # the MongoDB generator returns the pipeline along with each question
+    return 200, {"queries": [q["natural_query"] if isinstance(q, dict) else q for q in queries]}
+
+
+def query(backends, params):
+    """First max_rows rows of a query; truncated says whether the result had more."""
+    chatdb = backends.get(_param(params, "backend"))
+    max_rows = int(params.get("max_rows", MAX_ROWS))
+    result = chatdb.stream(_param(params, "query"), _param(params, "target"))
+    if result is None:
+        return 400, {"error": "Query not recognized."}
+    statement, stream = result
+    try:
+        # one row past the cap tells whether there are more, without fetching the rest
+        rows = list(itertools.islice(stream, max_rows + 1))
+    finally:
+        stream.close()  # releases the cursor (and its connection) of an unfinished result
+    return 200, {"statement": statement, "rows": rows[:max_rows], "truncated": len(rows) > max_rows}
+
+
+def explain(backends, params):
+    """Plan summary of a query: rows examined vs returned, indexes used and full scans."""
+    chatdb = backends.get(_param(params, "backend"))
+    summary = chatdb.explain(_param(params, "query"), _param(params, "target"))
+    if summary is None:
+        return 400, {"error": "Query not recognized."}
+    return 200, summary
+
+
+def approx(backends, params):
+    """Estimates of a query from step (0 first) of the dataset's sample; past the last step, the exact result."""
+    chatdb = backends.get(_param(params, "backend"))
+    result = chatdb.estimate(_param(params, "query"), _param(params, "target"), int(params.get("step", 0)))
+    if result is None:
+        status, payload = query(backends, params)
+        return status, dict(payload, exact=True)
+    statement, rows, rate = result
+    return 200, {"statement": statement, "rows": rows, "rate": rate, "exact": False}
+
+
+def stats(backends, params):
+    """Stage timings, counters and cache statistics of a backend since it was loaded."""
+    snapshot, caches = backends.get(_param(params, "backend")).stats()
+    return 200, {"metrics": snapshot, "caches": caches}
+
+
+def checkpoint(backends, params):
+    """Whether an interrupted upload of path into target can be resumed."""
+    target = f"{_param(params, 'backend')}:{_param(params, 'target')}"
+    return 200, {"exists": ingest.has_checkpoint(_param(params, "path"), target)}
+
+
+def upload(backends, params):
+    """Upload a file that is readable by the server into a table/collection."""
+    chatdb = backends.get(_param(params, "backend"))
+    uploaded = chatdb.upload_dataset(_param(params, "path"), _param(params, "target"),
+                                     resume=bool(params.get("resume")), columns=params.get("columns") or None,
+                                     append=bool(params.get("append")))
+    if uploaded is None:
+        return 500, {"error": "Upload failed; see the server output for details."}
+    return 200, {"target": uploaded}
+
+
+def export(backends, params):
+    """Export a table/collection to a Parquet file on the server's filesystem."""
+    chatdb = backends.get(_param(params, "backend"))
+    exported = chatdb.export_dataset(_param(params, "target"), _param(params, "path"))
+    if exported is None:
+        return 500, {"error": "Export failed; see the server output for details."}
+    return 200, {"path": exported}
+
+
+GET_ROUTES = {"/health": health, "/explore": explore, "/sample_queries": sample_queries,
+              "/stats": stats, "/checkpoint": checkpoint}
+POST_ROUTES = {"/query": query, "/explain": explain, "/approx": approx, "/upload": upload, "/export": export}
+
+
+class ChatDBHandler(BaseHTTPRequestHandler):
+    # GET takes query string parameters, POST a JSON object; every reply is a JSON object
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self._dispatch(GET_ROUTES, url.path, {k: v[-1] for k, v in parse_qs(url.query).items()})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._reply(400, {"error": f"Invalid JSON body: {e}"})
+            return
+        self._dispatch(POST_ROUTES, urlparse(self.path).path, params)
+
+    def _dispatch(self, routes, path, params):
+        route = routes.get(path)
+        if route is None:
+            self._reply(404, {"error": f"Unknown endpoint {self.command} {path}"})
+            return
+        try:
+            status, payload = route(self.server.backends, params)
+        except ValueError as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        self._reply(status, payload)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, default=str).encode()  # Decimal, dates and ObjectIds as strings
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ChatDB over a local HTTP API.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--preload", nargs="*", choices=batch.BACKENDS, default=[],
+                        help="backends to connect before accepting requests")
+    parser.add_argument("--sqlite-path", help="database file of the sqlite backend")
+    args = parser.parse_args()
+
+    backends = Backends(args.sqlite_path)
+    for name in args.preload:
+        backends.get(name)
+    try:
+        nlp_service.get_nlp()  # load spaCy now rather than on the first free-form question
+    except (ImportError, OSError) as e:
+        print(f"spaCy model not loaded ({e}); it will be loaded on first use.")
+
+    server = PooledHTTPServer((args.host, args.port), args.workers, backends)
+    print(f"ChatDB server listening on http://{args.host}:{args.port} ({args.workers} workers). Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        backends.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,75 @@ class DatabaseConfig:
     PASSWORD = 'sa53vu17'  # Your MySQL password
     DATABASE = 'chatDB'       # Name of your MySQL database
 
+    # Bulk upload settings
+    UPLOAD_BATCH_SIZE = 5000  # Rows per executemany batch (one transaction per batch)
+    LOCAL_INFILE = False      # Use LOAD DATA LOCAL INFILE (server must allow local_infile)
+
+    # Connection pool shared by every ChatDB operation
+    POOL_SIZE = 5             # Maximum open connections
+    POOL_TIMEOUT = 30         # Seconds to wait for a free connection
+    POOL_PING_INTERVAL = 30   # Idle seconds after which a connection is health-checked
+
+    # Query results are streamed from an unbuffered cursor and shown a page at a time
+    FETCH_BATCH_SIZE = 500    # Rows per fetchmany round trip
+    PAGE_SIZE = 20            # Rows printed per page; 'more' shows the next page
+    MAX_RESULT_ROWS = 1000    # Row cap per query, None for no cap
+
+    # Query templates run as server-side prepared statements with bound values
+    PREPARED_STATEMENTS = True
+    STATEMENT_CACHE_SIZE = 64  # Statements kept prepared per connection (LRU)
+
+    @staticmethod
+    def get_pool():  # shared, lazily created MySQL connection pool
+        from sqlpool import get_pool
+        return get_pool(DatabaseConfig)
+
+    @staticmethod
+    def get_statement_cache():  # shared prepared statement cache for the pool's connections
+        from sqlprepared import get_statement_cache
+        return get_statement_cache(DatabaseConfig)
+
+class SQLiteConfig:
+    # Embedded backend: one local database file, no server required
+    PATH = 'chatdb.sqlite'    # Database file (':memory:' for a throwaway in-memory database)
+    UPLOAD_BATCH_SIZE = 5000  # Rows per executemany batch (one transaction per batch)
+    CACHE_SIZE_KB = 65536     # Page cache size (PRAGMA cache_size)
+
+    STATEMENT_CACHE_SIZE = 128  # Compiled statements kept by the connection (sqlite3 cached_statements)
+
+    # Query results are read from the cursor and shown a page at a time
+    FETCH_BATCH_SIZE = 500    # Rows per fetchmany call
+    PAGE_SIZE = 20            # Rows printed per page; 'more' shows the next page
+    MAX_RESULT_ROWS = 1000    # Row cap per query, None for no cap
+
 class Config:
+    # Entries kept in the query generator's parse and SQL caches
+    PARSE_CACHE_SIZE = 512
+
+    # Executed query results; invalidated when a table is reloaded
+    RESULT_CACHE_SIZE = 256
+    RESULT_CACHE_TTL = 300  # seconds, None to keep results until evicted
+    RESULT_CACHE_PATH = None  # e.g. '.chatdb_cache/results.sqlite' to persist across restarts
+
+    # Rollup table ({table}__rollup) maintained at upload and used for eligible queries
+    BUILD_ROLLUPS = True
+    ROLLUP_KEY_LENGTH = 191  # longest group value kept in the rollup key (utf8mb4 key limit)
+
+    # Uniform sample ({table}__sample) rebuilt at upload and read by approximate queries (see approx.py)
+    SAMPLE_RATE = 0.01  # fraction of rows kept in the sample; None builds none and turns approximate queries off
+    APPROX_STEPS = [0.1, 0.3, 1.0]  # fractions of the sample read by each 'refine' step; the next one is exact
+    APPROX_CONFIDENCE = 0.95  # confidence level of the estimates' intervals
+
+    # Column appended rows are matched on: rows with a stored key are updated, the rest inserted.
+    # Normalized rows are matched on (source, key), so feeds with overlapping ids don't collide
+    UPSERT_KEY = "transaction_id"
+
+    # Uploads detect their feed from the header and are renamed & typed into the unified
+    # schema below, with a 'source' column naming the feed (see normalize.py). Off by default:
+    # every table then gets a source column (and on MySQL, partitions), and values of numeric
+    # and date columns that don't parse are loaded as NULL (the upload reports how many)
+    NORMALIZE_COLUMNS = False
+
     # Unified column mappings for datasets
     COLUMN_MAPPINGS = {
         "online_sales": {
@@ -57,6 +125,9 @@ class Config:
         "retail_sales": ["quantity", "price", "total_revenue"]
     }
 
+    # Numeric columns used in WHERE filters; indexed at upload time
+    NUMERIC_FILTERS = ["price", "quantity", "discount", "customer_age", "total_revenue"]
+
     VALID_GROUPS = {
         "online_sales": ["category", "location", "payment_method"],
         "customer_shopping": ["category", "location", "payment_method"],
@@ -0,0 +1,635 @@
+#sqlitemain.py
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from sqlconfig import Config, SQLiteConfig
+from sqlquery_generator import QueryGenerator, render
+from sqlschema import SchemaInferrer, to_records
+from ingest import StreamingIngest, rate, CHUNK_SIZE
+from columnar import is_dataset, rows_to_batches, sql_schema, write_parquet
+from normalize import match_key
+from cache import ResultCache
+from index_advisor import IndexAdvisor, index_name, print_index_status
+from results import ResultPager
+from metrics import Metrics, print_snapshot, row_bytes
+from explain import print_plan, summarize_sqlite_plan
+from approx import describe_estimates, estimate, is_sample, sample_name, sample_steps, SAMPLE_U
+from sqlsample_queries import SampleQueryGenerator
+
+# random() is a uniform 64-bit integer; this maps it onto [0, 1)
+_UNIFORM = "(random() / 18446744073709551616.0 + 0.5)"
+
+
+def _column_definition(schema, col):
+    # text columns use NOCASE collation, so grouping and filtering are case-insensitive like MySQL
+    collation = " COLLATE NOCASE" if schema.kind(col) in (None, "varchar") else ""
+    return f"{col} {schema.sqlite_type(col)}{collation}"
+
+
+class ChatDBSQLite:
+    """Embedded ChatDB backend on a local SQLite file; needs no database server.
+
+    Offers the same commands as ChatDB and runs the same SQL templates from
+    sqlquery_generator, against typed tables with secondary indexes.
+    """
+    def __init__(self, path=None):
+        self.path = path or SQLiteConfig.PATH
+        # One connection for the session; the lock serializes statements from other threads
+        self.conn = sqlite3.connect(self.path, check_same_thread=False,
+                                    cached_statements=SQLiteConfig.STATEMENT_CACHE_SIZE)
+        self.lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute(f"PRAGMA cache_size = -{SQLiteConfig.CACHE_SIZE_KB}")
+        self.metrics = Metrics()  # stage timings and row/byte counters, shown by the stats command
+        self.query_generator = QueryGenerator(self.metrics)
+        self.sample_query_generator = SampleQueryGenerator(
+            Config.VALID_METRICS["online_sales"], Config.VALID_GROUPS["online_sales"]
+        )
+        self.result_cache = ResultCache(
+            Config.RESULT_CACHE_SIZE, Config.RESULT_CACHE_TTL, Config.RESULT_CACHE_PATH
+        )
+        self.index_advisor = IndexAdvisor(
+            Config.VALID_GROUPS["online_sales"], Config.NUMERIC_FILTERS, group_uses_index=True
+        )
+        self.catalogs = {}  # table -> its column names, which query identifiers are checked against
+        self.selected_table = None
+        self.pager = None  # result of the last query, shown a page at a time
+        self.refinement = None  # (query, step) of the last approximate query, continued by refine
+
+    def upload_dataset(self, dataset_path, table_name, batch_size=None, resume=False, columns=None,
+                       append=False):
+        """Upload a dataset (CSV, Parquet or Arrow IPC file) into a table of the local database.
+
+        The file is streamed in ingest.CHUNK_SIZE row chunks and written in
+        batches of batch_size rows, one transaction per batch. SQLite stores
+        any value in any column, so columns widened by later chunks keep their
+        declared type and need no ALTER TABLE. Only the listed columns are
+        loaded when columns is given. With Config.NORMALIZE_COLUMNS, the
+        feed's columns are renamed and typed into the unified schema, with a
+        source column naming the feed (see normalize.py). With append, the
+        table is kept and rows are upserted on Config.UPSERT_KEY (see _append_chunks).
+        The table's sample ({table}__sample) is drawn once the rows are all in.
+        """
+        if not os.path.exists(dataset_path):
+            print(f"Error: The file at '{dataset_path}' does not exist.")
+            return None
+        if not is_dataset(dataset_path):
+            print("Error: Please provide a CSV, Parquet or Arrow file.")
+            return None
+        batch_size = batch_size or SQLiteConfig.UPLOAD_BATCH_SIZE
+
+        ingest = StreamingIngest(dataset_path, f"sqlite:{table_name}", resume=resume, metrics=self.metrics,
+                                 columns=columns, normalize=Config.NORMALIZE_COLUMNS)
+        try:
+            print(f"Reading the dataset from {dataset_path}...")
+            with self.metrics.stage("upload.total"), self.lock:
+                if append:
+                    inserted, updated, skipped = self._append_chunks(table_name, ingest, batch_size)
+                else:
+                    rows = self._insert_chunks(table_name, ingest, batch_size)
+            if append:
+                print(f"Dataset successfully appended to SQLite table '{table_name}' "
+                      f"({inserted} inserted, {updated} updated, {skipped} skipped).")
+            else:
+                print(f"Dataset successfully uploaded to SQLite as table '{table_name}' ({rows} rows).")
+            return table_name
+        except sqlite3.Error as e:
+            ingest.failed(f"Error uploading dataset: {e}")
+            return None
+        except Exception as e:
+            ingest.failed(f"Unexpected error: {e}")
+            return None
+        finally:
+            self.result_cache.invalidate("sqlite", table_name)
+            self.catalogs.pop(table_name, None)
+
+    def _create_table(self, table_name, schema):
+        """(Re)create a table with the inferred column types.
+
+        Text columns use NOCASE collation, so grouping and filtering are
+        case-insensitive like MySQL's default collation.
+        """
+        columns = [_column_definition(schema, col) for col in schema.columns]
+        print(f"Creating table '{table_name}' ({', '.join(columns)})...")
+        self.conn.execute(f"DROP TABLE IF EXISTS {sample_name(table_name)}")
+        self.conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+        self.conn.execute(f"CREATE TABLE {table_name} ({', '.join(columns)})")
+        self.conn.commit()
+
+    def _insert_chunks(self, table_name, ingest, batch_size):
+        """Stream chunks into the table, committing and checkpointing once per batch."""
+        schema = SchemaInferrer(ingest.state)
+        created = ingest.resumed
+        for chunk in ingest.chunks():
+            with self.metrics.stage("upload.prepare"):
+                schema.observe(chunk)
+                df = schema.coerce(chunk)
+            if not created:
+                self._create_table(table_name, schema)
+                created = True
+            placeholders = ", ".join(["?"] * len(df.columns))
+            sql = f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES ({placeholders})"
+            for start in range(0, len(df), batch_size):
+                batch = to_records(df.iloc[start:start + batch_size])
+                try:
+                    with self.metrics.stage("upload.write"):
+                        self.conn.executemany(sql, batch)
+                        self.conn.commit()
+                except sqlite3.Error:
+                    self.conn.rollback()
+                    raise
+                ingest.commit(len(batch), schema.columns)
+        rows = ingest.finish()
+
+        # Indexes are built after the load so inserts don't maintain them row by row
+        with self.metrics.stage("upload.index"):
+            self._create_indexes(table_name, self.index_advisor.propose(table_name, list(schema.columns)))
+        self._rebuild_sample(table_name)
+        return rows
+
+    def export_dataset(self, table, path):
+        """Export a table to a Parquet file for downstream jobs.
+
+        Rows are read CHUNK_SIZE at a time and written as one row group each,
+        typed from the declared column types (dates stay ISO text).
+        """
+        try:
+            columns = self._columns(table) if re.fullmatch(r"\w+", table or "") else []
+            if not columns:
+                raise ValueError(f"Table '{table}' doesn't exist")
+            schema = sql_schema(columns)
+            started = time.perf_counter()
+            with self.metrics.stage("export.total"):
+                rows = self._stream(f"SELECT * FROM {table}")
+                written = write_parquet(path, schema, rows_to_batches(rows, schema, CHUNK_SIZE))
+            self.metrics.count("export.rows", written)
+            print(f"Exported {written} rows of '{table}' to {path} ({rate(written, started)} rows/sec).")
+            return path
+        except Exception as e:
+            print(f"Error exporting '{table}': {e}")
+            return None
+
+    def _append_chunks(self, table_name, ingest, batch_size):
+        """Upsert chunks into a table keyed on Config.UPSERT_KEY; returns (inserted, updated, skipped).
+
+        Normalized rows are keyed on (source, Config.UPSERT_KEY). The table is
+        created if it doesn't exist yet, gets a unique index on the key, and
+        gains any columns new in the file. Rows missing a key value,
+        rows followed by a later row with the same key and rows identical to
+        the stored row are skipped. Existing indexes are kept and only
+        missing ones are built. The sample is kept current batch by batch
+        (see _resample_rows); a table without one gets it drawn once the rows are in.
+        """
+        key = Config.UPSERT_KEY
+        schema = SchemaInferrer(ingest.state)
+        stored_columns = [name for name, _ in self._columns(table_name)]
+        sampled = bool(Config.SAMPLE_RATE and stored_columns and self._columns(sample_name(table_name)))
+        counts = [0, 0, 0]
+        for chunk in ingest.chunks():
+            if key not in chunk.columns:
+                raise ValueError(f"Appending needs a '{key}' column to match rows on")
+            with self.metrics.stage("upload.prepare"):
+                schema.observe(chunk)
+                df = schema.coerce(chunk)
+            if not stored_columns:
+                self._create_table(table_name, schema)
+                self._rebuild_sample(table_name, draw=False)
+                sampled = bool(Config.SAMPLE_RATE)
+                stored_columns = list(schema.columns)
+            for col in df.columns:
+                if col not in stored_columns:
+                    print(f"\nAdding column {col} to '{table_name}'...")
+                    self.conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {_column_definition(schema, col)}")
+                    if sampled:
+                        self.conn.execute(f"ALTER TABLE {sample_name(table_name)} "
+                                          f"ADD COLUMN {_column_definition(schema, col)}")
+                    stored_columns.append(col)
+            keys = match_key(df.columns, key)
+            try:
+                self.conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name(table_name, keys, 'uq')} "
+                                  f"ON {table_name} ({', '.join(keys)})")
+            except sqlite3.IntegrityError:
+                raise ValueError(f"'{table_name}' already has rows with the same {', '.join(keys)}; "
+                                 "upload it again without appending first") from None
+            columns = list(df.columns)
+            others = [col for col in columns if col not in keys]
+            # rows whose values all match the stored row aren't written, so they don't count as changes
+            action = (f"DO UPDATE SET {', '.join(f'{col} = excluded.{col}' for col in others)} "
+                      f"WHERE {' OR '.join(f'{col} IS NOT excluded.{col}' for col in others)}"
+                      if others else "DO NOTHING")
+            sql = (f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))}) "
+                   f"ON CONFLICT ({', '.join(keys)}) {action}")
+            row_value = f"({', '.join(['?'] * len(keys))})"
+            for start in range(0, len(df), batch_size):
+                part = df.iloc[start:start + batch_size]
+                rows = part.dropna(subset=keys).drop_duplicates(subset=keys, keep="last")
+                values = [value for record in to_records(rows[keys]) for value in record]
+                rows_match = f"({', '.join(keys)}) IN (VALUES {', '.join([row_value] * len(rows))})"
+                try:
+                    with self.metrics.stage("upload.write", exclude=("upload.sample",)):
+                        existing = self.conn.execute(
+                            f"SELECT COUNT(*) FROM {table_name} WHERE {rows_match}", values).fetchone()[0] if values else 0
+                        before = self.conn.total_changes
+                        self.conn.executemany(sql, to_records(rows))
+                        changed = self.conn.total_changes - before
+                        if sampled and values:
+                            self._resample_rows(table_name, stored_columns, rows_match, values)
+                        self.conn.commit()
+                except sqlite3.Error:
+                    self.conn.rollback()
+                    raise
+                inserted = len(rows) - existing
+                counts[0] += inserted
+                counts[1] += changed - inserted
+                counts[2] += len(part) - changed
+                ingest.commit(len(part), schema.columns)
+        ingest.finish()
+        for name, count in zip(("upload.inserted", "upload.updated", "upload.skipped"), counts):
+            self.metrics.count(name, count)
+
+        with self.metrics.stage("upload.index"):
+            self._create_indexes(table_name, self.index_advisor.missing(
+                table_name, stored_columns, self._existing_indexes(table_name)))
+        if not sampled:
+            self._rebuild_sample(table_name)
+        return tuple(counts)
+
+    def _rebuild_sample(self, table_name, draw=True):
+        """Draw the table's uniform sample ({table}__sample) in one pass over the table.
+
+        Every row is kept with probability Config.SAMPLE_RATE and gets a
+        uniform SAMPLE_U in [0, SAMPLE_RATE), so the rows below any smaller
+        rate are a sample of that rate (see approx.py). The sample is created
+        from the table's own definition, which keeps its NOCASE collations.
+        Without draw, the sample is created empty, for a table that is empty too.
+        """
+        sample = sample_name(table_name)
+        with self.metrics.stage("upload.sample"):
+            self.conn.execute(f"DROP TABLE IF EXISTS {sample}")
+            if Config.SAMPLE_RATE:
+                definition = self.conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                               (table_name,)).fetchone()[0]
+                self.conn.execute(definition.replace(table_name, sample, 1))
+                self.conn.execute(f"ALTER TABLE {sample} ADD COLUMN {SAMPLE_U} REAL")
+                if draw:
+                    print(f"Drawing a {Config.SAMPLE_RATE:.2%} sample of '{table_name}'...")
+                    self.conn.execute(f"INSERT INTO {sample} SELECT {table_name}.*, {_UNIFORM} * ? FROM {table_name} "
+                                      f"WHERE {_UNIFORM} < ?", (Config.SAMPLE_RATE, Config.SAMPLE_RATE))
+                self.conn.execute(f"CREATE INDEX {index_name(sample, [SAMPLE_U])} ON {sample} ({SAMPLE_U})")
+            self.conn.commit()
+
+    def _resample_rows(self, table_name, columns, match, values):
+        """Replace the sample's copies of the rows matching a key condition by a fresh draw of their stored versions.
+
+        Appends keep the sample current this way, batch by batch, instead of
+        drawing it again from the whole table. Every matching row is drawn
+        anew, unchanged ones too, so each row still is in the sample
+        independently with probability Config.SAMPLE_RATE.
+        """
+        sample = sample_name(table_name)
+        with self.metrics.stage("upload.sample"):
+            self.conn.execute(f"DELETE FROM {sample} WHERE {match}", values)
+            self.conn.execute(f"INSERT INTO {sample} ({', '.join(columns)}, {SAMPLE_U}) "
+                              f"SELECT {', '.join(columns)}, {_UNIFORM} * ? FROM {table_name} "
+                              f"WHERE {match} AND {_UNIFORM} < ?", [Config.SAMPLE_RATE] + values + [Config.SAMPLE_RATE])
+
+    def _create_indexes(self, table_name, proposals):
+        """Create a secondary index for each proposed tuple of columns, then refresh planner statistics."""
+        for cols in proposals:
+            print(f"Creating index on {table_name} ({', '.join(cols)})...")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name(table_name, cols)} "
+                              f"ON {table_name} ({', '.join(cols)})")
+        self.conn.execute(f"ANALYZE {table_name}")
+        self.conn.commit()
+
+    def _columns(self, table):
+        # PRAGMA table_info rows: cid, name, type, notnull, default, pk
+        with self.lock:
+            return [(col[1], col[2]) for col in self.conn.execute(f"PRAGMA table_info({table})")]
+
+    def _existing_indexes(self, table):
+        """Map index name -> indexed columns, in index order."""
+        indexes = {}
+        with self.lock:
+            # PRAGMA index_list rows: seq, name, unique, origin, partial
+            for index in self.conn.execute(f"PRAGMA index_list({table})").fetchall():
+                info = self.conn.execute(f"PRAGMA index_info({index[1]})").fetchall()
+                indexes[index[1]] = [col[2] for col in sorted(info)]
+        return indexes
+
+    def build_indexes(self):
+        """Build the indexes the advisor proposes for the selected table that don't exist yet."""
+        if not self.selected_table:
+            print("Please explore and select a table first.")
+            return
+        try:
+            table = self.selected_table
+            columns = [name for name, _ in self._columns(table)]
+            missing = self.index_advisor.missing(table, columns, self._existing_indexes(table))
+            if not missing:
+                print(f"All proposed indexes on '{table}' already exist.")
+                return
+            with self.lock:
+                self._create_indexes(table, missing)
+            print(f"Built {len(missing)} indexes on '{table}'.")
+        except Exception as e:
+            print(f"Error building indexes: {e}")
+
+    def show_index_status(self):
+        """Show which query templates are served by an index on the selected table."""
+        if not self.selected_table:
+            print("Please explore and select a table first.")
+            return
+        try:
+            table = self.selected_table
+            columns = [name for name, _ in self._columns(table)]
+            print_index_status(self.index_advisor.status(table, columns, self._existing_indexes(table)))
+        except Exception as e:
+            print(f"Error reading indexes: {e}")
+
+    def explore_tables(self):
+        """Display available tables and allow user to select a table."""
+        try:
+            tables = self.list_datasets()
+            if not tables:
+                print("No tables found.")
+                return
+            print("\nAvailable Tables:")
+            for idx, table in enumerate(tables, 1):
+                print(f"{idx}. {table}")
+            while True:
+                try:
+                    selection = int(input("Enter the number of the table you want to explore: "))
+                    if selection < 1 or selection > len(tables):
+                        print(f"Please enter a number between 1 and {len(tables)}.")
+                    else:
+                        self.selected_table = tables[selection - 1]
+                        self.describe_table(self.selected_table)
+                        break
+                except ValueError:
+                    print("Invalid input. Please enter a valid number.")
+        except Exception as e:
+            print(f"Error fetching tables: {e}")
+
+    def list_datasets(self):
+        """Names of the tables holding datasets (SQLite's own sqlite_* tables and samples excluded)."""
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "AND name NOT LIKE 'sqlite_%' ORDER BY name") if not is_sample(row[0])]
+
+    def describe_dataset(self, table: str):
+        """(column, type) pairs and the first rows of a table."""
+        with self.lock:
+            data = self.conn.execute(f"SELECT * FROM {table} LIMIT 5").fetchall()
+        return self._columns(table), data
+
+    def describe_table(self, table: str):
+        """Display table schema and sample data."""
+        schema, data = self.describe_dataset(table)
+        print(f"\n### {table.upper()} ###")
+        print("Schema:")
+        for name, sqlite_type in schema:
+            print(f"- {name} ({sqlite_type})")
+        if data:
+            print("\nSample Data:")
+            for row in data:
+                print(row)
+
+    def show_sample_queries(self):
+        """Generate and display sample queries for the selected table."""
+        queries = self.sample_query_generator.generate_sample_queries(5)
+        print("\nSample Queries:")
+        for idx, query in enumerate(queries, start=1):
+            print(f"{idx}. {query}")
+
+    def process_query(self, query: str, explain=False, approx=False):
+        """Parse and execute a natural language query.
+
+        With explain, the query plan of the generated SQL is summarized before the results.
+        With approx, the answer is estimated from the smallest step of the
+        table's sample instead; refine() continues with the next step.
+        """
+        with self.metrics.stage("query.total"):
+            if approx:
+                self._process_approx(query, 0)
+            else:
+                self._process_query(query, explain)
+
+    def refine(self):
+        """Refine the last approximate answer from a larger sample, or run it exactly after the last step."""
+        if self.refinement is None:
+            print("No approximate query to refine; run one with approx first.")
+            return
+        query, step = self.refinement
+        with self.metrics.stage("query.total"):
+            self._process_approx(query, step + 1)
+
+    def _process_approx(self, query: str, step):
+        self.refinement = None
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            print("Query not recognized.")
+            return
+        try:
+            result = self._estimate(query_type, params, self.selected_table, step)
+            if result is None:  # every step was shown
+                print("\nExact result:")
+                self._process_query(query)
+                return
+            sql, rows, rate = result
+            print("\nExecuting SQL (on the sample):")
+            print(sql)
+            if self.pager:
+                self.pager.close()
+            self.pager = ResultPager(rows, SQLiteConfig.PAGE_SIZE, SQLiteConfig.MAX_RESULT_ROWS)
+            print(f"\nResults ({describe_estimates(rate, Config.APPROX_CONFIDENCE)}):")
+            self._print_page()
+            self.refinement = (query, step)
+            print("Type 'refine' for a more precise answer.")
+        except Exception as e:
+            print(f"Error executing query: {e}")
+
+    def _process_query(self, query: str, explain=False):
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            print("Query not recognized.")
+            return
+        try:
+            statement, args = self._statement(query_type, params, self.selected_table)
+            sql = render(statement, args)
+            print("\nExecuting SQL:")
+            print(sql)
+            if explain:
+                print_plan(self._explain(statement, args))
+            rows = self.result_cache.get("sqlite", self.selected_table, sql)
+            if self.pager:
+                self.pager.close()
+            if rows is None:
+                table = self.selected_table
+                self.pager = ResultPager(
+                    self._stream(statement, args), SQLiteConfig.PAGE_SIZE, SQLiteConfig.MAX_RESULT_ROWS,
+                    on_complete=lambda rows: self.result_cache.put("sqlite", table, sql, rows)
+                )
+            else:
+                print("(cached result)")
+                self.pager = ResultPager(rows, SQLiteConfig.PAGE_SIZE, SQLiteConfig.MAX_RESULT_ROWS)
+            print("\nResults:")
+            self._print_page()
+        except Exception as e:
+            print(f"Error executing query: {e}")
+
+    def execute(self, query: str, table: str = None):
+        """Run a natural language query and return (SQL, all result rows) without printing.
+
+        Returns None if the query isn't recognized. Results are neither paged
+        nor cached, which makes this the entry point for batch runs and benchmarks.
+        """
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            return None
+        return self.execute_parsed(query_type, params, table)
+
+    def execute_parsed(self, query_type, params, table: str = None):
+        """Run an already parsed query and return (SQL, all result rows)."""
+        table = table or self.selected_table
+        statement, args = self._statement(query_type, params, table)
+        with self.lock, self.metrics.stage("query.execute"):
+            rows = self.conn.execute(statement, args).fetchall()
+        self.metrics.count("query.rows", len(rows))
+        self.metrics.count("query.bytes", row_bytes(rows))
+        return render(statement, args), rows
+
+    def stream(self, query: str, table: str = None):
+        """Run a natural language query and return (SQL, iterator over its rows), or None if it isn't recognized.
+
+        Rows are fetched as the iterator is read; close it to stop early.
+        """
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            return None
+        statement, args = self._statement(query_type, params, table or self.selected_table)
+        return render(statement, args), self._stream(statement, args)
+
+    def estimate(self, query: str, table: str = None, step=0):
+        """Run a natural language query on step of the table's sample; returns (SQL, estimates, rate).
+
+        Estimates are (group, estimate, low, high) rows (see approx.estimate).
+        Returns None once step is past the last of Config.APPROX_STEPS, when
+        only the exact answer is left, and raises ValueError if the query
+        isn't recognized.
+        """
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            raise ValueError("Query not recognized.")
+        return self._estimate(query_type, params, table or self.selected_table, step)
+
+    def _estimate(self, query_type, params, table, step):
+        if not Config.SAMPLE_RATE:
+            raise ValueError("Approximate queries are off (Config.SAMPLE_RATE is None)")
+        rates = sample_steps(Config.SAMPLE_RATE, Config.APPROX_STEPS)
+        if step >= len(rates):
+            return None
+        # checks the table and its columns; the statement itself runs on the sample
+        self._statement(query_type, params, table)
+        with self.metrics.stage("query.generate"):
+            statement, args = self.query_generator.generate_sample_statement(query_type, params, table, rates[step])
+        try:
+            rows = list(self._stream(statement, args))
+        except sqlite3.OperationalError:
+            raise ValueError(f"Table '{table}' has no sample; upload it again to draw one") from None
+        return (render(statement, args),
+                estimate(query_type, params["groups"], rows, rates[step], Config.APPROX_CONFIDENCE), rates[step])
+
+    def explain(self, query: str, table: str = None):
+        """Plan summary (see explain.py) of a natural language query, or None if it isn't recognized."""
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            return None
+        return self._explain(*self._statement(query_type, params, table or self.selected_table))
+
+    def _explain(self, statement, args):
+        """Summarize the access paths of EXPLAIN QUERY PLAN; SQLite doesn't count rows examined."""
+        with self.lock, self.metrics.stage("query.explain"):
+            rows = self.conn.execute(f"EXPLAIN QUERY PLAN {statement}", args).fetchall()
+        summary = summarize_sqlite_plan(render(statement, args), rows)
+        self.metrics.record_plan(summary)
+        return summary
+
+    def _statement(self, query_type, params, table):
+        """(SQL with ? placeholders, values to bind) for a parsed query, its columns checked first."""
+        self.index_advisor.record(table, query_type, params["groups"])
+        with self.metrics.stage("query.generate"):
+            if table not in self.catalogs:
+                columns = [name for name, _ in self._columns(table)] if table and re.fullmatch(r"\w+", table) else []
+                if not columns:
+                    raise ValueError(f"Table '{table}' doesn't exist")
+                self.catalogs[table] = columns
+            self.query_generator.check_identifiers(query_type, params, table, self.catalogs[table])
+            # values are bound, so sqlite3's statement cache reuses one compiled statement per template
+            return self.query_generator.generate_statement(query_type, params, table)
+
+    def show_more(self):
+        """Print the next page of the last query's results."""
+        try:
+            if self.pager is None or not self.pager.has_more():
+                print("No more results.")
+                return
+            self._print_page()
+        except Exception as e:
+            print(f"Error fetching results: {e}")
+
+    def _print_page(self):
+        # rows are streamed while the page prints, so the statement and its fetches are timed apart
+        with self.metrics.stage("query.print", exclude=("query.execute", "query.fetch")):
+            try:
+                self.pager.print_page()
+            except Exception:
+                # a stream that failed partway can't be paged further, and isn't cached (see ResultPager)
+                self.pager.close()
+                self.pager = None
+                raise
+
+    def stats(self):
+        """Metrics snapshot and cache statistics of this session."""
+        caches = {f"{name} cache": stats for name, stats in self.query_generator.cache_stats().items()}
+        caches["result cache"] = self.result_cache.stats()
+        return self.metrics.snapshot(), caches
+
+    def show_stats(self):
+        """Print stage timings, row and byte counters and cache hit rates of this session."""
+        print_snapshot(*self.stats())
+
+    def export_stats(self, path=None):
+        """Write the session's metrics to a file (metrics.METRICS_PATH by default)."""
+        try:
+            print(f"Metrics written to {self.metrics.export(path, {'backend': 'sqlite'})}.")
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+    def _stream(self, statement, args=()):
+        """Yield result rows from a cursor, fetchmany batch at a time."""
+        with self.lock, self.metrics.stage("query.execute"):
+            cursor = self.conn.execute(statement, args)
+        try:
+            while True:
+                with self.lock, self.metrics.stage("query.fetch"):
+                    rows = cursor.fetchmany(SQLiteConfig.FETCH_BATCH_SIZE)
+                if not rows:
+                    break
+                self.metrics.count("query.rows", len(rows))
+                self.metrics.count("query.bytes", row_bytes(rows))
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+
+    def close(self):
+        """Close the database file."""
+        if self.pager:
+            self.pager.close()
+        self.conn.close()
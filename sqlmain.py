@@ -1,96 +1,604 @@
 #sqlmain.py
 
+import re
+import time
+import pandas as pd
 import pymysql
-import pandas as pd  # Importing pandas
-import mysql.connector  # Importing mysql.connector
+import pymysql.cursors
 from sqlconfig import Config, DatabaseConfig
-from sqlquery_generator import QueryGenerator
+from sqlquery_generator import QueryGenerator, render
+from sqlschema import SchemaInferrer, key_bytes, to_records, INDEX_KEY_BYTES
+from ingest import StreamingIngest, rate, read_header, CHUNK_SIZE
+from columnar import is_columnar, is_dataset, rows_to_batches, sql_schema, write_parquet
+from normalize import CANONICAL, SOURCE_COLUMN, SOURCES, match_key
+from cache import ResultCache
+from index_advisor import IndexAdvisor, index_name, print_index_status
+from results import ResultPager
+from metrics import Metrics, print_snapshot, row_bytes
+from explain import print_plan, summarize_mysql_analyze, summarize_mysql_explain
+from rollup import Rollup, rollup_name, is_rollup, DAY, ROW_COUNT, STATS
+from approx import describe_estimates, estimate, is_sample, sample_name, sample_steps, SAMPLE_U
 from sqlsample_queries import SampleQueryGenerator
 import os
 
+
 class ChatDB:
     def __init__(self):
-        # Connect to MySQL database
-        self.connection = pymysql.connect(
-            host=DatabaseConfig.HOST,
-            user=DatabaseConfig.USER,
-            password=DatabaseConfig.PASSWORD,
-            database=DatabaseConfig.DATABASE
-        )
-        self.cursor = self.connection.cursor()
-        self.query_generator = QueryGenerator()
+        # Every operation checks a connection out of the shared MySQL pool
+        self.pool = DatabaseConfig.get_pool()
+        # prepared statements of the pool's connections, None to send every query as text
+        self.statements = DatabaseConfig.get_statement_cache() if DatabaseConfig.PREPARED_STATEMENTS else None
+        self.metrics = Metrics()  # stage timings and row/byte counters, shown by the stats command
+        self.query_generator = QueryGenerator(self.metrics)
         self.sample_query_generator = SampleQueryGenerator(
             Config.VALID_METRICS["online_sales"], Config.VALID_GROUPS["online_sales"]
         )
+        self.result_cache = ResultCache(
+            Config.RESULT_CACHE_SIZE, Config.RESULT_CACHE_TTL, Config.RESULT_CACHE_PATH
+        )
+        self.index_advisor = IndexAdvisor(
+            Config.VALID_GROUPS["online_sales"], Config.NUMERIC_FILTERS, group_uses_index=True
+        )
+        self.rollups = {}  # table -> Rollup of its rollup table, or None if it has none
+        self.catalogs = {}  # table -> its column names, which query identifiers are checked against
         self.selected_table = None
+        self.pager = None  # result of the last query, shown a page at a time
+        self.refinement = None  # (query, step) of the last approximate query, continued by refine
 
-    def upload_dataset(self, dataset_path, table_name):
-        """Upload a dataset to MySQL."""
+    def upload_dataset(self, dataset_path, table_name, batch_size=None, use_load_data=None,
+                       resume=False, columns=None, append=False):
+        """Upload a dataset (CSV, Parquet or Arrow IPC file) to MySQL.
+
+        The file is streamed in ingest.CHUNK_SIZE row chunks, so memory is
+        bounded by the chunk size rather than the file size. Rows are written
+        over a pooled connection with batched multi-row inserts (one
+        transaction per batch), or with LOAD DATA LOCAL INFILE when
+        use_load_data is set and the whole of a CSV file is loaded. With
+        resume, an upload that failed part way continues from its last
+        committed batch instead of starting over. Only the listed columns
+        are loaded when columns is given.
+        With Config.NORMALIZE_COLUMNS, the feed's columns are renamed and
+        typed into the unified schema and the table is partitioned by feed
+        (see normalize.py), so every feed can share one table.
+        With append, the table is kept and rows are upserted on
+        Config.UPSERT_KEY instead (see _append_chunks).
+        The table's rollup ({table}__rollup) is built alongside the rows,
+        and its sample ({table}__sample) once they are all in.
+        """
         if not os.path.exists(dataset_path):
             print(f"Error: The file at '{dataset_path}' does not exist.")
             return None
-        if not dataset_path.endswith('.csv'):
-            print("Error: Please provide a valid CSV file.")
+        if not is_dataset(dataset_path):
+            print("Error: Please provide a CSV, Parquet or Arrow file.")
             return None
+        batch_size = batch_size or DatabaseConfig.UPLOAD_BATCH_SIZE
+        if use_load_data is None:
+            use_load_data = DatabaseConfig.LOCAL_INFILE
+        # LOAD DATA reads CSV text and every column of it
+        use_load_data = use_load_data and not columns and not append and not is_columnar(dataset_path)
 
+        ingest = StreamingIngest(dataset_path, f"mysql:{table_name}", resume=resume and not use_load_data,
+                                 metrics=self.metrics, columns=columns, normalize=Config.NORMALIZE_COLUMNS)
         try:
             print(f"Reading the dataset from {dataset_path}...")
-            df = pd.read_csv(dataset_path)
-            print(f"Dataset has {len(df)} rows and {len(df.columns)} columns.")
-
-            # Establish the database connection
-            connection = mysql.connector.connect(
-                host=DatabaseConfig.HOST,
-                user=DatabaseConfig.USER,
-                password=DatabaseConfig.PASSWORD,
-                database=DatabaseConfig.DATABASE
-            )
-
-            if connection.is_connected():
-                print("Successfully connected to the MySQL database.")
-                cursor = connection.cursor()
-
-                # Dynamically create the table based on the DataFrame
-                print(f"Creating table '{table_name}'...")
-                cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-                columns = ", ".join([f"{col} TEXT" for col in df.columns])
-                cursor.execute(f"CREATE TABLE {table_name} ({columns})")
-
-                # Insert data into the newly created table
-                print("Inserting data into the table...")
-                for _, row in df.iterrows():
-                    # Escape single quotes by replacing them with double single quotes
-                    values = ", ".join(["'{}'".format(str(value).replace("'", "''")) for value in row.values])
-                    cursor.execute(f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES ({values})")
-
-                connection.commit()
-                print(f"Dataset successfully uploaded to MySQL as table '{table_name}'.")
-
-                return table_name  # Return the table name
+            # LOAD DATA maps the file's columns to the table's as they are, so feeds that are renamed don't qualify
+            use_load_data = use_load_data and (not ingest.normalizer or ingest.normalizer.layout == CANONICAL)
+            with self.metrics.stage("upload.total"), self.pool.connection() as conn:
+                if append:
+                    inserted, updated, skipped = self._append_chunks(conn, table_name, ingest, batch_size)
+                elif use_load_data:
+                    rows = self._load_data_infile(conn, dataset_path, table_name, ingest)
+                else:
+                    rows = self._insert_chunks(conn, table_name, ingest, batch_size)
+            if append:
+                print(f"Dataset successfully appended to MySQL table '{table_name}' "
+                      f"({inserted} inserted, {updated} updated, {skipped} skipped).")
             else:
-                print("Failed to connect to MySQL.")
-                return None
-        except mysql.connector.Error as e:
-            print(f"Error uploading dataset: {e}")
+                print(f"Dataset successfully uploaded to MySQL as table '{table_name}' ({rows} rows).")
+            return table_name  # Return the table name
+        except pymysql.MySQLError as e:
+            ingest.failed(f"Error uploading dataset: {e}")
             return None
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            ingest.failed(f"Unexpected error: {e}")
             return None
         finally:
-            if 'connection' in locals() and connection.is_connected():
-                connection.close()
-                print("MySQL connection closed.")
+            # the table was reloaded or appended to, so earlier results no longer apply
+            self.result_cache.invalidate("mysql", table_name)
+            self.rollups.pop(table_name, None)
+            self.catalogs.pop(table_name, None)
+
+    def _create_table(self, conn, table_name, schema):
+        """(Re)create a table with the inferred column types.
+
+        A table with a source column is list-partitioned by it, one
+        partition per feed, so a query or delete filtered on the feed only
+        touches that feed's rows.
+        """
+        partitions = ""
+        if SOURCE_COLUMN in schema.columns:
+            # sized for every feed name up front: a partitioning column is never widened later
+            schema.observe(pd.DataFrame({SOURCE_COLUMN: SOURCES}))
+            partitions = f" PARTITION BY LIST COLUMNS ({SOURCE_COLUMN}) (" + ", ".join(
+                f"PARTITION p_{source} VALUES IN ('{source}')" for source in SOURCES) + ")"
+        print(f"Creating table '{table_name}' ({schema.column_definitions()})...")
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {rollup_name(table_name)}")
+            cursor.execute(f"DROP TABLE IF EXISTS {sample_name(table_name)}")
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            cursor.execute(schema.create_table_sql(table_name) + partitions)
+
+    def _insert_chunks(self, conn, table_name, ingest, batch_size):
+        """Stream chunks into the table, widening column types as later chunks require."""
+        schema = SchemaInferrer(ingest.state)
+        created = ingest.resumed
+        rollup = None  # a resumed upload rebuilds the rollup once all rows are in
+        for chunk in ingest.chunks():
+            with self.metrics.stage("upload.prepare"):
+                widened = schema.observe(chunk)
+                df = schema.coerce(chunk)
+            if not created:
+                self._create_table(conn, table_name, schema)
+                rollup = self._rollup_for(schema)
+                if rollup:
+                    self._create_rollup_table(conn, table_name, rollup)
+                created = True
+            elif widened:
+                rollup = self._alter_columns(conn, table_name, schema, [], widened, rollup)
+            # the checkpoint advances with every committed batch so a resume never re-inserts rows
+            self._insert_batches(conn, df, table_name, batch_size,
+                                 on_commit=lambda rows: ingest.commit(rows, schema.columns), rollup=rollup)
+        rows = ingest.finish()
+        if ingest.resumed:
+            self._rebuild_rollup(conn, table_name, schema)
+
+        # Indexes are built after the load so inserts don't maintain them row by row
+        with self.metrics.stage("upload.index"):
+            self._create_indexes(conn, table_name, self.index_advisor.propose(table_name, schema.indexable_columns()))
+        self._rebuild_sample(conn, table_name)
+        return rows
+
+    def _alter_columns(self, conn, table_name, schema, added, widened, rollup):
+        """Add new columns and widen existing ones; returns the rollup, or None if it had to be dropped."""
+        changes = ", ".join([f"ADD COLUMN {col} {schema.sql_type(col)}" for col in added]
+                            + [f"MODIFY {col} {schema.sql_type(col)}" for col in widened])
+        print(f"\nAltering columns of '{table_name}': {changes}")
+        with conn.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {table_name} {changes}")
+            if self._table_columns(conn, sample_name(table_name)):
+                cursor.execute(f"ALTER TABLE {sample_name(table_name)} {changes}")
+            if rollup and not self._rollup_fits(schema, rollup):
+                print(f"Dropping the rollup of '{table_name}': its columns no longer fit the rollup types")
+                cursor.execute(f"DROP TABLE {rollup_name(table_name)}")
+                rollup = None
+        return rollup
+
+    def _append_chunks(self, conn, table_name, ingest, batch_size):
+        """Upsert chunks into a table keyed on Config.UPSERT_KEY; returns (inserted, updated, skipped).
+
+        Normalized rows are keyed on (source, Config.UPSERT_KEY), which also
+        satisfies MySQL's rule that a partitioned table's unique keys include
+        the partitioning column. The table is created if it doesn't exist
+        yet, and gets a unique index on the key if it has none. Columns new
+        to the table are added and columns are widened as the appended data requires. Indexes are kept
+        (and maintained by the inserts) and the rollup is updated in every
+        batch's transaction, so nothing is rebuilt from the whole table
+        unless the file lacks columns the rollup is made of. The sample is
+        kept current the same way (see _resample_rows); a table without one
+        gets it drawn once the rows are in.
+        """
+        key = Config.UPSERT_KEY
+        existing = self._table_columns(conn, table_name)
+        sampled = bool(Config.SAMPLE_RATE and existing and self._table_columns(conn, sample_name(table_name)))
+        schema = SchemaInferrer(ingest.state or SchemaInferrer.from_sql_types(existing).columns)
+        rollup = self._rollup(table_name) if existing else None
+        if rollup:  # the stored definition doesn't say which column the days come from
+            rollup = Rollup(rollup.dimensions, rollup.measures, _rollup_date_column(schema))
+        created = bool(existing)
+        keyed = False
+        rebuild = False  # the rollup is rebuilt from the table after the load instead of updated per batch
+        counts = [0, 0, 0]
+        for chunk in ingest.chunks():
+            if key not in chunk.columns:
+                raise ValueError(f"Appending needs a '{key}' column to match rows on")
+            with self.metrics.stage("upload.prepare"):
+                added = [col for col in chunk.columns if col not in schema.columns]
+                widened = schema.observe(chunk)
+                df = schema.coerce(chunk)
+            if not created:
+                self._create_table(conn, table_name, schema)
+                rollup = self._rollup_for(schema)
+                if rollup:
+                    self._create_rollup_table(conn, table_name, rollup)
+                self._rebuild_sample(conn, table_name, draw=False)
+                sampled = bool(Config.SAMPLE_RATE)
+                created = True
+            elif added or widened:
+                rollup = self._alter_columns(conn, table_name, schema, added, widened, rollup)
+            keys = match_key(df.columns, key)
+            if not keyed:
+                self._add_unique_key(conn, table_name, keys)
+                keyed = True
+            needed = rollup.dimensions + rollup.measures + [rollup.date_column] if rollup else []
+            if rollup and not set(needed) - {None} <= set(df.columns):
+                # updated rows keep their stored values in the missing columns, which this batch can't see
+                rollup, rebuild = None, True
+            batch_counts = self._upsert_batches(conn, df, table_name, keys, batch_size,
+                                                on_commit=lambda rows: ingest.commit(rows, schema.columns),
+                                                rollup=rollup, sample_columns=list(schema.columns) if sampled else None)
+            counts = [total + n for total, n in zip(counts, batch_counts)]
+        ingest.finish()
+        if rebuild:
+            self._rebuild_rollup(conn, table_name, schema)
+        for name, count in zip(("upload.inserted", "upload.updated", "upload.skipped"), counts):
+            self.metrics.count(name, count)
+
+        # Only indexes the table doesn't have yet are built
+        with self.metrics.stage("upload.index"):
+            self._create_indexes(conn, table_name, self.index_advisor.missing(
+                table_name, schema.indexable_columns(), self._existing_indexes(table_name)))
+        if not sampled:
+            self._rebuild_sample(conn, table_name)
+        return tuple(counts)
+
+    def _table_columns(self, conn, table_name):
+        """(column, type) pairs of a table, or [] if it doesn't exist."""
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS "
+                           "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+                           (table_name,))
+            return list(cursor.fetchall())
+
+    def _add_unique_key(self, conn, table_name, keys):
+        """Create the unique index upserts match rows on, unless the table has one on keys already."""
+        with conn.cursor() as cursor:
+            cursor.execute(f"SHOW INDEX FROM {table_name}")
+            unique = {}
+            # SHOW INDEX rows: Table, Non_unique, Key_name, Seq_in_index, Column_name, ...
+            for row in cursor.fetchall():
+                if not row[1]:
+                    unique.setdefault(row[2], []).append(row[4])
+            if keys in unique.values():
+                return
+            print(f"Creating unique index on {table_name} ({', '.join(keys)})...")
+            try:
+                cursor.execute(f"CREATE UNIQUE INDEX {index_name(table_name, keys, 'uq')} "
+                               f"ON {table_name} ({', '.join(keys)})")
+            except pymysql.err.IntegrityError:
+                raise ValueError(f"'{table_name}' already has rows with the same {', '.join(keys)}; "
+                                 "upload it again without appending first") from None
+
+    def _upsert_batches(self, conn, df, table_name, keys, batch_size, on_commit=None, rollup=None,
+                        sample_columns=None):
+        """Upsert DataFrame rows with executemany, committing once per batch; returns (inserted, updated, skipped).
+
+        Rows missing a key value, rows followed by a later row with the same
+        key and rows identical to the stored row are skipped. With a rollup,
+        the stored versions of the batch's rows are read (and locked) first,
+        so their cells can be replaced by the new versions' in the same transaction.
+        With sample_columns (the table's columns), the batch's rows are drawn
+        into the table's sample again in that transaction too.
+        """
+        columns = list(df.columns)
+        updates = [f"{col} = VALUES({col})" for col in columns if col not in keys] or [f"{keys[0]} = {keys[0]}"]
+        sql = (f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+               f"ON DUPLICATE KEY UPDATE {', '.join(updates)}")
+        row_value = f"({', '.join(['%s'] * len(keys))})"
+        stored_columns = keys + (rollup.dimensions + rollup.measures if rollup else [])
+        if rollup and rollup.date_column:
+            stored_columns.append(rollup.date_column)
+
+        counts = [0, 0, 0]
+        for start in range(0, len(df), batch_size):
+            part = df.iloc[start:start + batch_size]
+            rows = part.dropna(subset=keys).drop_duplicates(subset=keys, keep="last")
+            values = [value for record in to_records(rows[keys]) for value in record]
+            stored, affected = pd.DataFrame(columns=stored_columns), 0
+            try:
+                with self.metrics.stage("upload.write", exclude=("upload.rollup", "upload.sample")):
+                    conn.begin()
+                    with conn.cursor() as cursor:
+                        match = f"({', '.join(keys)}) IN ({', '.join([row_value] * len(rows))})"
+                        if values:
+                            cursor.execute(f"SELECT {', '.join(stored_columns)} FROM {table_name} "
+                                           f"WHERE {match} FOR UPDATE", values)
+                            stored = pd.DataFrame(list(cursor.fetchall()), columns=stored_columns)
+                            # affected rows: 1 per inserted row, 2 per updated row, 0 per unchanged row
+                            affected = cursor.executemany(sql, to_records(rows))
+                        if rollup and values:
+                            with self.metrics.stage("upload.rollup"):
+                                self._merge_rollup(cursor, table_name, rollup, rows, removed=stored)
+                        if sample_columns and values:
+                            self._resample_rows(cursor, table_name, sample_columns, match, values)
+                    conn.commit()
+            except pymysql.MySQLError:
+                conn.rollback()
+                raise
+            inserted = len(rows) - len(stored)
+            updated = (affected - inserted) // 2
+            counts[0] += inserted
+            counts[1] += updated
+            counts[2] += len(part) - inserted - updated
+            if on_commit:
+                on_commit(len(part))
+        return counts
+
+    def _insert_batches(self, conn, df, table_name, batch_size, on_commit=None, rollup=None):
+        """Insert DataFrame rows with executemany, committing once per batch.
+
+        With a rollup, the cells of each batch are merged into the rollup
+        table in the batch's transaction, so it always matches the committed rows.
+        """
+        placeholders = ", ".join(["%s"] * len(df.columns))
+        sql = f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES ({placeholders})"
+
+        inserted = 0
+        for start in range(0, len(df), batch_size):
+            part = df.iloc[start:start + batch_size]
+            batch = to_records(part)
+            try:
+                with self.metrics.stage("upload.write", exclude=("upload.rollup",)):
+                    conn.begin()
+                    with conn.cursor() as cursor:
+                        cursor.executemany(sql, batch)
+                        if rollup:
+                            with self.metrics.stage("upload.rollup"):
+                                self._merge_rollup(cursor, table_name, rollup, part)
+                    conn.commit()
+            except pymysql.MySQLError:
+                conn.rollback()
+                raise
+            inserted += len(batch)
+            if on_commit:
+                on_commit(len(batch))
+        return inserted
+
+    def _load_data_infile(self, conn, dataset_path, table_name, ingest):
+        """Bulk-load a CSV file server-side with LOAD DATA LOCAL INFILE.
+
+        The file is scanned once in chunks to infer the schema, then loaded
+        in a single statement. Values are loaded as written in the file, so
+        DATE/DATETIME columns expect ISO formatted values. Empty fields are
+        loaded as NULL. Normalized rows get their feed as a constant.
+        """
+        schema = SchemaInferrer()
+        for chunk in ingest.chunks():
+            with self.metrics.stage("upload.prepare"):
+                schema.observe(chunk)
+        self._create_table(conn, table_name, schema)
+        # the source column is added by the normalizer unless the file has one
+        source = ingest.normalizer and SOURCE_COLUMN not in read_header(dataset_path)
+        columns = [col for col in schema.columns if not (source and col == SOURCE_COLUMN)]
+
+        print("Loading data with LOAD DATA LOCAL INFILE...")
+        with open(dataset_path, "rb") as f:
+            line_end = "\\r\\n" if f.readline().endswith(b"\r\n") else "\\n"
+        variables = ", ".join(f"@v{i}" for i in range(len(columns)))
+        assignments = ", ".join(f"{col} = NULLIF(@v{i}, '')" for i, col in enumerate(columns))
+        if source:
+            assignments += f", {SOURCE_COLUMN} = '{ingest.normalizer.layout}'"
+        sql = (f"LOAD DATA LOCAL INFILE %s INTO TABLE {table_name} "
+               "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+               f"LINES TERMINATED BY '{line_end}' IGNORE 1 LINES "
+               f"({variables}) SET {assignments}")
+        started = time.perf_counter()
+        with self.metrics.stage("upload.write"), conn.cursor() as cursor:
+            rows = cursor.execute(sql, (os.path.abspath(dataset_path),))
+        self.metrics.count("upload.rows", rows)
+        print(f"Loaded {rows} rows ({rate(rows, started)} rows/sec)")
+        self._rebuild_rollup(conn, table_name, schema)
+
+        with self.metrics.stage("upload.index"):
+            self._create_indexes(conn, table_name, self.index_advisor.propose(table_name, schema.indexable_columns()))
+        self._rebuild_sample(conn, table_name)
+        return rows
+
+    def export_dataset(self, table, path):
+        """Export a table to a Parquet file for downstream jobs.
+
+        Rows are streamed from a server-side cursor and written CHUNK_SIZE
+        rows per row group, with column types taken from the table definition.
+        """
+        try:
+            self._catalog(table)  # checks the table name
+            schema = sql_schema([(col[0], col[1]) for col in self.pool.fetchall(f"DESCRIBE {table}")])
+            started = time.perf_counter()
+            with self.metrics.stage("export.total"):
+                rows = self._stream(f"SELECT * FROM {table}")
+                written = write_parquet(path, schema, rows_to_batches(rows, schema, CHUNK_SIZE))
+            self.metrics.count("export.rows", written)
+            print(f"Exported {written} rows of '{table}' to {path} ({rate(written, started)} rows/sec).")
+            return path
+        except Exception as e:
+            print(f"Error exporting '{table}': {e}")
+            return None
+
+    def _rollup_for(self, schema):
+        """Rollup definition for a table with the given schema, or None if nothing can be rolled up."""
+        if not Config.BUILD_ROLLUPS:
+            return None
+        dimensions = [col for col in Config.VALID_GROUPS["online_sales"] if _rollup_dimension(schema, col)]
+        measures = [col for col in Config.VALID_METRICS["online_sales"] if _rollup_measure(schema, col)]
+        return Rollup(dimensions, measures, _rollup_date_column(schema)) if dimensions else None
+
+    def _rollup_fits(self, schema, rollup):
+        """Whether the rollup columns still hold every value after the schema was widened."""
+        return (all(_rollup_dimension(schema, col) for col in rollup.dimensions)
+                and all(_rollup_measure(schema, col) for col in rollup.measures))
+
+    def _create_rollup_table(self, conn, table_name, rollup):
+        """(Re)create the rollup table, keyed on (dimensions, day)."""
+        columns = [f"{dim} VARCHAR({Config.ROLLUP_KEY_LENGTH}) NOT NULL" for dim in rollup.dimensions]
+        columns += [f"{DAY} CHAR(10) NOT NULL", f"{ROW_COUNT} BIGINT NOT NULL"]
+        for m in rollup.measures:
+            columns += [f"{m}_sum DECIMAL(38, 6)", f"{m}_count BIGINT NOT NULL",
+                        f"{m}_min DECIMAL(38, 6)", f"{m}_max DECIMAL(38, 6)"]
+        columns.append(f"PRIMARY KEY ({', '.join(rollup.key)})")
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {rollup_name(table_name)}")
+            cursor.execute(f"CREATE TABLE {rollup_name(table_name)} ({', '.join(columns)})")
+
+    def _merge_rollup(self, cursor, table_name, rollup, df, removed=None):
+        """Add the rollup cells of newly inserted rows to the rollup table.
+
+        With removed (the stored versions of upserted rows), their share is
+        taken out of the cells first and cells left without rows are deleted.
+        """
+        cells = rollup.cells(df) if removed is None else rollup.delta(removed, df)
+        columns = rollup.key + rollup.value_columns()
+        updates = [f"{ROW_COUNT} = {ROW_COUNT} + VALUES({ROW_COUNT})"]
+        for m in rollup.measures:
+            total, count, low, high = (f"{m}_{stat}" for stat in STATS)
+            # a NULL side (no values yet, or none in this batch) leaves the other side as is
+            updates += [f"{total} = COALESCE({total} + VALUES({total}), {total}, VALUES({total}))",
+                        f"{count} = {count} + VALUES({count})",
+                        f"{low} = COALESCE(LEAST({low}, VALUES({low})), {low}, VALUES({low}))",
+                        f"{high} = COALESCE(GREATEST({high}, VALUES({high})), {high}, VALUES({high}))"]
+        placeholders = ", ".join(["%s"] * len(columns))
+        cursor.executemany(f"INSERT INTO {rollup_name(table_name)} ({', '.join(columns)}) "
+                           f"VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {', '.join(updates)}",
+                           to_records(cells[columns]))
+        if removed is not None and not removed.empty:
+            cursor.execute(f"DELETE FROM {rollup_name(table_name)} WHERE {ROW_COUNT} <= 0")
+            if rollup.measures:
+                # a measure without values left in a cell has no sum, min or max (like SUM of no rows)
+                emptied = [f"{m}_{stat} = IF({m}_count > 0, {m}_{stat}, NULL)"
+                           for m in rollup.measures for stat in ("sum", "min", "max")]
+                cursor.execute(f"UPDATE {rollup_name(table_name)} SET {', '.join(emptied)} "
+                               f"WHERE {' OR '.join(f'{m}_count <= 0' for m in rollup.measures)}")
+
+    def _rebuild_rollup(self, conn, table_name, schema):
+        """Rebuild the rollup table from every row of the table in one server-side pass."""
+        rollup = self._rollup_for(schema)
+        if not rollup:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {rollup_name(table_name)}")
+            return
+        print(f"Building the rollup of '{table_name}'...")
+        self._create_rollup_table(conn, table_name, rollup)
+        keys = [f"COALESCE({dim}, '')" for dim in rollup.dimensions]
+        keys.append(f"COALESCE(DATE_FORMAT({rollup.date_column}, '%Y-%m-%d'), '')" if rollup.date_column else "''")
+        values = ["COUNT(*)"] + [f"{fn}({m})" for m in rollup.measures for fn in ("SUM", "COUNT", "MIN", "MAX")]
+        columns = rollup.key + rollup.value_columns()
+        with self.metrics.stage("upload.rollup"), conn.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {rollup_name(table_name)} ({', '.join(columns)}) "
+                           f"SELECT {', '.join(keys + values)} FROM {table_name} GROUP BY {', '.join(keys)}")
+
+    def _rebuild_sample(self, conn, table_name, draw=True):
+        """Draw the table's uniform sample ({table}__sample) in one server-side pass.
+
+        Every row is kept with probability Config.SAMPLE_RATE and gets a
+        uniform SAMPLE_U in [0, SAMPLE_RATE), so the rows below any smaller
+        rate are a sample of that rate (see approx.py). The sample has the
+        table's columns, indexes and partitions, plus an index on SAMPLE_U.
+        Without draw, the sample is created empty, for a table that is empty too.
+        """
+        sample = sample_name(table_name)
+        with self.metrics.stage("upload.sample"), conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {sample}")
+            if not Config.SAMPLE_RATE:
+                return
+            if draw:
+                print(f"Drawing a {Config.SAMPLE_RATE:.2%} sample of '{table_name}'...")
+            cursor.execute(f"CREATE TABLE {sample} LIKE {table_name}")
+            cursor.execute(f"ALTER TABLE {sample} ADD COLUMN {SAMPLE_U} DOUBLE NOT NULL, "
+                           f"ADD INDEX {index_name(sample, [SAMPLE_U])} ({SAMPLE_U})")
+            if draw:
+                # the draw and the stored value are independent uniforms: given the draw, u is uniform below the rate
+                cursor.execute(f"INSERT INTO {sample} SELECT {table_name}.*, RAND() * %s FROM {table_name} "
+                               "WHERE RAND() < %s", (Config.SAMPLE_RATE, Config.SAMPLE_RATE))
+
+    def _resample_rows(self, cursor, table_name, columns, match, values):
+        """Replace the sample's copies of the rows matching a key condition by a fresh draw of their stored versions.
+
+        Appends keep the sample current this way, batch by batch, instead of
+        drawing it again from the whole table. Every matching row is drawn
+        anew, unchanged ones too, so each row still is in the sample
+        independently with probability Config.SAMPLE_RATE.
+        """
+        sample = sample_name(table_name)
+        with self.metrics.stage("upload.sample"):
+            cursor.execute(f"DELETE FROM {sample} WHERE {match}", values)
+            cursor.execute(f"INSERT INTO {sample} ({', '.join(columns)}, {SAMPLE_U}) "
+                           f"SELECT {', '.join(columns)}, RAND() * %s FROM {table_name} WHERE {match} AND RAND() < %s",
+                           [Config.SAMPLE_RATE] + values + [Config.SAMPLE_RATE])
+
+    def _rollup(self, table):
+        """Definition of a table's rollup, or None if it has none."""
+        if table not in self.rollups:
+            try:
+                columns = [col[0] for col in self.pool.fetchall(f"DESCRIBE {rollup_name(table)}")]
+                self.rollups[table] = Rollup.from_columns(columns, Config.VALID_GROUPS["online_sales"])
+            except pymysql.err.ProgrammingError:
+                self.rollups[table] = None  # no rollup table
+        return self.rollups[table]
+
+    def _create_indexes(self, conn, table_name, proposals):
+        """Create a secondary index for each proposed tuple of columns.
+
+        Proposals whose key would exceed InnoDB's INDEX_KEY_BYTES are skipped,
+        so a wide compound index can't fail the upload after its rows are in.
+        """
+        widths = {col: key_bytes(sql_type) for col, sql_type in self._table_columns(conn, table_name)}
+        with conn.cursor() as cursor:
+            for cols in proposals:
+                width = sum(widths.get(col, 0) for col in cols)
+                if width > INDEX_KEY_BYTES:
+                    print(f"Skipping index on {table_name} ({', '.join(cols)}): "
+                          f"its key would be up to {width} bytes, over the {INDEX_KEY_BYTES} byte limit.")
+                    continue
+                print(f"Creating index on {table_name} ({', '.join(cols)})...")
+                cursor.execute(f"CREATE INDEX {index_name(table_name, cols)} ON {table_name} ({', '.join(cols)})")
+
+    def _indexable_columns(self, table):
+        """Columns of an existing table that can carry a secondary index."""
+        schema = self.pool.fetchall(f"DESCRIBE {table}")
+        return [col[0] for col in schema if key_bytes(str(col[1])) <= INDEX_KEY_BYTES]
+
+    def _existing_indexes(self, table):
+        """Map index name -> indexed columns, in index order."""
+        indexes = {}
+        # SHOW INDEX rows: Table, Non_unique, Key_name, Seq_in_index, Column_name, ...
+        for row in sorted(self.pool.fetchall(f"SHOW INDEX FROM {table}"), key=lambda r: (r[2], r[3])):
+            indexes.setdefault(row[2], []).append(row[4])
+        return indexes
+
+    def build_indexes(self):
+        """Build the indexes the advisor proposes for the selected table that don't exist yet."""
+        if not self.selected_table:
+            print("Please explore and select a table first.")
+            return
+        try:
+            table = self.selected_table
+            missing = self.index_advisor.missing(table, self._indexable_columns(table), self._existing_indexes(table))
+            if not missing:
+                print(f"All proposed indexes on '{table}' already exist.")
+                return
+            with self.pool.connection() as conn:
+                self._create_indexes(conn, table, missing)
+            print(f"Built {len(missing)} indexes on '{table}'.")
+        except Exception as e:
+            print(f"Error building indexes: {e}")
+
+    def show_index_status(self):
+        """Show which query templates are served by an index on the selected table."""
+        if not self.selected_table:
+            print("Please explore and select a table first.")
+            return
+        try:
+            table = self.selected_table
+            print_index_status(self.index_advisor.status(
+                table, self._indexable_columns(table), self._existing_indexes(table)))
+        except Exception as e:
+            print(f"Error reading indexes: {e}")
 
     def explore_tables(self):
         """Display available tables and allow user to select a table."""
         try:
-            self.cursor.execute("SHOW TABLES")
-            tables = self.cursor.fetchall()
+            tables = self.list_datasets()
             if tables:
                 print("\nAvailable Tables:")
-                for idx, table in enumerate(tables, 1):
-                    # Access the first item of the tuple, which is the table name
-                    table_name = table[0]
+                for idx, table_name in enumerate(tables, 1):
                     print(f"{idx}. {table_name}")
                 # Allow user to select a table with number validation
                 while True:
@@ -99,7 +607,7 @@ class ChatDB:
                         if selection < 1 or selection > len(tables):
                             print(f"Please enter a number between 1 and {len(tables)}.")
                         else:
-                            self.selected_table = tables[selection-1][0]  # Get table name from tuple
+                            self.selected_table = tables[selection-1]
                             self.describe_table(self.selected_table)
                             break
                     except ValueError:
@@ -110,16 +618,23 @@ class ChatDB:
             print(f"Error fetching tables: {e}")
 
 
+    def list_datasets(self):
+        """Names of the tables holding datasets; rollup and sample tables are internal to their table."""
+        return [table[0] for table in self.pool.fetchall("SHOW TABLES")
+                if not is_rollup(table[0]) and not is_sample(table[0])]
+
+    def describe_dataset(self, table: str):
+        """(column, type) pairs and the first rows of a table."""
+        schema = [(col[0], col[1]) for col in self.pool.fetchall(f"DESCRIBE {table}")]
+        return schema, list(self.pool.fetchall(f"SELECT * FROM {table} LIMIT 5"))
+
     def describe_table(self, table: str):
         """Display table schema and sample data."""
-        self.cursor.execute(f"DESCRIBE {table};")
-        schema = self.cursor.fetchall()
+        schema, data = self.describe_dataset(table)
         print(f"\n### {table.upper()} ###")
         print("Schema:")
-        for col in schema:
-            print(f"- {col[0]} ({col[1]})")
-        self.cursor.execute(f"SELECT * FROM {table} LIMIT 5;")
-        data = self.cursor.fetchall()
+        for name, column_type in schema:
+            print(f"- {name} ({column_type})")
         if data:
             print("\nSample Data:")
             for row in data:
@@ -132,36 +647,286 @@ class ChatDB:
         for idx, query in enumerate(queries, start=1):
             print(f"{idx}. {query}")
 
-    def process_query(self, query: str):
-        """Parse and execute a natural language query."""
+    def process_query(self, query: str, explain=False, approx=False):
+        """Parse and execute a natural language query.
+
+        With explain, the plan of the generated SQL is summarized before the results.
+        With approx, the answer is estimated from the smallest step of the
+        table's sample instead; refine() continues with the next step.
+        """
+        with self.metrics.stage("query.total"):
+            if approx:
+                self._process_approx(query, 0)
+            else:
+                self._process_query(query, explain)
+
+    def refine(self):
+        """Refine the last approximate answer from a larger sample, or run it exactly after the last step."""
+        if self.refinement is None:
+            print("No approximate query to refine; run one with approx first.")
+            return
+        query, step = self.refinement
+        with self.metrics.stage("query.total"):
+            self._process_approx(query, step + 1)
+
+    def _process_approx(self, query: str, step):
+        self.refinement = None
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            print("Query not recognized.")
+            return
+        try:
+            result = self._estimate(query_type, params, self.selected_table, step)
+            if result is None:  # every step was shown
+                print("\nExact result:")
+                self._process_query(query)
+                return
+            sql, rows, rate = result
+            print("\nExecuting SQL (on the sample):")
+            print(sql)
+            if self.pager:
+                self.pager.close()
+            self.pager = ResultPager(rows, DatabaseConfig.PAGE_SIZE, DatabaseConfig.MAX_RESULT_ROWS)
+            print(f"\nResults ({describe_estimates(rate, Config.APPROX_CONFIDENCE)}):")
+            self._print_page()
+            self.refinement = (query, step)
+            print("Type 'refine' for a more precise answer.")
+        except Exception as e:
+            print(f"Error executing query: {e}")
+
+    def _process_query(self, query: str, explain=False):
         query_type, params = self.query_generator.parse_query(query)
         if query_type:
-            groups = params["groups"]
             try:
-                sql = params["template"].format(
-                    table=self.selected_table,
-                    metric=groups[0],
-                    group_by=groups[1],
-                    filter_column=groups[2] if len(groups) > 2 else "",
-                    operator=groups[3] if len(groups) > 3 else "",
-                    value=groups[4] if len(groups) > 4 else "",
-                    n=groups[0] if query_type == "top_n" else ""
-                )
-                print("\nExecuting SQL:")
+                statement, args, from_rollup = self._statement(query_type, params, self.selected_table)
+                sql = render(statement, args)
+                print("\nExecuting SQL (from rollup):" if from_rollup else "\nExecuting SQL:")
                 print(sql)
-                self.cursor.execute(sql)
+                if explain:
+                    print_plan(self._explain(sql))
+                rows = self.result_cache.get("mysql", self.selected_table, sql)
+                if self.pager:
+                    self.pager.close()
+                if rows is None:
+                    table = self.selected_table
+                    self.pager = ResultPager(
+                        self._stream(statement, args), DatabaseConfig.PAGE_SIZE, DatabaseConfig.MAX_RESULT_ROWS,
+                        on_complete=lambda rows: self.result_cache.put("mysql", table, sql, rows)
+                    )
+                else:
+                    print("(cached result)")
+                    self.pager = ResultPager(rows, DatabaseConfig.PAGE_SIZE, DatabaseConfig.MAX_RESULT_ROWS)
                 print("\nResults:")
-                for row in self.cursor.fetchall():
-                    print(row)
+                self._print_page()
             except Exception as e:
                 print(f"Error executing query: {e}")
         else:
             print("Query not recognized.")
 
+    def execute(self, query: str, table: str = None):
+        """Run a natural language query and return (SQL, all result rows) without printing.
+
+        Returns None if the query isn't recognized. Results are neither paged
+        nor cached, which makes this the entry point for batch runs and benchmarks.
+        """
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            return None
+        return self.execute_parsed(query_type, params, table)
+
+    def execute_parsed(self, query_type, params, table: str = None):
+        """Run an already parsed query and return (SQL, all result rows)."""
+        table = table or self.selected_table
+        statement, args, _ = self._statement(query_type, params, table)
+        with self.metrics.stage("query.execute"):
+            if self.statements:
+                rows = list(self.pool.fetchall(statement, args, statements=self.statements))
+            else:
+                rows = list(self.pool.fetchall(statement.replace("?", "%s"), args))
+        self.metrics.count("query.rows", len(rows))
+        self.metrics.count("query.bytes", row_bytes(rows))
+        return render(statement, args), rows
+
+    def stream(self, query: str, table: str = None):
+        """Run a natural language query and return (SQL, iterator over its rows), or None if it isn't recognized.
+
+        Rows are fetched from a server-side cursor as the iterator is read;
+        close it to stop early. This is how the server caps a result without holding all of it.
+        """
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            return None
+        statement, args, _ = self._statement(query_type, params, table or self.selected_table)
+        return render(statement, args), self._stream(statement, args)
+
+    def estimate(self, query: str, table: str = None, step=0):
+        """Run a natural language query on step of the table's sample; returns (SQL, estimates, rate).
+
+        Estimates are (group, estimate, low, high) rows (see approx.estimate).
+        Returns None once step is past the last of Config.APPROX_STEPS, when
+        only the exact answer is left, and raises ValueError if the query
+        isn't recognized.
+        """
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            raise ValueError("Query not recognized.")
+        return self._estimate(query_type, params, table or self.selected_table, step)
+
+    def _estimate(self, query_type, params, table, step):
+        if not Config.SAMPLE_RATE:
+            raise ValueError("Approximate queries are off (Config.SAMPLE_RATE is None)")
+        rates = sample_steps(Config.SAMPLE_RATE, Config.APPROX_STEPS)
+        if step >= len(rates):
+            return None
+        self.index_advisor.record(table, query_type, params["groups"])
+        with self.metrics.stage("query.generate"):
+            self.query_generator.check_identifiers(query_type, params, table, self._catalog(table))
+            statement, args = self.query_generator.generate_sample_statement(query_type, params, table, rates[step])
+        try:
+            rows = list(self._stream(statement, args))
+        except pymysql.err.ProgrammingError:
+            raise ValueError(f"Table '{table}' has no sample; upload it again to draw one") from None
+        return (render(statement, args),
+                estimate(query_type, params["groups"], rows, rates[step], Config.APPROX_CONFIDENCE), rates[step])
+
+    def explain(self, query: str, table: str = None):
+        """Plan summary (see explain.py) of a natural language query, or None if it isn't recognized."""
+        query_type, params = self.query_generator.parse_query(query)
+        if not query_type:
+            return None
+        statement, args, _ = self._statement(query_type, params, table or self.selected_table)
+        return self._explain(render(statement, args))
+
+    def _explain(self, sql):
+        """Summarize the plan of a statement with EXPLAIN ANALYZE, which runs it.
+
+        Servers without EXPLAIN ANALYZE (before MySQL 8.0.18) fall back to
+        EXPLAIN, whose row counts are estimates.
+        """
+        with self.metrics.stage("query.explain"):
+            try:
+                summary = summarize_mysql_analyze(sql, self.pool.fetchall(f"EXPLAIN ANALYZE {sql}")[0][0])
+            except pymysql.err.ProgrammingError:
+                with self.pool.connection() as conn, conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                    cursor.execute(f"EXPLAIN {sql}")
+                    summary = summarize_mysql_explain(sql, cursor.fetchall())
+        # a rollup holds one row per cell and is meant to be read in full
+        summary["full_scans"] = [name for name in summary["full_scans"] if not is_rollup(name)]
+        self.metrics.record_plan(summary)
+        return summary
+
+    def _statement(self, query_type, params, table):
+        """(SQL with ? placeholders, values to bind, whether it reads the table's rollup) for a parsed query.
+
+        The columns the query names are checked against the table's catalog
+        first, so only known identifiers are ever formatted into SQL.
+        """
+        self.index_advisor.record(table, query_type, params["groups"])
+        with self.metrics.stage("query.generate"):
+            self.query_generator.check_identifiers(query_type, params, table, self._catalog(table))
+            # eligible aggregates read the pre-aggregated rollup instead of scanning the table
+            rollup = self._rollup(table)
+            statement = rollup and self.query_generator.generate_rollup_statement(query_type, params, table, rollup)
+            if statement:
+                return statement + (True,)
+            return self.query_generator.generate_statement(query_type, params, table) + (False,)
+
+    def _catalog(self, table):
+        """Column names of a table, read once per table (and again after it is uploaded to)."""
+        if table not in self.catalogs:
+            if not table or not re.fullmatch(r"\w+", table):
+                raise ValueError(f"Invalid table name '{table}'")
+            try:
+                self.catalogs[table] = [col[0] for col in self.pool.fetchall(f"DESCRIBE {table}")]
+            except pymysql.err.ProgrammingError:
+                raise ValueError(f"Table '{table}' doesn't exist") from None
+        return self.catalogs[table]
+
+    def _execute(self, cursor, statement, args):
+        # prepared (and reused) per connection, or sent as text with values escaped by the driver
+        if self.statements:
+            self.statements.execute(cursor, statement, args)
+        else:
+            cursor.execute(statement.replace("?", "%s"), args)
+
+    def show_more(self):
+        """Print the next page of the last query's results."""
+        try:
+            if self.pager is None or not self.pager.has_more():
+                print("No more results.")
+                return
+            self._print_page()
+        except Exception as e:
+            print(f"Error fetching results: {e}")
+
+    def _print_page(self):
+        # rows are streamed while the page prints, so the statement and its fetches are timed apart
+        with self.metrics.stage("query.print", exclude=("query.execute", "query.fetch")):
+            try:
+                self.pager.print_page()
+            except Exception:
+                # a stream that failed partway can't be paged further, and isn't cached (see ResultPager)
+                self.pager.close()
+                self.pager = None
+                raise
+
+    def stats(self):
+        """Metrics snapshot and cache statistics of this session."""
+        caches = {f"{name} cache": stats for name, stats in self.query_generator.cache_stats().items()}
+        caches["result cache"] = self.result_cache.stats()
+        if self.statements:
+            caches["prepared statements"] = self.statements.stats()
+        return self.metrics.snapshot(), caches
+
+    def show_stats(self):
+        """Print stage timings, row and byte counters and cache hit rates of this session."""
+        print_snapshot(*self.stats())
+
+    def export_stats(self, path=None):
+        """Write the session's metrics to a file (metrics.METRICS_PATH by default)."""
+        try:
+            print(f"Metrics written to {self.metrics.export(path, {'backend': 'mysql'})}.")
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+    def _stream(self, statement, args=()):
+        """Yield result rows from an unbuffered server-side cursor, fetchmany batch at a time."""
+        with self.pool.connection() as conn:
+            # no cursor context manager: closing an SSCursor early would read every remaining
+            # row, so an abandoned stream instead makes the pool discard the connection
+            cursor = conn.cursor(pymysql.cursors.SSCursor)
+            with self.metrics.stage("query.execute"):
+                self._execute(cursor, statement, args)
+            while True:
+                with self.metrics.stage("query.fetch"):
+                    rows = cursor.fetchmany(DatabaseConfig.FETCH_BATCH_SIZE)
+                if not rows:
+                    break
+                self.metrics.count("query.rows", len(rows))
+                self.metrics.count("query.bytes", row_bytes(rows))
+                for row in rows:
+                    yield row
+            cursor.close()
+
     def close(self):
-        """Close the database connection."""
-        self.cursor.close()
-        self.connection.close()
+        """Close the idle pooled database connections."""
+        if self.pager:
+            self.pager.close()
+        self.pool.close()
+
+def _rollup_dimension(schema, col):
+    # group values must fit the rollup key column
+    stats = schema.columns.get(col)
+    return stats is not None and stats["kind"] == "varchar" and stats["length"] <= Config.ROLLUP_KEY_LENGTH
+
+
+def _rollup_measure(schema, col):
+    return schema.kind(col) in ("bool", "int", "decimal")
+
+
+def _rollup_date_column(schema):
+    return "date" if schema.kind("date") in ("date", "datetime") else None
+
 
 def main():
     chatdb = ChatDB()
@@ -0,0 +1,148 @@
+#sqlpool.py
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import pymysql
+
+# Statement-level errors, and server errors other than a lost connection, leave the connection
+# usable (it's rolled back); anything else (abandoned unbuffered result, interrupted generator) discards it
+_REUSABLE_ERRORS = (pymysql.err.ProgrammingError, pymysql.err.IntegrityError,
+                    pymysql.err.DataError, pymysql.err.NotSupportedError)
+
+# pymysql raises OperationalError for every server error it has no class for (lock wait
+# timeouts, deadlocks, ...); only these client error numbers mean the connection was lost:
+# CR_SERVER_GONE_ERROR, CR_SERVER_LOST and CR_SERVER_LOST_EXTENDED
+_CONNECTION_LOST = (2006, 2013, 2055)
+
+
+def _connection_lost(error) -> bool:
+    """Whether a pymysql error means the connection is gone, so the statement may be retried on another."""
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    return isinstance(error, pymysql.err.OperationalError) and bool(error.args) and error.args[0] in _CONNECTION_LOST
+
+
+class ConnectionPool:
+    '''
+    Thread-safe pool of pymysql connections.
+
+    args:
+        size: maximum number of open connections
+        timeout: seconds to wait for a free connection before raising TimeoutError
+        ping_interval: connections idle longer than this are pinged (and
+            transparently reconnected) before being handed out
+        connect_args: keyword arguments for pymysql.connect
+
+    Connections run in autocommit mode; callers that need a multi-statement
+    transaction call conn.begin() and conn.commit() themselves.
+    '''
+    def __init__(self, size, timeout=30, ping_interval=30, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.connect_args = dict(connect_args, autocommit=True)
+        self._idle = queue.LifoQueue()  # (connection, last used), most recent first
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No MySQL connection became free within {self.timeout}s")
+        try:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return pymysql.connect(**self.connect_args)
+            if time.monotonic() - last_used > self.ping_interval:
+                conn.ping(reconnect=True)  # health check; reconnects a dropped connection
+            return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        try:
+            if discard:
+                conn.close()
+            else:
+                self._idle.put((conn, time.monotonic()))
+        except Exception:
+            pass  # closing an already broken connection
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out for the duration of a with block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except _REUSABLE_ERRORS + (pymysql.err.OperationalError,) as e:
+            if _connection_lost(e):
+                self.release(conn, discard=True)
+                raise
+            try:
+                conn.rollback()
+            except Exception:
+                self.release(conn, discard=True)
+            else:
+                self.release(conn)
+            raise
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def fetchall(self, sql, args=None, statements=None):
+        """Run one statement and return its rows, retrying once on a lost connection.
+
+        With statements (a sqlprepared.StatementCache), sql uses ? placeholders
+        and runs as a prepared statement.
+        """
+        for attempt in range(2):
+            try:
+                with self.connection() as conn, conn.cursor() as cursor:
+                    if statements:
+                        statements.execute(cursor, sql, args)
+                    else:
+                        cursor.execute(sql, args)
+                    return cursor.fetchall()
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+                # server-side failures (deadlocks, timeouts, ...) would only fail again
+                if attempt or not _connection_lost(e):
+                    raise
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(config):
+    """Return the process-wide pool for a DatabaseConfig, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                config.POOL_SIZE,
+                timeout=config.POOL_TIMEOUT,
+                ping_interval=config.POOL_PING_INTERVAL,
+                host=config.HOST,
+                user=config.USER,
+                password=config.PASSWORD,
+                database=config.DATABASE,
+                local_infile=config.LOCAL_INFILE
+            )
+        return _pool
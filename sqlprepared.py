@@ -0,0 +1,91 @@
+#sqlprepared.py
+
+import itertools
+import threading
+import weakref
+from collections import OrderedDict
+
+
+class StatementCache:
+    '''
+    Server-side prepared statements, kept per pooled MySQL connection.
+
+    args:
+        maxsize: statements kept prepared on each connection; the least
+            recently used one is deallocated when another is prepared
+
+    A statement is prepared (PREPARE ... FROM) the first time it runs on a
+    connection and executed with EXECUTE ... USING afterwards, so MySQL
+    parses each template once per connection instead of once per query.
+    Values are bound through user variables and never formatted into the SQL.
+    '''
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._ids = itertools.count(1)
+        # connection -> (server thread id, OrderedDict of SQL -> statement name); entries
+        # disappear with their connections
+        self._connections = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def execute(self, cursor, sql, args=()):
+        """Run a statement with ? placeholders on the cursor's connection, binding args."""
+        name = self._prepare(cursor, sql)
+        if not args:
+            cursor.execute(f"EXECUTE {name}")
+            return
+        variables = [f"@chatdb_p{i}" for i in range(len(args))]
+        cursor.execute("SET " + ", ".join(f"{var} = %s" for var in variables), args)
+        cursor.execute(f"EXECUTE {name} USING {', '.join(variables)}")
+
+    def _prepare(self, cursor, sql):
+        conn = cursor.connection
+        thread_id = conn.thread_id()
+        with self._lock:
+            entry = self._connections.get(conn)
+            # a reconnect (after a failed ping) starts a new session without our statements
+            if entry is None or entry[0] != thread_id:
+                entry = self._connections[conn] = (thread_id, OrderedDict())
+        statements = entry[1]  # a connection is used by one thread at a time
+        name = statements.get(sql)
+        if name is not None:
+            statements.move_to_end(sql)
+            self.hits += 1
+            return name
+        self.misses += 1
+        while len(statements) >= self.maxsize:
+            _, evicted = statements.popitem(last=False)
+            cursor.execute(f"DEALLOCATE PREPARE {evicted}")
+            self.evictions += 1
+        name = f"chatdb_stmt_{next(self._ids)}"
+        cursor.execute(f"PREPARE {name} FROM %s", (sql,))
+        statements[sql] = name
+        return name
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = list(self._connections.values())
+        lookups = self.hits + self.misses
+        return {
+            "size": sum(len(statements) for _, statements in entries),
+            "maxsize": self.maxsize * max(len(entries), 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_statement_cache(config):
+    """Return the process-wide statement cache for a DatabaseConfig, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StatementCache(config.STATEMENT_CACHE_SIZE)
+        return _cache
@@ -1,40 +1,147 @@
 #sqlquery_generator.py
-import re
-import spacy
 from typing import Tuple, Optional
+from nlp_service import tokenize
+from cache import LRUCache
+from metrics import Metrics
+from query_dispatch import PatternDispatcher, normalize_query
+from rollup import rollup_name
+from approx import sample_name, SAMPLE_U
+from sqlconfig import Config
+
+COMPARISON_OPERATORS = (">", "<", "=")  # operators a filter may use; anything else is rejected
+
+
+def render(sql: str, args: tuple) -> str:
+    """Inline bound values into a statement with ? placeholders, for display and EXPLAIN."""
+    parts = sql.split("?")
+    rendered = [parts[0]]
+    for value, part in zip(args, parts[1:]):
+        literal = str(value) if isinstance(value, (int, float)) else "'" + str(value).replace("'", "''") + "'"
+        rendered += [literal, part]
+    return "".join(rendered)
+
 
 class QueryGenerator:
-    def __init__(self):
-        self.nlp = spacy.load("en_core_web_sm")
+    def __init__(self, metrics=None):
         self.query_patterns = [
             {
                 "pattern": r"total (\w+) by (\w+) where (\w+) (>|<|=) (\d+)",
                 "type": "aggregate_with_where",
-                "sql_template": "SELECT {group_by}, SUM({metric}) AS total_{metric} FROM {table} WHERE {filter_column} {operator} {value} GROUP BY {group_by} ORDER BY total_{metric} DESC"
+                "sql_template": "SELECT {group_by}, SUM({metric}) AS total_{metric} FROM {table} WHERE {filter_column} {operator} {value} GROUP BY {group_by} ORDER BY total_{metric} DESC",
+                "sample_template": "SELECT {group_by}, COUNT({metric}), SUM({metric}), SUM({metric} * {metric}) FROM {table} WHERE {sample_u} < ? AND {filter_column} {operator} {value} GROUP BY {group_by}"
             },
             {
                 "pattern": r"total (\w+) by (\w+)",
                 "type": "aggregate_by_category",
-                "sql_template": "SELECT {group_by}, SUM({metric}) AS total_{metric} FROM {table} GROUP BY {group_by} ORDER BY total_{metric} DESC"
+                "sql_template": "SELECT {group_by}, SUM({metric}) AS total_{metric} FROM {table} GROUP BY {group_by} ORDER BY total_{metric} DESC",
+                "rollup_template": "SELECT NULLIF({group_by}, '') AS {group_by}, SUM({metric}_sum) AS total_{metric} FROM {table} GROUP BY {group_by} ORDER BY total_{metric} DESC",
+                "sample_template": "SELECT {group_by}, COUNT({metric}), SUM({metric}), SUM({metric} * {metric}) FROM {table} WHERE {sample_u} < ? GROUP BY {group_by}"
             },
             {
                 "pattern": r"average (\w+) by (\w+)",
                 "type": "average_by_category",
-                "sql_template": "SELECT {group_by}, AVG({metric}) AS avg_{metric} FROM {table} GROUP BY {group_by} ORDER BY avg_{metric} DESC"
+                "sql_template": "SELECT {group_by}, AVG({metric}) AS avg_{metric} FROM {table} GROUP BY {group_by} ORDER BY avg_{metric} DESC",
+                "rollup_template": "SELECT NULLIF({group_by}, '') AS {group_by}, SUM({metric}_sum) / SUM({metric}_count) AS avg_{metric} FROM {table} GROUP BY {group_by} ORDER BY avg_{metric} DESC",
+                "sample_template": "SELECT {group_by}, COUNT({metric}), SUM({metric}), SUM({metric} * {metric}) FROM {table} WHERE {sample_u} < ? GROUP BY {group_by}"
             },
             {
                 "pattern": r"top (\d+) (\w+) by (\w+)",
                 "type": "top_n",
-                "sql_template": "SELECT {group_by}, SUM({metric}) AS total_{metric} FROM {table} GROUP BY {group_by} ORDER BY total_{metric} DESC LIMIT {n}"
+                "sql_template": "SELECT {group_by}, SUM({metric}) AS total_{metric} FROM {table} GROUP BY {group_by} ORDER BY total_{metric} DESC LIMIT {n}",
+                "rollup_template": "SELECT NULLIF({group_by}, '') AS {group_by}, SUM({metric}_sum) AS total_{metric} FROM {table} GROUP BY {group_by} ORDER BY total_{metric} DESC LIMIT {n}",
+                "sample_template": "SELECT {group_by}, COUNT({metric}), SUM({metric}), SUM({metric} * {metric}) FROM {table} WHERE {sample_u} < ? GROUP BY {group_by}"
             }
         ]
+        self.dispatcher = PatternDispatcher(self.query_patterns)
+        self.parse_cache = LRUCache(Config.PARSE_CACHE_SIZE)  # normalized text -> (type, params)
+        self.sql_cache = LRUCache(Config.PARSE_CACHE_SIZE)  # (table, type, identifiers) -> SQL with ? placeholders
+        self.metrics = metrics or Metrics()  # tokenize and match timings of uncached parses
 
     def parse_query(self, query: str) -> Tuple[Optional[str], Optional[dict]]:
         """Parse a natural language query."""
-        doc = self.nlp(query.lower())
-        text = " ".join([token.text for token in doc])
-        for pattern in self.query_patterns:
-            match = re.search(pattern["pattern"], text)
-            if match:
-                return pattern["type"], {"groups": match.groups(), "template": pattern["sql_template"]}
-        return None, None
+        key = normalize_query(query.lower())
+        cached = self.parse_cache.get(key)
+        if cached is not None:
+            return cached
+        with self.metrics.stage("query.tokenize"):
+            text = " ".join(tokenize(key))
+        with self.metrics.stage("query.match"):
+            pattern, match = self.dispatcher.match(text)
+        if match:
+            result = pattern["type"], {"groups": match.groups(), "template": pattern["sql_template"],
+                                       "rollup_template": pattern.get("rollup_template"),
+                                       "sample_template": pattern.get("sample_template")}
+        else:
+            result = None, None
+        self.parse_cache.put(key, result)
+        return result
+
+    def generate_sql(self, query_type: str, params: dict, table: str) -> str:
+        """Fill a parsed query's SQL template for a table, values inlined."""
+        return render(*self.generate_statement(query_type, params, table))
+
+    def generate_statement(self, query_type: str, params: dict, table: str) -> Tuple[str, tuple]:
+        """(SQL with ? placeholders, values to bind) for a parsed query on a table."""
+        return self._fill(query_type, params, params["template"], table)
+
+    def generate_rollup_statement(self, query_type: str, params: dict, table: str, rollup) -> Optional[Tuple[str, tuple]]:
+        """Statement over a table's rollup, or None if the rollup can't answer the query."""
+        if not params.get("rollup_template") or not rollup.covers(query_type, params["groups"]):
+            return None
+        return self._fill(query_type, params, params["rollup_template"], rollup_name(table))
+
+    def generate_sample_statement(self, query_type: str, params: dict, table: str, rate: float) -> Tuple[str, tuple]:
+        """Per-group (values, sum, sum of squares) of the metric over the rows of a table's sample below rate.
+
+        The rows are what approx.estimate scales into estimates; top_n reads
+        every group, since the top n are picked from the estimates.
+        """
+        if not params.get("sample_template"):
+            raise ValueError(f"'{query_type}' queries can't be estimated")
+        sql, args = self._fill(query_type, params, params["sample_template"], sample_name(table))
+        return sql, (rate,) + (args if query_type != "top_n" else ())
+
+    def check_identifiers(self, query_type: str, params: dict, table: str, columns):
+        """Raise ValueError unless every column a query names exists in the table's columns."""
+        names = {name.lower() for name in columns}
+        for name in _identifiers(query_type, params["groups"]):
+            if name.lower() not in names:
+                raise ValueError(f"Unknown column '{name}' in table '{table}'")
+
+    def _fill(self, query_type: str, params: dict, template: str, table: str) -> Tuple[str, tuple]:
+        # identifiers are formatted into the statement once per (table, template, columns);
+        # values (the filter value and top n) are bound as parameters on every execution
+        groups = params["groups"]
+        if query_type == "aggregate_with_where" and groups[3] not in COMPARISON_OPERATORS:
+            raise ValueError(f"Unsupported operator '{groups[3]}'")
+        key = (table, query_type, _identifiers(query_type, groups), groups[3] if len(groups) > 3 else None)
+        sql = self.sql_cache.get(key)
+        if sql is None:
+            if query_type == "top_n":
+                _, metric, group_by = groups
+            else:
+                metric, group_by = groups[0], groups[1]
+            sql = template.format(
+                table=table,
+                metric=metric,
+                group_by=group_by,
+                filter_column=groups[2] if len(groups) > 2 else "",
+                operator=groups[3] if len(groups) > 3 else "",
+                value="?",
+                n="?",
+                sample_u=SAMPLE_U
+            )
+            self.sql_cache.put(key, sql)
+        if query_type == "top_n":
+            return sql, (int(groups[0]),)
+        return sql, (int(groups[4]),) if len(groups) > 4 else ()
+
+    def cache_stats(self) -> dict:
+        return {"parse": self.parse_cache.stats(), "sql": self.sql_cache.stats()}
+
+
+def _identifiers(query_type: str, groups: tuple) -> tuple:
+    # column names a parsed query refers to: metric, group-by and (with a filter) the filter column
+    if query_type == "top_n":
+        return groups[1], groups[2]
+    return tuple(groups[:3])
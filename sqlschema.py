@@ -0,0 +1,201 @@
+#sqlschema.py
+
+import re
+import pandas as pd
+from pandas.api import types as ptypes
+
+VARCHAR_LIMIT = 1024  # strings longer than this are stored as TEXT
+INDEX_KEY_BYTES = 3072  # InnoDB's limit on the total width of an index key
+MAX_DECIMAL_SCALE = 6
+DATE_PROBE_ROWS = 100  # rows checked before attempting a full date parse
+
+
+class SchemaInferrer:
+    '''
+    Infers MySQL column types from pandas DataFrames.
+
+    Stats are accumulated across every DataFrame passed to observe(), so a
+    column is widened (INT -> DECIMAL -> VARCHAR, DATE -> DATETIME) when
+    later data no longer fits the type inferred so far.
+    '''
+    def __init__(self, columns=None):
+        # column name -> {"kind", "digits", "scale", "length"}; JSON-serializable
+        # so an interrupted upload can restore it from its checkpoint
+        self.columns = dict(columns or {})
+
+    @classmethod
+    def from_sql_types(cls, columns):
+        """Schema of an existing MySQL table from (column, type) pairs, so appended data widens it."""
+        return cls({col: _sql_type_stats(str(sql_type).lower()) for col, sql_type in columns})
+
+    def observe(self, df: pd.DataFrame) -> list:
+        """Fold a DataFrame into the schema; return columns whose SQL type changed."""
+        changed = []
+        for col in df.columns:
+            before = self.sql_type(col) if col in self.columns else None
+            stats = _column_stats(df[col])
+            self.columns[col] = _merge(self.columns.get(col), stats)
+            if before is not None and self.sql_type(col) != before:
+                changed.append(col)
+        return changed
+
+    def sql_type(self, col: str) -> str:
+        """Render the MySQL type for a column."""
+        stats = self.columns[col]
+        if stats is None:
+            return "VARCHAR(255)"  # column was entirely empty
+        kind = stats["kind"]
+        if kind == "bool":
+            return "TINYINT(1)"
+        if kind == "int":
+            return "INT" if stats["digits"] <= 9 else "BIGINT"
+        if kind == "decimal":
+            scale = stats["scale"]
+            return f"DECIMAL({min(stats['digits'] + scale, 65)}, {scale})"
+        if kind == "date":
+            return "DATE"
+        if kind == "datetime":
+            return "DATETIME"
+        length = max(16, 1 << (max(stats["length"], 1) - 1).bit_length())
+        return f"VARCHAR({length})" if length <= VARCHAR_LIMIT else "TEXT"
+
+    def sqlite_type(self, col: str) -> str:
+        """Render the SQLite storage type for a column (dates are ISO TEXT)."""
+        kind = self.kind(col)
+        if kind in ("bool", "int"):
+            return "INTEGER"
+        if kind == "decimal":
+            return "REAL"
+        return "TEXT"
+
+    def column_definitions(self) -> str:
+        return ", ".join(f"{col} {self.sql_type(col)}" for col in self.columns)
+
+    def create_table_sql(self, table_name: str) -> str:
+        return f"CREATE TABLE {table_name} ({self.column_definitions()})"
+
+    def kind(self, col: str):
+        return (self.columns.get(col) or {}).get("kind")
+
+    def indexable_columns(self) -> list:
+        """Columns whose type can carry a secondary index (TEXT can't without a prefix, nor VARCHARs wider than a key)."""
+        return [col for col in self.columns if key_bytes(self.sql_type(col)) <= INDEX_KEY_BYTES]
+
+    def coerce(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Convert DataFrame values to match the inferred column types."""
+        df = df.copy()
+        for col in df.columns:
+            kind = self.kind(col)
+            if kind == "int":
+                df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int64")
+            elif kind == "decimal":
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+            elif kind in ("date", "datetime"):
+                fmt = "%Y-%m-%d" if kind == "date" else "%Y-%m-%d %H:%M:%S"
+                df[col] = pd.to_datetime(df[col], errors="coerce").dt.strftime(fmt)
+        return df
+
+
+def to_records(df: pd.DataFrame) -> list:
+    """DataFrame rows as parameter tuples; NaN becomes NULL instead of being hand-escaped."""
+    return list(df.astype(object).where(df.notnull(), None).itertuples(index=False, name=None))
+
+
+def key_bytes(sql_type: str) -> int:
+    """Worst-case bytes a MySQL column of this type takes in an index key (utf8mb4 strings take 4 per character)."""
+    sql_type = sql_type.lower()
+    if "text" in sql_type or "blob" in sql_type:
+        return INDEX_KEY_BYTES + 1  # can't be indexed without a prefix
+    string = re.match(r"(?:var)?char\((\d+)\)", sql_type)
+    if string:
+        return 4 * int(string.group(1))
+    decimal = re.match(r"decimal\((\d+)", sql_type)
+    if decimal:
+        return (int(decimal.group(1)) + 8) // 9 * 4
+    for prefix, size in (("tinyint", 1), ("smallint", 2), ("mediumint", 3), ("bigint", 8), ("int", 4),
+                         ("datetime", 8), ("date", 3), ("timestamp", 7), ("float", 4), ("double", 8)):
+        if sql_type.startswith(prefix):
+            return size
+    return 8
+
+
+def _column_stats(series: pd.Series):
+    """Describe the values in one column of one DataFrame."""
+    s = series.dropna()
+    if s.empty:
+        return None
+    if ptypes.is_bool_dtype(s):
+        return {"kind": "bool", "digits": 1, "scale": 0, "length": 5}
+    if ptypes.is_numeric_dtype(s):
+        return _numeric_stats(s)
+    if ptypes.is_datetime64_any_dtype(s):
+        return _date_stats(s)
+
+    numbers = pd.to_numeric(s, errors="coerce")
+    if numbers.notna().all():
+        return _numeric_stats(numbers)
+    if pd.to_datetime(s.head(DATE_PROBE_ROWS), errors="coerce").notna().all():
+        dates = pd.to_datetime(s, errors="coerce")
+        if dates.notna().all():
+            return _date_stats(dates)
+    return {"kind": "varchar", "digits": 0, "scale": 0, "length": int(s.astype(str).str.len().max())}
+
+
+def _numeric_stats(s: pd.Series):
+    s = s.astype(float)
+    digits = len(str(int(s.abs().max())))
+    scale = 0
+    while scale < MAX_DECIMAL_SCALE and not (s.round(scale) == s).all():
+        scale += 1
+    kind = "int" if scale == 0 else "decimal"
+    return {"kind": kind, "digits": digits, "scale": scale, "length": digits + scale + 2}
+
+
+def _date_stats(s: pd.Series):
+    kind = "date" if (s.dt.normalize() == s).all() else "datetime"
+    return {"kind": kind, "digits": 0, "scale": 0, "length": 19}
+
+
+def _sql_type_stats(sql_type):
+    """Stats that render back to a MySQL column type (the inverse of SchemaInferrer.sql_type)."""
+    decimal = re.match(r"decimal\((\d+),\s*(\d+)\)", sql_type)
+    if decimal:
+        precision, scale = int(decimal.group(1)), int(decimal.group(2))
+        return {"kind": "decimal", "digits": precision - scale, "scale": scale, "length": precision + 2}
+    if sql_type.startswith("tinyint(1)"):
+        return {"kind": "bool", "digits": 1, "scale": 0, "length": 5}
+    if "int" in sql_type:
+        digits = 18 if sql_type.startswith("bigint") else 9
+        return {"kind": "int", "digits": digits, "scale": 0, "length": digits + 2}
+    if sql_type.startswith(("double", "float", "real")):
+        return {"kind": "decimal", "digits": 15, "scale": MAX_DECIMAL_SCALE, "length": 23}
+    if sql_type.startswith(("datetime", "timestamp")):
+        return {"kind": "datetime", "digits": 0, "scale": 0, "length": 19}
+    if sql_type.startswith("date"):
+        return {"kind": "date", "digits": 0, "scale": 0, "length": 19}
+    varchar = re.match(r"(?:var)?char\((\d+)\)", sql_type)
+    length = int(varchar.group(1)) if varchar else VARCHAR_LIMIT + 1  # TEXT
+    return {"kind": "varchar", "digits": 0, "scale": 0, "length": length}
+
+
+def _merge(old, new):
+    """Combine the stats of two chunks of the same column, widening the kind if needed."""
+    if old is None or new is None:
+        return old or new
+    kinds = {old["kind"], new["kind"]}
+    if len(kinds) == 1:
+        kind = old["kind"]
+    elif kinds <= {"bool", "int"}:
+        kind = "int"
+    elif kinds <= {"bool", "int", "decimal"}:
+        kind = "decimal"
+    elif kinds <= {"date", "datetime"}:
+        kind = "datetime"
+    else:
+        kind = "varchar"
+    return {
+        "kind": kind,
+        "digits": max(old["digits"], new["digits"]),
+        "scale": max(old["scale"], new["scale"]),
+        "length": max(old["length"], new["length"]),
+    }